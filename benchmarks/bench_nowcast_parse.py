@@ -0,0 +1,79 @@
+# benchmarks/bench_nowcast_parse.py
+#
+# Nowcast テーブル抽出のマイクロベンチマーク。
+# 旧実装（BeautifulSoup でページ全体をパースし、行リストを線形探索）と
+# cpi_fred_nowcast/nowcast_parse.py（テーブルだけを抽出して dict 索引）を比べる。
+#
+#   pip install -r benchmarks/requirements.txt
+#   python benchmarks/bench_nowcast_parse.py [fixture.html ...]
+
+import os
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "cpi_fred_nowcast"))
+
+from nowcast_parse import index_rows, lookup, parse_tables
+
+DEFAULT_FIXTURES = [os.path.join(ROOT, "fixtures", "nowcast", "inflation-nowcasting.html")]
+MONTH = "December 2025"
+COLS = ("CPI", "Core CPI")
+
+# ---- 旧実装（cpi_bot.py の bs4 パス） ----
+def _bs4_table_to_rows(table):
+    rows = []
+    for tr in table.find_all("tr"):
+        cells = [c.get_text(" ", strip=True) for c in tr.find_all(["th", "td"])]
+        if cells:
+            rows.append(cells)
+    return rows
+
+def _bs4_pick_value(rows, month_label, col_name):
+    header = rows[0]
+    if col_name not in header:
+        return None
+    idx = header.index(col_name)
+    for r in rows[1:]:
+        if r and r[0].strip() == month_label:
+            raw = (r[idx] if idx < len(r) else "").strip()
+            try:
+                return float(raw) if raw else None
+            except Exception:
+                return None
+    return None
+
+def bs4_path(html: str):
+    from bs4 import BeautifulSoup
+
+    tables = BeautifulSoup(html, "html.parser").find_all("table")
+    mom, yoy = _bs4_table_to_rows(tables[0]), _bs4_table_to_rows(tables[1])
+    return [_bs4_pick_value(rows, MONTH, c) for rows in (mom, yoy) for c in COLS]
+
+# ---- 新実装 ----
+def fast_path(html: str):
+    mom, yoy = (index_rows(t) for t in parse_tables(html, max_tables=2))
+    return [lookup(idx, MONTH, c) for idx in (mom, yoy) for c in COLS]
+
+def _bench(fn, html: str, number: int) -> float:
+    return min(timeit.repeat(lambda: fn(html), number=number, repeat=5)) / number * 1000.0
+
+def main():
+    paths = sys.argv[1:] or DEFAULT_FIXTURES
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            html = f.read()
+
+        old, new = bs4_path(html), fast_path(html)
+        if old != new:
+            raise SystemExit(f"{path}: results differ: bs4={old} fast={new}")
+
+        number = 20
+        old_ms = _bench(bs4_path, html, number)
+        new_ms = _bench(fast_path, html, number)
+        print(f"{os.path.basename(path)} ({len(html) / 1024:.0f} KiB) values={new}")
+        print(f"  bs4 html.parser : {old_ms:8.2f} ms")
+        print(f"  table extractor : {new_ms:8.2f} ms  ({old_ms / new_ms:.1f}x)")
+
+if __name__ == "__main__":
+    main()
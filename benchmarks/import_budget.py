@@ -0,0 +1,114 @@
+# benchmarks/import_budget.py
+#
+# エントリポイントの起動（import）時間の予算チェック。コマンドごとに、その経路で読み込む
+# モジュールを新しいインタプリタで import し、python -X importtime の累積時間
+# （インタプリタ自体の起動分を除く）の中央値を予算と比べる。
+# 予算超過、または読み込んではいけないモジュール（forbid）が読み込まれていたら終了コード 1。
+#
+#   python benchmarks/import_budget.py                 # 全コマンド
+#   python benchmarks/import_budget.py cpi.save_nowcast --runs 9 -v
+#   IMPORT_BUDGET_SCALE=2 python benchmarks/import_budget.py   # 遅い CI ランナー用に予算を緩める
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import NamedTuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCALE = float(os.getenv("IMPORT_BUDGET_SCALE", "1"))
+
+class Command(NamedTuple):
+    imports: tuple[str, ...]  # この順に import する（発表前に読み込むものまで含める）
+    budget_ms: float
+    forbid: tuple[str, ...] = ()
+
+_CPI = "sys.path.insert(0, 'cpi_fred_nowcast'); import cpi_bot"
+
+COMMANDS = {
+    # Nowcast の保存: フィードの取得と（フォールバック用の）HTML パーサー。numpy・OAuth・投稿・チャート・書き出しは不要
+    "cpi.save_nowcast": Command((_CPI, "import nowcast_feed", "import nowcast_parse"), 180.0,
+                                ("numpy", "requests_oauthlib", "bot_common.publish", "bot_common.charts",
+                                 "bot_common.export")),
+    # CPI 投稿: 発表前の arm までに投稿・チャート・numpy・OAuth を読み込む。Nowcast の取得と HTML パーサーは不要、
+    # pyarrow は投稿後の書き出しだけ
+    "cpi.post_cpi": Command(
+        (_CPI, "import bot_common.publish", "import bot_common.charts", "import bot_common.series",
+         "import requests_oauthlib"), 320.0,
+        ("nowcast_feed", "nowcast_parse", "html.parser", "pyarrow")
+    ),
+    # 雇用統計: 予想の読み込みと投稿済みチェックまでは軽いまま
+    "employment.start": Command(("import employment_report.run",), 30.0, ("numpy", "requests", "requests_oauthlib")),
+    # 再実行で投稿済みだったとき: 残りのチャネルを調べるだけなので numpy / matplotlib / OAuth は読まない
+    "employment.skip": Command(("import employment_report.run", "import bot_common.publish"), 180.0,
+                               ("numpy", "matplotlib", "requests_oauthlib")),
+    "employment.post": Command(
+        ("import employment_report.run", "import employment_report.bls_actuals", "import bot_common.publish",
+         "import requests_oauthlib"),
+        300.0,
+        ("pyarrow",),
+    ),
+    # 常駐デーモン: ボット本体は起動後に読み込む
+    "daemon": Command(("import bot_common.daemon",), 100.0, ("numpy", "requests")),
+}
+
+def _importtime(code: str) -> tuple[dict[str, int], list[str]]:
+    """returns: ({トップレベルのモジュール名: 累積マイクロ秒}, 読み込まれた forbid 候補)"""
+    env = {**os.environ, "PYTHONPATH": ROOT, "METRICS_PATH": ""}
+    p = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    top = {}
+    for line in p.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cum, name = line.split("|")
+        if cum.strip().isdigit() and not name[1:].startswith(" "):
+            top[name.strip()] = int(cum)
+    return top, json.loads(p.stdout.strip().splitlines()[-1]) if p.stdout.strip() else []
+
+def measure(cmd: Command, runs: int) -> tuple[float, list[str], list[tuple[str, float]]]:
+    """returns: (中央値 ms, 読み込まれた forbid モジュール, 直近の重いトップレベル import)"""
+    baseline = set(_importtime("pass")[0])
+    code = (
+        "import sys; " + "; ".join(cmd.imports)
+        + f"; import json; print(json.dumps([m for m in {list(cmd.forbid)!r} if m in sys.modules]))"
+    )
+    totals = []
+    loaded: list[str] = []
+    heavy: list[tuple[str, float]] = []
+    for _ in range(runs):
+        top, loaded = _importtime(code)
+        own = {k: v for k, v in top.items() if k not in baseline}
+        totals.append(sum(own.values()) / 1000.0)
+        heavy = sorted(((k, v / 1000.0) for k, v in own.items()), key=lambda kv: -kv[1])[:5]
+    return statistics.median(totals), loaded, heavy
+
+def main():
+    ap = argparse.ArgumentParser(description="Check entry-point import time against per-command budgets.")
+    ap.add_argument("commands", nargs="*", choices=[[], *COMMANDS], default=[])
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("-v", "--verbose", action="store_true")
+    args = ap.parse_args()
+
+    failed = False
+    for name in args.commands or COMMANDS:
+        cmd = COMMANDS[name]
+        budget = cmd.budget_ms * SCALE
+        ms, loaded, heavy = measure(cmd, args.runs)
+        over = ms > budget
+        status = "FAIL" if over or loaded else "ok"
+        print(f"[import] {name:<18} {ms:7.1f}ms / budget {budget:6.1f}ms  {status}")
+        if loaded:
+            print(f"[import]   must not load: {', '.join(loaded)}")
+        if args.verbose or over:
+            for mod, mod_ms in heavy:
+                print(f"[import]   {mod_ms:7.1f}ms  {mod}")
+        failed |= over or bool(loaded)
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
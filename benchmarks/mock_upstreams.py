@@ -0,0 +1,227 @@
+# benchmarks/mock_upstreams.py
+#
+# FRED / BLS / Cleveland Fed / X のローカル代替サーバー（1プロセス・1ポートでパスで振り分け）。
+#   GET  /fred/series/observations           FRED（fixtures/replay/fred）
+#   POST /bls/publicAPI/v2/timeseries/data/  BLS v2（fixtures/replay/bls + CPI は FRED の値から生成）
+#   GET  /nowcast                            Cleveland Fed ページ（fixtures/nowcast）
+#   GET  /nowcast/feed/{month,quarter}.json  Nowcast の JSON フィード（fixtures/nowcast/nowcast_*.json）
+#   POST /2/tweets                           X（受信時刻を記録）
+#   POST /1.1/media/upload.json              X の画像アップロード（サイズを記録）
+#
+# live_at（epoch 秒）より前は live_month の前月まで、以降は live_month までのデータを返す。
+# latency_ms / jitter_ms で応答を遅らせ、error_rate の確率で error_status（既定 503、429 なら Retry-After: 1 付き）
+# を返す（ルートごとに上書き可）。
+#
+#   python benchmarks/mock_upstreams.py --port 8765 --live-in 30 --latency-ms 80 --jitter-ms 40
+
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(ROOT, "fixtures")
+
+# FRED の CPI を BLS 側 ID でも配信する
+BLS_FROM_FRED = {"CUSR0000SA0": "CPIAUCSL", "CUSR0000SA0L1E": "CPILFESL"}
+ROUTES = ("fred", "bls", "nowcast", "x")
+
+def _prev_month(ym: str) -> str:
+    y, m = int(ym[:4]), int(ym[5:7])
+    return f"{y - 1:04d}-12" if m == 1 else f"{y:04d}-{m - 1:02d}"
+
+class Upstreams:
+    def __init__(self, live_month: str = "2025-12", live_at: float | None = None,
+                 latency_ms: float = 0.0, jitter_ms: float = 0.0, error_rate: float = 0.0,
+                 error_status: int = 503):
+        self.live_month = live_month
+        self.live_at = live_at if live_at is not None else time.time()
+        self.latency_ms = {r: latency_ms for r in ROUTES}
+        self.jitter_ms = {r: jitter_ms for r in ROUTES}
+        self.error_rate = {r: error_rate for r in ROUTES}
+        self.error_status = error_status
+        self.tweets: list[dict] = []
+        self.media: list[dict] = []
+        self._lock = threading.Lock()
+        self._tweet_id = 0
+
+        self.fred = {}
+        for name in os.listdir(os.path.join(FIXTURES, "replay", "fred")):
+            with open(os.path.join(FIXTURES, "replay", "fred", name), encoding="utf-8") as f:
+                self.fred[name[:-5]] = json.load(f)["observations"]
+        with open(os.path.join(FIXTURES, "replay", "bls", "employment.json"), encoding="utf-8") as f:
+            self.bls = {s["seriesID"]: s["data"] for s in json.load(f)["Results"]["series"]}
+        for sid, fred_id in BLS_FROM_FRED.items():
+            self.bls[sid] = [
+                {"year": o["date"][:4], "period": f"M{o['date'][5:7]}", "value": o["value"], "footnotes": [{}]}
+                for o in reversed(self.fred[fred_id])
+            ]
+        with open(os.path.join(FIXTURES, "nowcast", "inflation-nowcasting.html"), "rb") as f:
+            self.nowcast_html = f.read()
+        self.nowcast_feed = {}
+        for name in ("month", "quarter"):
+            with open(os.path.join(FIXTURES, "nowcast", f"nowcast_{name}.json"), "rb") as f:
+                self.nowcast_feed[name] = f.read()
+
+    def visible_month(self) -> str:
+        return self.live_month if time.time() >= self.live_at else _prev_month(self.live_month)
+
+    def record_tweet(self, text: str, reply_to: str | None = None, media_ids: list | None = None) -> dict:
+        with self._lock:
+            self._tweet_id += 1
+            entry = {"id": str(self._tweet_id), "text": text, "reply_to": reply_to, "media_ids": media_ids,
+                     "received_at": time.time()}
+            self.tweets.append(entry)
+        return entry
+
+def _handler(up: Upstreams):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _route(self) -> str | None:
+            path = urlparse(self.path).path
+            if path.startswith("/fred/"):
+                return "fred"
+            if path.startswith("/bls/"):
+                return "bls"
+            if path.startswith("/nowcast"):
+                return "nowcast"
+            if path.startswith("/2/tweets"):
+                return "x"
+            if path.startswith("/1.1/media/upload"):
+                return "media"
+            return None
+
+        def _delay_or_fail(self, route: str) -> bool:
+            ms = up.latency_ms[route] + random.uniform(0, up.jitter_ms[route])
+            if ms > 0:
+                time.sleep(ms / 1000.0)
+            if random.random() < up.error_rate[route]:
+                extra = {"Retry-After": "1"} if up.error_status == 429 else {}
+                self._send(up.error_status, b'{"error": "injected"}', headers=extra)
+                return True
+            return False
+
+        def _send(self, code: int, body: bytes, ctype: str = "application/json", headers: dict | None = None):
+            self.send_response(code)
+            self.send_header("Content-Type", ctype)
+            for k, v in (headers or {}).items():
+                self.send_header(k, v)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if self.command != "HEAD":
+                self.wfile.write(body)
+
+        def _body(self) -> bytes:
+            n = int(self.headers.get("Content-Length") or 0)
+            return self.rfile.read(n) if n else b""
+
+        def do_HEAD(self):
+            self._send(200 if self._route() else 404, b"")
+
+        def do_GET(self):
+            route = self._route()
+            if route not in ("fred", "nowcast"):
+                return self._send(404, b"{}")
+            if self._delay_or_fail(route):
+                return
+            if route == "nowcast":
+                path = urlparse(self.path).path
+                if path.startswith("/nowcast/feed/"):
+                    body = up.nowcast_feed.get(path.rsplit("/", 1)[-1].removesuffix(".json"))
+                    return self._send(200, body) if body is not None else self._send(404, b"{}")
+                return self._send(200, up.nowcast_html, "text/html; charset=utf-8")
+
+            q = {k: v[0] for k, v in parse_qs(urlparse(self.path).query).items()}
+            visible = up.visible_month()
+            obs = [o for o in up.fred.get(q.get("series_id"), []) if o["date"][:7] <= visible]
+            if "observation_start" in q:
+                obs = [o for o in obs if o["date"] >= q["observation_start"]]
+            if q.get("sort_order") == "desc":
+                obs = obs[::-1]
+            if "limit" in q:
+                obs = obs[:int(q["limit"])]
+            self._send(200, json.dumps({"count": len(obs), "observations": obs}).encode())
+
+        def do_POST(self):
+            route = self._route()
+            body = self._body()
+            if route == "media":
+                up.media.append({"bytes": len(body), "received_at": time.time()})
+                return self._send(200, json.dumps({"media_id_string": f"m{len(up.media)}"}).encode())
+            if route not in ("bls", "x"):
+                return self._send(404, b"{}")
+            if self._delay_or_fail(route):
+                return
+            payload = json.loads(body or b"{}")
+            if route == "x":
+                entry = up.record_tweet(payload.get("text", ""), (payload.get("reply") or {}).get("in_reply_to_tweet_id"),
+                                        (payload.get("media") or {}).get("media_ids"))
+                return self._send(201, json.dumps({"data": {"id": entry["id"], "text": entry["text"]}}).encode())
+
+            visible = up.visible_month()
+            start, end = int(payload.get("startyear", 0)), int(payload.get("endyear", 9999))
+            series = []
+            for sid in payload.get("seriesid", []):
+                data = [
+                    d for d in up.bls.get(sid, [])
+                    if start <= int(d["year"]) <= end and f"{d['year']}-{d['period'][1:]}" <= visible
+                ]
+                series.append({"seriesID": sid, "data": data})
+            out = {"status": "REQUEST_SUCCEEDED", "responseTime": random.randint(20, 300), "message": [],
+                   "Results": {"series": series}}
+            self._send(200, json.dumps(out).encode())
+
+    return Handler
+
+def serve(up: Upstreams, port: int = 0) -> ThreadingHTTPServer:
+    """バックグラウンドスレッドで起動したサーバーを返す（port=0 なら空きポート）"""
+    srv = ThreadingHTTPServer(("127.0.0.1", port), _handler(up))
+    srv.daemon_threads = True
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv
+
+def env_for(srv: ThreadingHTTPServer) -> dict:
+    """ボットをこのサーバーに向けるための環境変数"""
+    base = f"http://127.0.0.1:{srv.server_port}"
+    return {
+        "FRED_BASE": f"{base}/fred",
+        "BLS_URL": f"{base}/bls/publicAPI/v2/timeseries/data/",
+        "NOWCAST_URL": f"{base}/nowcast",
+        "NOWCAST_FEED_URL": f"{base}/nowcast/feed/month.json",
+        "NOWCAST_QUARTER_FEED_URL": f"{base}/nowcast/feed/quarter.json",
+        "X_TWEET_URL": f"{base}/2/tweets",
+        "X_MEDIA_URL": f"{base}/1.1/media/upload.json",
+    }
+
+def main():
+    ap = argparse.ArgumentParser(description="Local stand-ins for FRED, BLS, the nowcast page and X.")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--live-month", default="2025-12")
+    ap.add_argument("--live-in", type=float, default=30.0, help="seconds until live_month becomes visible")
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--jitter-ms", type=float, default=0.0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--error-status", type=int, default=503)
+    args = ap.parse_args()
+
+    up = Upstreams(args.live_month, time.time() + args.live_in, args.latency_ms, args.jitter_ms, args.error_rate,
+                   args.error_status)
+    srv = serve(up, args.port)
+    for k, v in env_for(srv).items():
+        print(f"export {k}={v}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        srv.shutdown()
+
+if __name__ == "__main__":
+    main()
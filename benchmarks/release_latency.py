@@ -0,0 +1,168 @@
+# benchmarks/release_latency.py
+#
+# 発表レイテンシ（データが上流に出た瞬間 → ツイートが X に届いた瞬間）のエンドツーエンド計測。
+# mock_upstreams をプロセス内で起動し、本番と同じエントリポイントをサブプロセスで実行する:
+#   cpi:        python cpi_fred_nowcast/cpi_bot.py post_cpi  （RELEASE_AT 指定で発表待ちポーリング）
+#   employment: python -m employment_report.run
+# 1回ごとに state / 観測ストアを一時ディレクトリに作り直すので、実行は互いに独立。
+#
+#   python benchmarks/release_latency.py cpi --runs 10 --latency-ms 80 --jitter-ms 40
+#   python benchmarks/release_latency.py employment --runs 10 --error-rate 0.1
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_upstreams import ROOT, Upstreams, env_for, serve
+
+LIVE_MONTH = "2025-12"
+DUMMY_KEYS = {
+    # cpi_bot
+    "X_CONSUMER_KEY": "bench", "X_CONSUMER_SECRET": "bench",
+    "X_ACCESS_TOKEN": "bench", "X_ACCESS_TOKEN_SECRET": "bench",
+    # employment_report
+    "X_API_KEY": "bench", "X_API_SECRET": "bench", "X_ACCESS_SECRET": "bench",
+    "FRED_API_KEY": "bench",
+    # 本番のワークフローは登録キーあり（500回/日）。無いと poller が quota に合わせて間隔を延ばす
+    "BLS_API_KEY": "bench",
+}
+
+def _iso(ts: float) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat()
+
+def _paths(workdir: str) -> dict:
+    return {
+        "OBS_STORE_PATH": os.path.join(workdir, "observations.sqlite3"),
+        "CPI_STATE_PATH": os.path.join(workdir, "cpi_state.sqlite3"),
+        "NOWCAST_HISTORY_PATH": os.path.join(workdir, "nowcast_history.sqlite3"),
+        "EMP_STATE_PATH": os.path.join(workdir, "employment_state.sqlite3"),
+        "EMP_FORECAST_FILE": os.path.join(workdir, "forecast.json"),
+        "RELEASE_LATENCY_LOG": os.path.join(workdir, "release_latency.jsonl"),
+        "METRICS_PATH": os.path.join(workdir, "metrics.jsonl"),
+        "QUOTA_PATH": os.path.join(workdir, "quota.json"),
+        "LATENCY_PATH": os.path.join(workdir, "latency.json"),
+        "SURPRISE_DIR": workdir,
+        "REVISIONS_DIR": workdir,
+        "EXPORT_DIR": os.path.join(workdir, "releases"),
+        "NOWCAST_CACHE_PATH": os.path.join(workdir, "nowcast_cache.json"),
+    }
+
+def _run(cmd: list[str], env: dict, timeout: float, verbose: bool) -> subprocess.CompletedProcess:
+    p = subprocess.run(cmd, cwd=ROOT, env=env, capture_output=True, text=True, timeout=timeout)
+    if verbose or p.returncode != 0:
+        sys.stdout.write(p.stdout)
+        sys.stderr.write(p.stderr)
+    if p.returncode != 0:
+        raise RuntimeError(f"{' '.join(cmd)} exited with {p.returncode}")
+    return p
+
+def _command(indicator: str) -> list[str]:
+    if indicator == "cpi":
+        return [sys.executable, "cpi_fred_nowcast/cpi_bot.py", "post_cpi"]
+    return [sys.executable, "-m", "employment_report.run"]
+
+def _seed(indicator: str, up: Upstreams, base_env: dict, seed_dir: str, verbose: bool):
+    """発表前の状態を作る（CPI: 前月分まで取り込み済み + Nowcast 保存済み）"""
+    env = {**base_env, **_paths(seed_dir)}
+    with open(env["EMP_FORECAST_FILE"], "w", encoding="utf-8") as f:
+        json.dump({"ym": LIVE_MONTH, "forecast": {"ahe_mom": 0.3, "ahe_yoy": 3.8, "nfp_man": 5.5,
+                                                  "unemployment_rate": 4.5}}, f)
+    if indicator != "cpi":
+        return
+    up.live_at = float("inf")
+    _run([sys.executable, "cpi_fred_nowcast/cpi_bot.py", "save_nowcast"], env, 120, verbose)
+    _run(_command("cpi"), env, 120, verbose)
+    up.tweets.clear()
+
+def run_once(indicator: str, up: Upstreams, base_env: dict, seed_dir: str,
+             lead_sec: float, timeout: float, verbose: bool) -> dict:
+    with tempfile.TemporaryDirectory(prefix="release-latency-") as workdir:
+        for name in os.listdir(seed_dir):
+            src = os.path.join(seed_dir, name)
+            if os.path.isdir(src):
+                shutil.copytree(src, os.path.join(workdir, name))
+            elif not name.endswith((".lock", "-wal", "-shm")):
+                shutil.copy(src, workdir)
+
+        live_at = time.time() + lead_sec
+        up.live_at = live_at
+        up.tweets.clear()
+        env = {**base_env, **_paths(workdir), "RELEASE_AT": _iso(live_at)}
+
+        t_start = time.time()
+        _run(_command(indicator), env, timeout, verbose)
+        if not up.tweets:
+            raise RuntimeError("no tweet reached the mock X endpoint")
+        first = up.tweets[0]["received_at"]
+        return {
+            "latency_ms": (first - live_at) * 1000.0,
+            "wall_sec": time.time() - t_start,
+            "tweets": len(up.tweets),
+            "chart": bool(up.tweets[0].get("media_ids")),
+        }
+
+def _pct(sorted_vals: list[float], q: float) -> float:
+    return sorted_vals[min(len(sorted_vals) - 1, int(q * len(sorted_vals)))]
+
+def main():
+    ap = argparse.ArgumentParser(description="End-to-end release latency against local upstream stand-ins.")
+    ap.add_argument("indicator", choices=["cpi", "employment"])
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--lead-sec", type=float, default=3.0, help="seconds between process start and data going live")
+    ap.add_argument("--arm-sec", type=float, default=1.0)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--jitter-ms", type=float, default=0.0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--error-status", type=int, default=503, help="status returned for injected errors (503 or 429)")
+    ap.add_argument("--timeout", type=float, default=120.0)
+    ap.add_argument("--out", help="append per-run results as JSON lines")
+    ap.add_argument("-v", "--verbose", action="store_true")
+    args = ap.parse_args()
+
+    up = Upstreams(LIVE_MONTH, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+                   error_status=args.error_status)
+    srv = serve(up)
+    base_env = {
+        **os.environ, **DUMMY_KEYS, **env_for(srv),
+        "RELEASE_ARM_SEC": str(args.arm_sec),
+        "PYTHONPATH": ROOT,
+    }
+    base_env.pop("X_DRY_RUN", None)
+    base_env.pop("FORCE_POST", None)
+
+    seed_dir = tempfile.mkdtemp(prefix="release-latency-seed-")
+    try:
+        # 準備段階は注入エラーなしで行う
+        error_rate, up.error_rate = up.error_rate, {r: 0.0 for r in up.error_rate}
+        _seed(args.indicator, up, base_env, seed_dir, args.verbose)
+        up.error_rate = error_rate
+
+        results = []
+        for i in range(args.runs):
+            r = run_once(args.indicator, up, base_env, seed_dir, args.lead_sec, args.timeout, args.verbose)
+            results.append(r)
+            print(f"[bench] {args.indicator} run {i + 1}/{args.runs}: latency {r['latency_ms']:.1f}ms "
+                  f"(process {r['wall_sec']:.2f}s, {r['tweets']} tweet(s), chart={r['chart']})")
+    finally:
+        shutil.rmtree(seed_dir, ignore_errors=True)
+        srv.shutdown()
+
+    vals = sorted(r["latency_ms"] for r in results)
+    print(f"[bench] {args.indicator} release latency over {len(vals)} runs (ms): "
+          f"p50 {_pct(vals, 0.5):.1f}  p95 {_pct(vals, 0.95):.1f}  p99 {_pct(vals, 0.99):.1f}  max {vals[-1]:.1f}")
+
+    if args.out:
+        with open(args.out, "a", encoding="utf-8") as f:
+            for r in results:
+                f.write(json.dumps({"indicator": args.indicator, **vars(args), **r}) + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+# bot_common/bls_api.py
+
+import os
+import re
+import time
+
+from bot_common import quota
+from bot_common.http_client import fetch_if_changed, gather
+
+BLS_URL = os.getenv("BLS_URL", "https://api.bls.gov/publicAPI/v2/timeseries/data/")
+BLS_API_KEY = os.getenv("BLS_API_KEY", "")
+
+# v2 の1リクエストあたりの上限（登録キーあり: 50系列・20年 / 無し: 25系列・10年）
+MAX_SERIES = 50 if BLS_API_KEY else 25
+MAX_YEARS = 20 if BLS_API_KEY else 10
+
+# 応答ごとに変わる responseTime はハッシュ比較から除外する
+_RESPONSE_TIME = re.compile(rb'"responseTime"\s*:\s*\d+\s*,?')
+
+def _normalize(body: bytes) -> bytes:
+    return _RESPONSE_TIME.sub(b"", body)
+
+def _parse(r) -> dict:
+    data = r.json()
+    status = data.get("status")
+    if status == "REQUEST_NOT_PROCESSED":
+        # 日次上限なら ET の翌0時まで、それ以外（一時的な過負荷）は1分止める
+        # 呼び出し元（hedge の再試行・poller）は retry_after まで待つので、実際に止めた時間を渡す
+        message = " ".join(data.get("message") or [])
+        if "threshold" in message.lower():
+            until = quota.next_midnight_et()
+            quota.throttle("bls", until=until)
+            raise quota.Throttled("bls", max(0.0, until - time.time()), message)
+        quota.throttle("bls", 60.0)
+        raise quota.Throttled("bls", 60.0, message or status)
+    if status != "REQUEST_SUCCEEDED":
+        raise RuntimeError(f"BLS API error: {data}")
+    return data
+
+def fetch_bls_if_changed(series_ids: list[str], start_year: int, end_year: int, timeout: float = 25) -> tuple[bool, dict]:
+    """前回と同じ本文なら JSON デコードを省略して (False, 前回の結果) を返す"""
+    payload = {
+        "seriesid": series_ids,
+        "startyear": str(start_year),
+        "endyear": str(end_year),
+    }
+    if BLS_API_KEY:
+        payload["registrationkey"] = BLS_API_KEY
+
+    return fetch_if_changed("POST", BLS_URL, _parse, normalize=_normalize, upstream="bls", json=payload, timeout=timeout)
+
+def fetch_bls(series_ids: list[str], start_year: int, end_year: int, timeout: float = 25) -> dict:
+    return fetch_bls_if_changed(series_ids, start_year, end_year, timeout=timeout)[1]
+
+def fetch_bls_batch(
+    series_ids: list[str], start_year: int, end_year: int, timeout: float = 25
+) -> tuple[bool, dict[str, dict[str, float]]]:
+    """
+    複数指標の系列を MAX_SERIES 件 × MAX_YEARS 年ごとの最小限の POST にまとめて並列に取得し、
+    to_map 形式 {seriesID: {"YYYY-MM": value}} に合わせて返す。
+    changed はいずれかの POST の本文が前回から変わったか。
+    """
+    ids = list(dict.fromkeys(series_ids))
+    chunks = [ids[i:i + MAX_SERIES] for i in range(0, len(ids), MAX_SERIES)]
+    years = [(y, min(end_year, y + MAX_YEARS - 1)) for y in range(start_year, end_year + 1, MAX_YEARS)]
+    calls = [
+        (lambda c=c, y0=y0, y1=y1: fetch_bls_if_changed(c, y0, y1, timeout=timeout))
+        for c in chunks for y0, y1 in years
+    ]
+    results = gather(*calls) if len(calls) > 1 else [calls[0]()]
+
+    out: dict[str, dict[str, float]] = {sid: {} for sid in ids}
+    for _, raw in results:
+        for sid, m in to_map(raw).items():
+            out.setdefault(sid, {}).update(m)
+    return any(changed for changed, _ in results), out
+
+def to_map(series_json: dict) -> dict[str, dict[str, float]]:
+    """{seriesID: {"YYYY-MM": value}}（月次以外の period は捨てる）"""
+    out = {}
+    for s in series_json["Results"]["series"]:
+        sid = s["seriesID"]
+        m = {}
+        for item in s.get("data", []):
+            period = item.get("period", "")
+            if not period.startswith("M") or period == "M13":
+                continue
+            month = int(period[1:])
+            ym = f"{int(item['year']):04d}-{month:02d}"
+            try:
+                m[ym] = float(item["value"])
+            except Exception:
+                continue
+        out[sid] = m
+    return out
@@ -0,0 +1,259 @@
+# bot_common/bls_bulk.py
+#
+# BLS の一括ダウンロード用ファイル（download.bls.gov/pub/time.series/ の ce.data.0.AllCESSeries、
+# cu.data.0.Current など、数百 MB のタブ区切り）から台帳の系列だけを取り出し、
+# 列指向の配列（npz）に書き出す。過去分の取り込み（バックフィル）に v2 API を何十年分も回さないためのもの。
+#
+# - ファイルは mmap で開き、系列 ID 順に並んでいることを使って二分探索で該当ブロックの先頭に飛び、
+#   そこから1行ずつ読む（ファイル全体を読まないので、メモリも時間も取り出す系列の分だけ）
+# - アーカイブは系列 ID 順・月順に並べた month / value 列と、系列ごとの開始位置（offsets）の索引。
+#   参照は索引 → searchsorted なので数マイクロ秒
+#
+#   python -m bot_common.bls_bulk ingest fixtures/bls_bulk/*           # 台帳の全系列
+#   python -m bot_common.bls_bulk ingest --download ce.data.0.AllCESSeries --release employment
+#   python -m bot_common.bls_bulk get CES0000000001 2025-12
+#   python -m bot_common.bls_bulk info
+
+import argparse
+import mmap
+import os
+import time
+from array import array
+
+import numpy as np
+
+from bot_common import bls_series
+from bot_common.series import MonthlySeries, month_index, month_str
+
+ARCHIVE_PATH = os.getenv("BLS_ARCHIVE_PATH", "data/bls_archive.npz")
+BULK_URL = os.getenv("BLS_BULK_URL", "https://download.bls.gov/pub/time.series")
+BULK_DIR = os.getenv("BLS_BULK_DIR", "data/bls_bulk")
+
+# ========= Ingest =========
+def _key(mm: mmap.mmap, pos: int) -> bytes:
+    """pos から始まる行の series_id（固定幅の空白詰めを除く）"""
+    return mm[pos: mm.find(b"\t", pos)].rstrip(b" ")
+
+def _seek(mm: mmap.mmap, key: bytes, lo: int) -> int:
+    """
+    key 以上の series_id を持つ最初の行頭。bulk ファイルは系列 ID 順に並んでいるので
+    二分探索で数 KB まで絞り、残りを1行ずつ進める（触るページは数十枚で済む）。
+    lo はヘッダーの次の行頭。
+    """
+    hi = len(mm)
+    while hi - lo > 4096:
+        mid = (lo + hi) // 2
+        p = mm.find(b"\n", mid, hi) + 1
+        if p == 0:
+            hi = mid
+        elif _key(mm, p) < key:
+            lo = p
+        else:
+            hi = p
+    while lo < len(mm) and _key(mm, lo) < key:
+        nl = mm.find(b"\n", lo)
+        lo = len(mm) if nl == -1 else nl + 1
+    return lo
+
+def _scan(mm: mmap.mmap, sid: str, body: int) -> tuple[array, array]:
+    """mm から sid の月次（M01〜M12）の行を読む。M13（年平均）と値の無い行は捨てる。"""
+    months, values = array("i"), array("d")
+    key = sid.encode()
+    pos = _seek(mm, key, body)
+    while pos < len(mm):
+        end = mm.find(b"\n", pos)
+        end = len(mm) if end == -1 else end
+        fields = mm[pos:end].split(b"\t")
+        if fields[0].rstrip(b" ") != key or len(fields) < 4:
+            break
+        period = fields[2]
+        if period[:1] == b"M" and period != b"M13":
+            try:
+                value = float(fields[3])
+            except ValueError:
+                value = None  # "-"（未公表）など
+            if value is not None:
+                months.append(int(fields[1]) * 12 + int(period[1:]) - 1)
+                values.append(value)
+        pos = end + 1
+    return months, values
+
+def read_bulk(path: str, series_ids) -> dict[str, tuple[np.ndarray, np.ndarray]]:
+    """bulk ファイルから series_ids のうち含まれるものを {sid: (month, value)}（月順）で返す"""
+    out = {}
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return out
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            body = mm.find(b"\n") + 1  # 1行目はヘッダー
+            for sid in series_ids:
+                months, values = _scan(mm, sid, body)
+                if not months:
+                    continue
+                m = np.frombuffer(months, dtype=np.int32)
+                v = np.frombuffer(values, dtype=np.float64)
+                order = np.argsort(m, kind="stable")
+                m, v = m[order], v[order]
+                # 同じ月が重複していたら後の行を採る
+                keep = np.append(m[1:] != m[:-1], True)
+                out[sid] = (m[keep], v[keep])
+    return out
+
+def _columns(series: dict[str, tuple[np.ndarray, np.ndarray]]) -> dict[str, np.ndarray]:
+    ids = sorted(series)
+    lengths = np.array([len(series[s][0]) for s in ids], dtype=np.int64)
+    offsets = np.concatenate(([0], np.cumsum(lengths))).astype(np.int64)
+    empty_m, empty_v = np.empty(0, np.int32), np.empty(0, np.float64)
+    return {
+        "series": np.array(ids, dtype="U32"),
+        "offsets": offsets,
+        "month": np.concatenate([series[s][0] for s in ids] or [empty_m]).astype(np.int32),
+        "value": np.concatenate([series[s][1] for s in ids] or [empty_v]).astype(np.float64),
+    }
+
+def ingest(paths, series_ids=None, out: str = ARCHIVE_PATH) -> dict[str, int]:
+    """
+    bulk ファイル群から series_ids（既定は台帳の全系列）を取り出してアーカイブに書く。
+    既存のアーカイブは残し、今回取り込んだ系列だけ丸ごと置き換える。returns: {sid: 月数}
+    """
+    series_ids = [s.id for s in bls_series.REGISTRY] if series_ids is None else list(series_ids)
+    series: dict[str, tuple[np.ndarray, np.ndarray]] = {}
+    if os.path.exists(out):
+        arc = Archive(out)
+        series = {sid: arc.arrays(sid) for sid in arc.ids}
+    found: dict[str, int] = {}
+    for path in paths:
+        for sid, (m, v) in read_bulk(path, series_ids).items():
+            series[sid] = (m, v)
+            found[sid] = len(m)
+
+    if os.path.dirname(out):
+        os.makedirs(os.path.dirname(out), exist_ok=True)
+    tmp = f"{out}.tmp.npz"
+    np.savez(tmp, **_columns(series))
+    os.replace(tmp, out)
+    _cache.pop(out, None)
+    return found
+
+def download(name: str, dest_dir: str = BULK_DIR, timeout: float = 60) -> str:
+    """bulk ファイル（例: ce.data.0.AllCESSeries）を dest_dir に逐次書き出す。保存先を返す。"""
+    from bot_common.http_client import session
+
+    url = f"{BULK_URL}/{name.split('.')[0]}/{name}"
+    dest = os.path.join(dest_dir, name)
+    os.makedirs(dest_dir, exist_ok=True)
+    # download.bls.gov はブラウザ以外の UA を弾く
+    headers = {"User-Agent": os.getenv("BLS_USER_AGENT", "Mozilla/5.0 (EconomicIndicators_BOT)")}
+    with session().get(url, headers=headers, stream=True, timeout=timeout) as r:
+        r.raise_for_status()
+        with open(f"{dest}.part", "wb") as f:
+            for chunk in r.iter_content(chunk_size=1 << 20):
+                f.write(chunk)
+    os.replace(f"{dest}.part", dest)
+    return dest
+
+# ========= Lookup =========
+class Archive:
+    """ingest() が書いたアーカイブ。series（系列 ID 順）と offsets で month / value 列を引く。"""
+
+    def __init__(self, path: str = ARCHIVE_PATH):
+        with np.load(path) as z:
+            self.ids: list[str] = z["series"].tolist()
+            self.offsets = z["offsets"]
+            self.month = z["month"]
+            self.value = z["value"]
+        self._pos = {sid: i for i, sid in enumerate(self.ids)}
+
+    def __contains__(self, sid: str) -> bool:
+        return sid in self._pos
+
+    def _range(self, sid: str) -> tuple[int, int]:
+        i = self._pos.get(sid)
+        if i is None:
+            return 0, 0
+        return int(self.offsets[i]), int(self.offsets[i + 1])
+
+    def arrays(self, sid: str) -> tuple[np.ndarray, np.ndarray]:
+        lo, hi = self._range(sid)
+        return self.month[lo:hi], self.value[lo:hi]
+
+    def get(self, sid: str, ym: str) -> float | None:
+        lo, hi = self._range(sid)
+        m = month_index(ym)
+        j = lo + int(np.searchsorted(self.month[lo:hi], m))
+        return float(self.value[j]) if j < hi and self.month[j] == m else None
+
+    def last_month(self, sid: str) -> str | None:
+        lo, hi = self._range(sid)
+        return month_str(int(self.month[hi - 1])) if hi > lo else None
+
+    def _slice(self, sid: str, start: str | None, end: str | None) -> tuple[np.ndarray, np.ndarray]:
+        m, v = self.arrays(sid)
+        lo = 0 if start is None else int(np.searchsorted(m, month_index(start)))
+        hi = len(m) if end is None else int(np.searchsorted(m, month_index(end), side="right"))
+        return m[lo:hi], v[lo:hi]
+
+    def to_map(self, sid: str, start: str | None = None, end: str | None = None) -> dict[str, float]:
+        """{"YYYY-MM": value}（start〜end を含む。bls_api の to_map 形式と同じ）"""
+        m, v = self._slice(sid, start, end)
+        return {month_str(int(k)): float(x) for k, x in zip(m, v)}
+
+    def series(self, sid: str, start: str | None = None, end: str | None = None) -> MonthlySeries:
+        """start〜end の MonthlySeries（欠損月は NaN）"""
+        m, v = self._slice(sid, start, end)
+        if len(m) == 0:
+            return MonthlySeries(0, np.empty(0))
+        out = np.full(int(m[-1]) - int(m[0]) + 1, np.nan)
+        out[m - m[0]] = v
+        return MonthlySeries(int(m[0]), out)
+
+_cache: dict[str, tuple[float, Archive]] = {}
+
+def load(path: str = ARCHIVE_PATH) -> Archive:
+    """ファイルが更新されていなければ前回読んだアーカイブを返す"""
+    mtime = os.stat(path).st_mtime
+    hit = _cache.get(path)
+    if hit is None or hit[0] != mtime:
+        hit = _cache[path] = (mtime, Archive(path))
+    return hit[1]
+
+# ========= CLI =========
+def main():
+    ap = argparse.ArgumentParser(description="Ingest BLS bulk time.series files into a local columnar archive.")
+    ap.add_argument("--archive", default=ARCHIVE_PATH)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("ingest")
+    p.add_argument("files", nargs="*")
+    p.add_argument("--download", action="append", default=[], help="bulk file name to fetch first (repeatable)")
+    p.add_argument("--release", action="append", choices=bls_series.RELEASES, help="limit to these releases")
+    p = sub.add_parser("get")
+    p.add_argument("series_id")
+    p.add_argument("month", help="YYYY-MM")
+    sub.add_parser("info")
+    args = ap.parse_args()
+
+    if args.cmd == "ingest":
+        files = args.files + [download(name) for name in args.download]
+        ids = bls_series.series_for(*args.release) if args.release else None
+        t0 = time.perf_counter()
+        found = ingest(files, ids, out=args.archive)
+        ms = (time.perf_counter() - t0) * 1000.0
+        size = sum(os.path.getsize(f) for f in files)
+        print(f"[bls_bulk] {len(files)} file(s), {size / 1e6:.1f}MB -> {len(found)} series in {ms:.0f}ms ({args.archive})")
+        for sid, n in sorted(found.items()):
+            print(f"[bls_bulk]   {sid:<24} {n:5d} months")
+    elif args.cmd == "get":
+        arc = load(args.archive)
+        t0 = time.perf_counter()
+        value = arc.get(args.series_id, args.month)
+        us = (time.perf_counter() - t0) * 1e6
+        print(f"{args.series_id} {args.month} = {value} ({us:.1f}us)")
+    else:
+        arc = load(args.archive)
+        for sid in arc.ids:
+            m, _ = arc.arrays(sid)
+            s = bls_series.by_id(sid)
+            print(f"{sid:<24} {month_str(int(m[0]))}..{month_str(int(m[-1]))} {len(m):5d}  {s.label if s else ''}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# bot_common/bls_series.py
+#
+# BLS 系列の台帳。指標（発表）ごとに必要な系列をここで宣言し、
+# 取得側は series_for() で ID を集めて bls_api.fetch_bls_batch() に一括で渡す。
+# 同じ日に出る系列（CPI と実質賃金など）は1回の POST にまとめられる。
+
+from typing import NamedTuple
+
+class BlsSeries(NamedTuple):
+    key: str        # コード内で使う短い名前
+    id: str         # BLS series ID
+    release: str    # 発表（同じ日・同じ時刻に出るもの）
+    label: str
+    unit: str
+
+REGISTRY: tuple[BlsSeries, ...] = (
+    # 雇用統計（Employment Situation）
+    BlsSeries("nfp", "CES0000000001", "employment", "非農業部門雇用者数", "千人"),
+    BlsSeries("ahe", "CES0500000003", "employment", "平均時給", "ドル"),
+    BlsSeries("hours", "CES0500000002", "employment", "平均週労働時間", "時間"),
+    BlsSeries("ur", "LNS14000000", "employment", "失業率", "%"),
+    BlsSeries("lfpr", "LNS11300000", "employment", "労働参加率", "%"),
+    # 消費者物価（CPI、季節調整済み）と同時発表の実質賃金
+    BlsSeries("cpi", "CUSR0000SA0", "cpi", "CPI", "指数"),
+    BlsSeries("core", "CUSR0000SA0L1E", "cpi", "コアCPI", "指数"),
+    BlsSeries("food", "CUSR0000SAF1", "cpi", "CPI 食品", "指数"),
+    BlsSeries("energy", "CUSR0000SA0E", "cpi", "CPI エネルギー", "指数"),
+    BlsSeries("shelter", "CUSR0000SAH1", "cpi", "CPI 住居費", "指数"),
+    BlsSeries("real_ahe", "CES0500000013", "cpi", "実質平均時給", "1982-84年ドル"),
+    # 生産者物価（最終需要）
+    BlsSeries("ppi", "WPSFD4", "ppi", "PPI 最終需要", "指数"),
+    # 求人件数（JOLTS）
+    BlsSeries("jolts", "JTS000000000000000JOL", "jolts", "求人件数", "千件"),
+)
+
+_BY_KEY = {s.key: s for s in REGISTRY}
+_BY_ID = {s.id: s for s in REGISTRY}
+
+RELEASES = tuple(dict.fromkeys(s.release for s in REGISTRY))
+
+def get(key: str) -> BlsSeries:
+    return _BY_KEY[key]
+
+def sid(key: str) -> str:
+    return _BY_KEY[key].id
+
+def by_id(series_id: str) -> BlsSeries | None:
+    return _BY_ID.get(series_id)
+
+def series_for(*releases: str) -> list[str]:
+    """指定した発表に属する系列 ID（台帳順・重複なし）"""
+    unknown = set(releases) - set(RELEASES)
+    if unknown:
+        raise KeyError(f"unknown BLS release: {sorted(unknown)}")
+    return [s.id for s in REGISTRY if s.release in releases]
@@ -0,0 +1,250 @@
+# bot_common/charts.py
+#
+# 投稿に添付するチャート（直近 CHART_MONTHS か月）。matplotlib は任意（無ければチャート無しで投稿）。
+# - 発表前（arm）: 前月までの履歴を描いた土台（base）を作り、Agg のピクセルを保存しておく。
+#   土台は (指標, 対象月, データの vintage) をキーにキャッシュするので、同じ履歴なら描き直さない
+# - 発表時: 保存したピクセルを戻し、最後の点（棒）と値のラベルだけを描いて PNG にする（blit）
+# - 描画は専用の1スレッド（matplotlib はスレッドセーフではない）で行い、本文の準備と並行する
+#
+# アップロードと「本文の投稿をチャートで CHART_BUDGET_MS 以上遅らせない」制御は publish 側。
+
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from importlib.util import find_spec
+from typing import NamedTuple
+
+from bot_common.trace import span
+
+CHARTS = os.getenv("CHARTS", "1") == "1"
+CHART_MONTHS = int(os.getenv("CHART_MONTHS", "36"))
+# 本文の投稿をチャート（描画 + アップロード）のために待つ上限。取得・組み立ての短縮分より小さく保つ
+CHART_BUDGET_MS = float(os.getenv("CHART_BUDGET_MS", "300"))
+
+class Chart(NamedTuple):
+    png: bytes
+    alt: str      # 代替テキスト（Bluesky の alt）
+
+class Line(NamedTuple):
+    key: str          # history / points のキー
+    label: str
+    color: str
+    bar: bool = False
+
+class Panel(NamedTuple):
+    title: str
+    unit: str
+    lines: tuple[Line, ...]
+
+# 日本語フォントが無いランナーでも文字化けしないよう、図中の文字は英語にする
+LAYOUTS: dict[str, tuple[str, tuple[Panel, ...]]] = {
+    "cpi": ("US CPI", (
+        Panel("MoM", "%", (Line("cpi_mom", "CPI", "#1f77b4"), Line("core_mom", "Core CPI", "#d62728"))),
+        Panel("YoY", "%", (Line("cpi_yoy", "CPI", "#1f77b4"), Line("core_yoy", "Core CPI", "#d62728"))),
+    )),
+    "employment": ("US Employment Situation", (
+        Panel("Nonfarm payrolls, change", "10k", (Line("nfp", "NFP", "#2ca02c", bar=True),)),
+        Panel("Unemployment rate", "%", (Line("ur", "Unemployment rate", "#9467bd"),)),
+        Panel("Average hourly earnings, YoY", "%", (Line("ahe_yoy", "AHE", "#ff7f0e"),)),
+    )),
+}
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chart")
+_bases: "OrderedDict[tuple, Base]" = OrderedDict()
+_bases_lock = threading.Lock()
+_MAX_BASES = 8
+
+def available() -> bool:
+    return CHARTS and find_spec("matplotlib") is not None
+
+def vintage(history: dict) -> str:
+    """履歴の中身のハッシュ（改定が入れば変わる）"""
+    h = hashlib.sha1()
+    for key in sorted(history):
+        s = history[key]
+        h.update(f"{key}:{s.start}:".encode())
+        h.update(s.values.tobytes())
+    return h.hexdigest()[:16]
+
+class Base:
+    """描画済みの土台。finish() で最後の点を足して PNG を返す。"""
+
+    def __init__(self, kind: str, target: int, fig, canvas, background, finals: dict, alt: str):
+        self.kind = kind
+        self.target = target  # 通し月番号
+        self.fig = fig
+        self.canvas = canvas
+        self.background = background
+        self.finals = finals  # key → (Line, axes, 最後の点の artist, 値ラベル, 前月の値)
+        self.alt = alt
+
+def _build(kind: str, history: dict, target: int, months: int, expect: dict) -> Base:
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+    from matplotlib.patches import Rectangle
+    import numpy as np
+
+    from bot_common.series import month_str
+
+    title, panels = LAYOUTS[kind]
+    fig = Figure(figsize=(8, 1.9 + 2.1 * len(panels)), dpi=150)
+    canvas = FigureCanvasAgg(fig)
+    axes = fig.subplots(len(panels), 1, sharex=True)
+    axes = np.atleast_1d(axes)
+    fig.suptitle(f"{title} (through {month_str(target)})", fontsize=12, x=0.02, ha="left")
+
+    first = target - months + 1
+    xs = np.arange(first, target + 1)
+    finals = {}
+    for ax, panel in zip(axes, panels):
+        lows, highs = [], []
+        for line in panel.lines:
+            s = history.get(line.key)
+            v = np.full(len(xs), np.nan)
+            if s is not None and len(s):
+                lo, hi = max(first, s.start), min(target - 1, s.start + len(s) - 1)
+                if hi >= lo:
+                    v[lo - first: hi - first + 1] = s.values[lo - s.start: hi - s.start + 1]
+            hist = v[:-1]
+            if line.bar:
+                ax.bar(xs[:-1], np.nan_to_num(hist), width=0.8, color=line.color, alpha=0.55, label=line.label)
+                final = Rectangle((target - 0.4, 0), 0.8, 0, color=line.color, animated=True, visible=False)
+                ax.add_patch(final)
+            else:
+                ax.plot(xs[:-1], hist, color=line.color, lw=1.6, label=line.label)
+                (final,) = ax.plot([], [], color=line.color, lw=1.6, marker="o", ms=5, markevery=[-1], animated=True,
+                                   visible=False, clip_on=False)
+            label = ax.annotate("", (target, 0), xytext=(4, 4), textcoords="offset points", fontsize=8,
+                                color=line.color, fontweight="bold", animated=True, visible=False, annotation_clip=False)
+            prev = hist[-1] if len(hist) and not np.isnan(hist[-1]) else None
+            finals[line.key] = (line, ax, final, label, prev)
+            # 発表値が予想付近に来ても枠内に収まるよう、予想値も軸の範囲に含める
+            vals = hist[~np.isnan(hist)]
+            extra = [x for x in (expect.get(line.key),) if x is not None]
+            if len(vals) or extra:
+                lows.append(min([*vals.tolist(), *extra, 0.0 if line.bar else np.inf]))
+                highs.append(max([*vals.tolist(), *extra, 0.0 if line.bar else -np.inf]))
+        if lows:
+            lo, hi = min(lows), max(highs)
+            pad = (hi - lo) * 0.18 or 0.5
+            ax.set_ylim(lo - pad, hi + pad)
+        ax.set_title(f"{panel.title} ({panel.unit})", fontsize=9, loc="left")
+        ax.axhline(0, color="#888", lw=0.6)
+        ax.grid(axis="y", alpha=0.3)
+        if len(panel.lines) > 1:
+            ax.legend(fontsize=7, loc="upper left", frameon=False)
+        ax.tick_params(labelsize=7)
+
+    ax = axes[-1]
+    ax.set_xlim(first - 0.7, target + 2.0)  # 右端は値ラベルの分
+    ticks = [x for x in xs if x % 12 in (0, 6)]
+    ax.set_xticks(ticks, [month_str(int(x)) for x in ticks])
+    fig.subplots_adjust(left=0.08, right=0.97, top=0.9, bottom=0.07, hspace=0.45)
+
+    canvas.draw()
+    background = canvas.copy_from_bbox(fig.bbox)
+    alt = f"{title}: last {months} months of " + ", ".join(p.title for p in panels)
+    return Base(kind, target, fig, canvas, background, finals, alt)
+
+def prepare(kind: str, history: dict, target: str, expect: dict | None = None, months: int = CHART_MONTHS) -> Base | None:
+    """
+    target（YYYY-MM）の前月までを描いた土台。history: {key: MonthlySeries}、expect: {key: 予想値}。
+    matplotlib が無い・CHARTS=0 なら None。
+    """
+    if not available():
+        return None
+    from bot_common.series import month_index
+
+    expect = expect or {}
+    key = (kind, target, months, vintage(history), tuple(sorted((k, v) for k, v in expect.items() if v is not None)))
+    with _bases_lock:
+        base = _bases.get(key)
+        if base is not None:
+            _bases.move_to_end(key)
+            return base
+    with span("chart.prepare", kind=kind, target=target):
+        base = _build(kind, history, month_index(target), months, expect)
+    with _bases_lock:
+        _bases[key] = base
+        while len(_bases) > _MAX_BASES:
+            _bases.popitem(last=False)
+    return base
+
+def finish(base: Base | None, target: str, points: dict) -> Chart | None:
+    """土台に target の値（points: {key: value}）を描き足した PNG。土台の月と違えば None。"""
+    if base is None:
+        return None
+    from PIL import Image
+
+    from bot_common.series import month_index
+
+    if month_index(target) != base.target:
+        print(f"[chart] base is for another month; skipping chart for {target}")
+        return None
+    with span("chart.finish", kind=base.kind, target=target):
+        base.canvas.restore_region(base.background)
+        for key, (line, ax, final, label, prev) in base.finals.items():
+            value = points.get(key)
+            if value is None:
+                continue
+            if line.bar:
+                final.set_height(value)
+            else:
+                xs = [base.target - 1, base.target] if prev is not None else [base.target]
+                ys = [prev, value] if prev is not None else [value]
+                final.set_data(xs, ys)
+            label.xy = (base.target, value)
+            label.set_text(f"{value:.1f}" if round(value, 1) == value else f"{value:.2f}")
+            for artist in (final, label):
+                artist.set_visible(True)
+                ax.draw_artist(artist)
+                artist.set_visible(False)
+        w, h = base.canvas.get_width_height()
+        img = Image.frombuffer("RGBA", (w, h), bytes(base.canvas.buffer_rgba()), "raw", "RGBA", 0, 1)
+        out = io.BytesIO()
+        # 圧縮率より速さ（発表時の経路）
+        img.convert("RGB").save(out, format="PNG", compress_level=1)
+        return Chart(out.getvalue(), base.alt)
+
+def last_month(history: dict) -> int | None:
+    """履歴の最新の通し月番号（どの系列にも値が無ければ None）"""
+    ends = [s.start + len(s) - 1 for s in history.values() if s is not None and len(s)]
+    return max(ends) if ends else None
+
+def prepare_async(kind: str, history: dict, target: str, expect: dict | None = None) -> Future | None:
+    """
+    描画スレッドで prepare する。履歴が target の前月で終わっていない（ストアが古い）なら
+    前月の抜けたチャートになるので描かずに None（発表時にチャートを待たない）。
+    """
+    if not available():
+        return None
+    from bot_common.series import month_index, month_str
+
+    last = last_month(history)
+    if last != month_index(target) - 1:
+        print(f"[chart] history ends at {month_str(last) if last is not None else 'nothing'}, not the month before "
+              f"{target}; no chart")
+        return None
+    return _executor.submit(_quiet, prepare, kind, history, target, expect)
+
+def finish_async(base: Future | Base | None, target: str, points: dict) -> Future:
+    """
+    描画スレッドで finish する（prepare_async の後に積まれるので土台は出来上がっている）。
+    土台の月と target が違うと分かっているときは呼ばないこと（土台の描画を待つだけになる）。
+    """
+    def _run():
+        b = base.result() if isinstance(base, Future) else base
+        return finish(b, target, points)
+
+    return _executor.submit(_quiet, _run)
+
+def _quiet(fn, *args):
+    # チャートの失敗で投稿を止めない
+    try:
+        return fn(*args)
+    except Exception as e:
+        print(f"[chart] {fn.__name__} failed: {type(e).__name__}: {e}")
+        return None
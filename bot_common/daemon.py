@@ -0,0 +1,199 @@
+# bot_common/daemon.py
+#
+# 常駐サービス。BLS の公式リリースカレンダー（ICS）を読み、各指標のジョブを
+# 発表の少し前に起こして同じプロセス・同じイベントループで並行に走らせる。
+# モジュールの import、HTTP セッション（keep-alive）、条件付き取得のキャッシュ、
+# 観測ストアの接続はジョブをまたいで使い回すので、発表時にコールドスタートが無い。
+#
+#   python -m bot_common.daemon                       # 公式カレンダーで常駐
+#   python -m bot_common.daemon --list                # 今後の予定を表示して終了
+#   python -m bot_common.daemon --calendar fixtures/calendar/bls.ics --only cpi --once
+#
+# 投稿するのはこのデーモンか GitHub Actions のワークフローのどちらか一方だけにすること。
+# 各ボットの state の claim は同じホストの SQLite の中でしか効かない（Actions のランナーは
+# 自分のキャッシュから別の state を復元する）ので、両方が動くと同じ発表が2回投稿される。
+# デーモンを使うときはリポジトリ変数 POSTING_RUNNER=daemon を設定して、
+# cpi_post / employment_post の投稿ジョブを止める。
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, NamedTuple
+from zoneinfo import ZoneInfo
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CALENDAR_URL = os.getenv("RELEASE_CALENDAR_URL", "https://www.bls.gov/schedule/news_release/bls.ics")
+# 発表の何秒前にジョブを起こすか（ジョブ内の poll_release がさらに RELEASE_ARM_SEC 前から待つ）
+ARM_LEAD_SEC = float(os.getenv("DAEMON_ARM_LEAD_SEC", "120"))
+# 発表時刻を過ぎてからでも起動するまでの猶予（再起動直後など）
+LATE_GRACE_SEC = float(os.getenv("DAEMON_LATE_GRACE_SEC", "600"))
+REFRESH_SEC = float(os.getenv("DAEMON_CALENDAR_REFRESH_SEC", "21600"))
+
+ET = ZoneInfo("America/New_York")
+# ICS の TZID（BLS は "US-Eastern"）→ zoneinfo
+_TZIDS = {"US-Eastern": ET, "US/Eastern": ET, "America/New_York": ET}
+
+class Release(NamedTuple):
+    indicator: str
+    title: str
+    at: datetime  # UTC
+
+# ========= Calendar =========
+def _unfold(text: str) -> list[str]:
+    """RFC 5545 の行折り返し（CRLF + 空白）を戻す"""
+    out: list[str] = []
+    for line in text.splitlines():
+        if line[:1] in (" ", "\t") and out:
+            out[-1] += line[1:]
+        elif line:
+            out.append(line)
+    return out
+
+def _parse_dt(params: str, value: str) -> datetime | None:
+    if "VALUE=DATE" in params and "T" not in value:
+        return None  # 終日イベントは時刻が無いので扱わない
+    if value.endswith("Z"):
+        return datetime.strptime(value, "%Y%m%dT%H%M%SZ").replace(tzinfo=timezone.utc)
+    tz = ET
+    for p in params.split(";"):
+        if p.startswith("TZID="):
+            tz = _TZIDS.get(p[5:].strip('"'), ET)
+    return datetime.strptime(value, "%Y%m%dT%H%M%S").replace(tzinfo=tz).astimezone(timezone.utc)
+
+def parse_ics(text: str, jobs: dict | None = None) -> list[Release]:
+    """ジョブのある発表（SUMMARY の先頭一致）だけを時刻順で返す"""
+    jobs = JOBS if jobs is None else jobs
+    out = []
+    event: dict[str, tuple[str, str]] | None = None
+    for line in _unfold(text):
+        if line == "BEGIN:VEVENT":
+            event = {}
+            continue
+        if line == "END:VEVENT":
+            if event and "SUMMARY" in event and "DTSTART" in event:
+                title = event["SUMMARY"][1].replace("\\,", ",").strip()
+                at = _parse_dt(*event["DTSTART"])
+                for indicator, (prefix, _) in jobs.items():
+                    if at is not None and title.startswith(prefix):
+                        out.append(Release(indicator, title, at))
+            event = None
+            continue
+        if event is None or ":" not in line:
+            continue
+        head, value = line.split(":", 1)
+        name, _, params = head.partition(";")
+        event[name.upper()] = (params, value)
+    return sorted(out, key=lambda r: (r.at, r.indicator))
+
+def load_calendar(source: str = CALENDAR_URL) -> list[Release]:
+    if not source.startswith(("http://", "https://")):
+        with open(source, "r", encoding="utf-8") as f:
+            return parse_ics(f.read())
+    from bot_common.http_client import fetch_if_changed
+
+    # bls.gov はブラウザ以外の UA を弾くことがある
+    headers = {"User-Agent": os.getenv("BLS_USER_AGENT", "Mozilla/5.0 (EconomicIndicators_BOT)")}
+    _, releases = fetch_if_changed("GET", source, lambda r: parse_ics(r.text), headers=headers, timeout=30)
+    return releases
+
+# ========= Jobs =========
+def _run_cpi(release_at: datetime):
+    sys.path.insert(0, os.path.join(ROOT, "cpi_fred_nowcast"))
+    import cpi_bot
+
+    cpi_bot.post_cpi(release_at.isoformat())
+
+def _run_employment(release_at: datetime):
+    from employment_report import run
+
+    run.main(release_at.isoformat())
+
+# indicator → (カレンダーの SUMMARY の先頭, ジョブ)。指標を増やすときはここに足す
+JOBS: dict[str, tuple[str, Callable[[datetime], None]]] = {
+    "cpi": ("Consumer Price Index", _run_cpi),
+    "employment": ("Employment Situation", _run_employment),
+}
+
+def _preload():
+    """ジョブが使うモジュールと HTTP セッションを起動時に読み込んでおく"""
+    t0 = time.perf_counter()
+    sys.path.insert(0, os.path.join(ROOT, "cpi_fred_nowcast"))
+    import cpi_bot  # noqa: F401
+    from bot_common.http_client import session
+    from employment_report import run  # noqa: F401
+
+    session()
+    print(f"[daemon] preloaded bots in {(time.perf_counter() - t0) * 1000.0:.0f}ms")
+
+async def _arm_and_run(rel: Release, lead_sec: float):
+    from bot_common.trace import span
+
+    wait = (rel.at - timedelta(seconds=lead_sec) - datetime.now(timezone.utc)).total_seconds()
+    if wait > 0:
+        await asyncio.sleep(wait)
+    print(f"[daemon] {rel.indicator}: armed for {rel.title} at {rel.at.isoformat()}")
+    _, job = JOBS[rel.indicator]
+    try:
+        with span(f"daemon.{rel.indicator}", release_at=rel.at.isoformat(), title=rel.title):
+            await asyncio.to_thread(job, rel.at)
+        print(f"[daemon] {rel.indicator}: done ({rel.title})")
+    except Exception as e:
+        # 1つのジョブの失敗で常駐プロセスを落とさない
+        print(f"[daemon] {rel.indicator}: failed: {type(e).__name__}: {e}")
+
+def upcoming(releases: list[Release], only: set[str] | None = None, now: datetime | None = None) -> list[Release]:
+    now = now or datetime.now(timezone.utc)
+    earliest = now - timedelta(seconds=LATE_GRACE_SEC)
+    return [r for r in releases if r.at >= earliest and (only is None or r.indicator in only)]
+
+async def serve(source: str = CALENDAR_URL, only: set[str] | None = None, once: bool = False,
+                lead_sec: float = ARM_LEAD_SEC):
+    _preload()
+    tasks: dict[tuple[str, datetime], asyncio.Task] = {}
+    while True:
+        try:
+            releases = upcoming(await asyncio.to_thread(load_calendar, source), only)
+        except Exception as e:
+            print(f"[daemon] calendar refresh failed (keeping current schedule): {e}")
+            releases = []
+        for rel in releases:
+            key = (rel.indicator, rel.at)
+            if key not in tasks:
+                tasks[key] = asyncio.create_task(_arm_and_run(rel, lead_sec))
+                print(f"[daemon] scheduled {rel.indicator}: {rel.title} at {rel.at.astimezone(ET).isoformat()}")
+        # 終わったジョブは捨てる（同じ発表がカレンダーに残っていても再スケジュールしない）
+        now = datetime.now(timezone.utc)
+        for key in [k for k, t in tasks.items() if t.done() and k[1] < now - timedelta(seconds=LATE_GRACE_SEC)]:
+            del tasks[key]
+
+        if once:
+            if tasks:
+                await asyncio.gather(*tasks.values())
+            return
+        await asyncio.sleep(REFRESH_SEC)
+
+def main():
+    ap = argparse.ArgumentParser(description="Resident release daemon driven by the BLS release calendar.")
+    ap.add_argument("--calendar", default=CALENDAR_URL, help="ICS URL or file")
+    ap.add_argument("--only", help="comma-separated indicators (default: all of %s)" % ",".join(JOBS))
+    ap.add_argument("--lead-sec", type=float, default=ARM_LEAD_SEC)
+    ap.add_argument("--once", action="store_true", help="run the currently scheduled releases, then exit")
+    ap.add_argument("--list", action="store_true", help="print upcoming releases and exit")
+    args = ap.parse_args()
+
+    only = set(args.only.split(",")) if args.only else None
+    if args.list:
+        for rel in upcoming(load_calendar(args.calendar), only):
+            print(f"{rel.at.astimezone(ET).isoformat()}  {rel.indicator:<11} {rel.title}")
+        return
+    try:
+        asyncio.run(serve(args.calendar, only, args.once, args.lead_sec))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+# bot_common/export.py
+#
+# 投稿のために計算した数値（水準・前月比・前年比・予想・前回値の改定）を、他のサービスや
+# バックフィルから API を叩かずに読めるよう Arrow IPC のデータセットに書き出す。
+# - 置き場所は EXPORT_DIR/indicator=<指標>/year=<対象月の年>/（Hive 形式のパーティション）
+# - 1発表 = 1ファイル（part-<対象月>-<計算時刻>.arrow）。追記専用で、既存のファイルは書き換えない。
+#   同じ月を再計算したら新しいファイルが増え、読み出し側は既定で最新のファイルだけを使う
+# - 読み出しは pa.memory_map で開くのでコピーせずに載る（数十年分でも数ミリ秒）
+# - pyarrow は任意（無ければ書き出さない）。Parquet が欲しい利用者向けに変換コマンドを用意する
+#
+#   python -m bot_common.export show cpi --year 2025
+#   python -m bot_common.export parquet --out data/releases_parquet
+#   python -m bot_common.export info
+
+import argparse
+import os
+import re
+import time
+from datetime import datetime, timezone
+from importlib.util import find_spec
+
+from bot_common.trace import span
+
+EXPORT = os.getenv("EXPORT", "1") == "1"
+EXPORT_DIR = os.getenv("EXPORT_DIR", "data/releases")
+
+# 1行 = 1発表 × 1項目
+COLUMNS = (
+    ("release_month", "string"),   # 対象月 YYYY-MM
+    ("field", "string"),           # cpi_mom / nfp_man / ur など
+    ("value", "float64"),          # 結果
+    ("prev", "float64"),           # 前回（この発表時点の値）
+    ("forecast", "float64"),       # 予想（無ければ null）
+    ("revised_prev", "float64"),   # 前回が改定されていれば、前の投稿での値（無ければ null）
+    ("source", "string"),          # fred / bls など
+    ("computed_at", "timestamp"),  # 計算した時刻（UTC）
+)
+
+_PART = re.compile(r"part-(\d{4}-\d{2})-(\d{8}T\d{6}\d*Z)\.arrow$")
+
+def available() -> bool:
+    return EXPORT and find_spec("pyarrow") is not None
+
+def schema():
+    import pyarrow as pa
+
+    types = {"string": pa.string(), "float64": pa.float64(), "timestamp": pa.timestamp("ms", tz="UTC")}
+    return pa.schema([(name, types[t]) for name, t in COLUMNS])
+
+def _partition(root: str, indicator: str, year: int) -> str:
+    return os.path.join(root, f"indicator={indicator}", f"year={year}")
+
+# ========= Write =========
+def rows_for(fields: dict[str, dict]) -> list[dict]:
+    """{field: {"value", "prev", "forecast", "revised_prev"}} → 書き出す行（値の無い項目は捨てる）"""
+    out = []
+    for field, d in fields.items():
+        if d.get("value") is None:
+            continue
+        out.append({"field": field, **{k: d.get(k) for k in ("value", "prev", "forecast", "revised_prev")}})
+    return out
+
+def write(indicator: str, ym: str, fields: dict[str, dict], source: str,
+          computed_at: datetime | None = None, root: str = EXPORT_DIR) -> str | None:
+    """
+    ym の発表1回分を書き出し、ファイルのパスを返す。fields は rows_for() の形。
+    pyarrow が無い・EXPORT=0・書く行が無ければ None。
+    """
+    if not available():
+        return None
+    rows = rows_for(fields)
+    if not rows:
+        return None
+    import pyarrow as pa
+
+    computed_at = computed_at or datetime.now(timezone.utc)
+    n = len(rows)
+    cols = {name: [r[name] for r in rows] for name in ("field", "value", "prev", "forecast", "revised_prev")}
+    table = pa.table({"release_month": [ym] * n, **cols, "source": [source] * n, "computed_at": [computed_at] * n},
+                     schema=schema())
+
+    part = _partition(root, indicator, int(ym[:4]))
+    os.makedirs(part, exist_ok=True)
+    stamp = computed_at.astimezone(timezone.utc).strftime("%Y%m%dT%H%M%S%f") + "Z"
+    path = os.path.join(part, f"part-{ym}-{stamp}.arrow")
+    with span("export.write", indicator=indicator, ym=ym, rows=len(rows)):
+        tmp = f"{path}.tmp"
+        with pa.OSFile(tmp, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(tmp, path)
+    return path
+
+# ========= Read =========
+def files(indicator: str | None = None, years=None, latest: bool = True, root: str = EXPORT_DIR) -> list[tuple[str, int, str]]:
+    """
+    [(指標, 年, パス)]（指標・対象月・計算時刻の順）。ディレクトリ名でパーティションを絞る。
+    latest=True なら同じ対象月のファイルは計算時刻が最新のものだけ。
+    """
+    out = []
+    if not os.path.isdir(root):
+        return out
+    years = None if years is None else {int(y) for y in years}
+    for ind_dir in sorted(os.listdir(root)):
+        if not ind_dir.startswith("indicator="):
+            continue
+        ind = ind_dir.split("=", 1)[1]
+        if indicator is not None and ind != indicator:
+            continue
+        for year_dir in sorted(os.listdir(os.path.join(root, ind_dir))):
+            if not year_dir.startswith("year="):
+                continue
+            year = int(year_dir.split("=", 1)[1])
+            if years is not None and year not in years:
+                continue
+            part = os.path.join(root, ind_dir, year_dir)
+            newest: dict[str, str] = {}
+            for name in sorted(os.listdir(part)):
+                m = _PART.match(name)
+                if m is None:
+                    continue
+                if latest:
+                    newest[m.group(1)] = name  # 名前順 = 計算時刻順なので最後が最新
+                else:
+                    out.append((ind, year, os.path.join(part, name)))
+            out.extend((ind, year, os.path.join(part, newest[k])) for k in sorted(newest))
+    return out
+
+def read(indicator: str | None = None, years=None, fields=None, latest: bool = True, root: str = EXPORT_DIR):
+    """
+    書き出した発表を1つの pyarrow.Table で返す（indicator / year 列付き）。
+    各ファイルは memory_map で開くので値はコピーされない。fields で項目を絞る。
+    """
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    tables, inds, years_, counts = [], [], [], []
+    with span("export.read", indicator=indicator or "*") as s:
+        for ind, year, path in files(indicator, years, latest, root):
+            with pa.memory_map(path, "r") as src:
+                t = pa.ipc.open_file(src).read_all()
+            tables.append(t)
+            inds.append(ind)
+            years_.append(year)
+            counts.append(t.num_rows)
+        s["files"] = len(tables)
+    out = pa.concat_tables(tables) if tables else schema().empty_table()
+    # パーティション列はファイルごとではなく最後にまとめて付ける
+    out = out.append_column("indicator", pa.array(np.repeat(np.array(inds, dtype=object), counts), pa.string())) \
+             .append_column("year", pa.array(np.repeat(np.array(years_, dtype=np.int32), counts), pa.int32()))
+    if fields is not None:
+        out = out.filter(pc.is_in(out["field"], value_set=pa.array(list(fields), pa.string())))
+    return out
+
+def to_parquet(out_dir: str, indicator: str | None = None, root: str = EXPORT_DIR) -> int:
+    """最新のファイルだけを Hive 形式（indicator= / year=）の Parquet データセットに書き出す。行数を返す。"""
+    import pyarrow.dataset as ds
+
+    table = read(indicator, root=root)
+    ds.write_dataset(table, out_dir, format="parquet", partitioning=["indicator", "year"],
+                     partitioning_flavor="hive", existing_data_behavior="delete_matching")
+    return table.num_rows
+
+# ========= CLI =========
+def main():
+    ap = argparse.ArgumentParser(description="Read or convert the exported release dataset.")
+    ap.add_argument("--root", default=EXPORT_DIR)
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("show")
+    p.add_argument("indicator", nargs="?")
+    p.add_argument("--year", type=int, action="append")
+    p.add_argument("--field", action="append")
+    p.add_argument("--all-vintages", action="store_true", help="include recomputed releases, not only the latest")
+    p = sub.add_parser("parquet", help="write the latest releases as a Hive-partitioned Parquet dataset")
+    p.add_argument("--out", default=f"{EXPORT_DIR}_parquet")
+    p.add_argument("indicator", nargs="?")
+    sub.add_parser("info")
+    args = ap.parse_args()
+
+    if args.cmd == "show":
+        t0 = time.perf_counter()
+        t = read(args.indicator, args.year, args.field, latest=not args.all_vintages, root=args.root)
+        ms = (time.perf_counter() - t0) * 1000.0
+        for r in t.to_pylist():
+            extra = "" if r["revised_prev"] is None else f" (revised from {r['revised_prev']:g})"
+            fc = "" if r["forecast"] is None else f" forecast {r['forecast']:g}"
+            prev = "" if r["prev"] is None else f" prev {r['prev']:g}"
+            print(f"{r['indicator']:<11} {r['release_month']} {r['field']:<10} {r['value']:>10g}{prev}{extra}{fc}"
+                  f"  [{r['source']} {r['computed_at']:%Y-%m-%dT%H:%M:%SZ}]")
+        print(f"[export] {t.num_rows} rows in {ms:.1f}ms")
+    elif args.cmd == "parquet":
+        n = to_parquet(args.out, args.indicator, root=args.root)
+        print(f"[export] {n} rows -> {args.out}")
+    else:
+        for ind, year, path in files(root=args.root, latest=False):
+            print(f"{ind:<11} {year}  {os.path.basename(path)}  {os.path.getsize(path)}B")
+
+if __name__ == "__main__":
+    main()
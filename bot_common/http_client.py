@@ -0,0 +1,165 @@
+# bot_common/http_client.py
+#
+# cpi_bot と employment_report で共有する HTTP レイヤー。
+# keep-alive のコネクションプールを持つ Session を1つだけ作り、
+# リトライや並列リクエストでも TLS 済みのコネクションを使い回す。
+
+import contextvars
+import hashlib
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, TypeVar
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from bot_common import quota
+from bot_common.trace import span
+
+T = TypeVar("T")
+
+POOL_MAXSIZE = 8
+MAX_WORKERS = 8
+FETCH_WORKERS = 8
+
+_lock = threading.Lock()
+_session: requests.Session | None = None
+_executor: ThreadPoolExecutor | None = None
+# gather 専用。submit のタスク（レース・hedge・投稿）は中で gather して結果を待つので、
+# 同じプールで回すと常駐デーモンでジョブが重なったときに待つ側だけでワーカーが埋まる
+_fetch_executor: ThreadPoolExecutor | None = None
+
+# 条件付きリクエスト用: リクエストごとの ETag / Last-Modified / 本文ハッシュ と前回の parse 結果
+_validators: dict[tuple, dict] = {}
+
+def session() -> requests.Session:
+    global _session
+    with _lock:
+        if _session is None:
+            s = requests.Session()
+            adapter = HTTPAdapter(pool_connections=8, pool_maxsize=POOL_MAXSIZE, max_retries=0)
+            s.mount("https://", adapter)
+            s.mount("http://", adapter)
+            _session = s
+        return _session
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="http")
+        return _executor
+
+def _fetch_pool() -> ThreadPoolExecutor:
+    global _fetch_executor
+    with _lock:
+        if _fetch_executor is None:
+            _fetch_executor = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix="fetch")
+        return _fetch_executor
+
+def submit(fn: Callable[[], T]):
+    # 呼び出し元の span を親として引き継ぐ
+    return _pool().submit(contextvars.copy_context().run, fn)
+
+def gather(*calls: Callable[[], T]) -> list[T]:
+    """
+    引数なし callable を並列に実行し、渡した順に結果を返す。
+    どれかが例外を投げた場合は、全ての完了を待ってから最初の例外を送出する。
+    calls は submit のプールとは別のワーカーで回すので、中で submit / gather の結果を待たないこと。
+    """
+    pool = _fetch_pool()
+    futures = [pool.submit(contextvars.copy_context().run, c) for c in calls]
+    results = []
+    first_err = None
+    for f in futures:
+        try:
+            results.append(f.result())
+        except Exception as e:
+            results.append(None)
+            if first_err is None:
+                first_err = e
+    if first_err is not None:
+        raise first_err
+    return results
+
+def _cache_key(method: str, url: str, kwargs: dict) -> tuple:
+    return (
+        method.upper(),
+        url,
+        json.dumps(kwargs.get("params"), sort_keys=True, default=str),
+        json.dumps(kwargs.get("json"), sort_keys=True, default=str),
+    )
+
+def fetch_if_changed(
+    method: str,
+    url: str,
+    parse: Callable[[requests.Response], T],
+    normalize: Callable[[bytes], bytes] | None = None,
+    upstream: str | None = None,
+    seed: dict | None = None,
+    **kwargs,
+) -> tuple[bool, T]:
+    """
+    ポーリング用の条件付き取得。前回の ETag / Last-Modified があれば If-None-Match /
+    If-Modified-Since を付け、304 なら parse せずに前回の結果を返す。
+    サーバーが検証子を返さない場合は本文のハッシュで比較し、同じなら parse を飛ばす。
+    normalize は応答時刻など毎回変わる部分をハッシュ前に取り除くのに使う。
+    parse が例外を投げた結果はキャッシュしない。
+    upstream を指定すると quota のトークンを1つ使い、429 なら quota.Throttled を投げる。
+    seed はプロセスをまたいで保存しておいた前回分（{"etag", "last_modified", "hash", "parsed"}）。
+    このプロセスでまだ取得していないときだけ使う。保存する値は validators() で取り出す。
+    returns: (changed, parsed)
+    """
+    key = _cache_key(method, url, kwargs)
+    with _lock:
+        if key not in _validators and seed is not None:
+            _validators[key] = seed
+        prev = _validators.get(key)
+
+    headers = dict(kwargs.pop("headers", None) or {})
+    if prev is not None:
+        if prev["etag"]:
+            headers["If-None-Match"] = prev["etag"]
+        if prev["last_modified"]:
+            headers["If-Modified-Since"] = prev["last_modified"]
+
+    u = urlparse(url)
+    with span("fetch", method=method.upper(), host=u.netloc, path=u.path) as s:
+        if upstream is not None:
+            s["quota_wait"] = quota.acquire(upstream)
+        r = session().request(method, url, headers=headers, **kwargs)
+        s["status"] = r.status_code
+        s["bytes"] = len(r.content)
+        if r.status_code == 429 and upstream is not None:
+            retry_after = quota.retry_after_from(r.headers)
+            quota.throttle(upstream, retry_after)
+            raise quota.Throttled(upstream, retry_after, "HTTP 429")
+        if r.status_code == 304 and prev is not None:
+            s["changed"] = False
+            return False, prev["parsed"]
+        r.raise_for_status()
+
+        body = r.content if normalize is None else normalize(r.content)
+        digest = hashlib.blake2b(body, digest_size=16).hexdigest()
+        s["changed"] = prev is None or prev["hash"] != digest
+        if not s["changed"]:
+            return False, prev["parsed"]
+
+    with span("parse", host=u.netloc, path=u.path):
+        parsed = parse(r)
+    with _lock:
+        _validators[key] = {
+            "etag": r.headers.get("ETag"),
+            "last_modified": r.headers.get("Last-Modified"),
+            "hash": digest,
+            "parsed": parsed,
+        }
+    return True, parsed
+
+def validators(method: str, url: str, **kwargs) -> dict:
+    """fetch_if_changed が最後に保存した検証子 {"etag", "last_modified", "hash"}（JSON にそのまま書ける）。無ければ {}"""
+    with _lock:
+        prev = _validators.get(_cache_key(method, url, kwargs))
+    return {} if prev is None else {k: prev[k] for k in ("etag", "last_modified", "hash")}
@@ -0,0 +1,102 @@
+# bot_common/obs_store.py
+#
+# FRED / BLS の観測値をローカルの SQLite に蓄積するストア。
+# (series, date, vintage) をキーにし、値が変わったときだけ新しい vintage を追記する。
+# 読み出しは各 date について最新 vintage の値を返す。
+
+import os
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+DB_PATH = os.getenv("OBS_STORE_PATH", "data/observations.sqlite3")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS obs (
+    series  TEXT NOT NULL,
+    date    TEXT NOT NULL,  -- YYYY-MM-DD（月次は YYYY-MM-01）
+    vintage TEXT NOT NULL,  -- FRED: realtime_start / BLS: 初めてその値を見た UTC 時刻
+    value   REAL NOT NULL,
+    PRIMARY KEY (series, date, vintage)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS sync (
+    series    TEXT PRIMARY KEY,
+    synced_at TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+_lock = threading.RLock()
+_conns: dict[str, sqlite3.Connection] = {}
+
+def connect(path: str = DB_PATH) -> sqlite3.Connection:
+    with _lock:
+        conn = _conns.get(path)
+        if conn is None:
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            conn = sqlite3.connect(path, check_same_thread=False)
+            conn.executescript(SCHEMA)
+            _conns[path] = conn
+        return conn
+
+def utc_now() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+def latest(series: str, limit: int | None = None, path: str = DB_PATH) -> list[tuple[str, float]]:
+    """[(date, value)] desc。各 date は最新 vintage の値。"""
+    sql = """
+        SELECT date, value FROM obs o
+        WHERE series = ? AND vintage = (
+            SELECT MAX(vintage) FROM obs WHERE series = o.series AND date = o.date
+        )
+        ORDER BY date DESC
+    """
+    args: tuple = (series,)
+    if limit is not None:
+        sql += " LIMIT ?"
+        args = (series, limit)
+    with _lock:
+        return connect(path).execute(sql, args).fetchall()
+
+def last_date(series: str, path: str = DB_PATH) -> str | None:
+    with _lock:
+        row = connect(path).execute("SELECT MAX(date) FROM obs WHERE series = ?", (series,)).fetchone()
+    return row[0]
+
+def first_vintage(series: str, date: str, path: str = DB_PATH) -> str | None:
+    """date の値が最初に入った vintage（FRED: realtime_start = 発表日 / BLS: 初めて見た UTC 時刻）"""
+    with _lock:
+        row = connect(path).execute("SELECT MIN(vintage) FROM obs WHERE series = ? AND date = ?",
+                                    (series, date)).fetchone()
+    return row[0]
+
+def last_sync(series: str, path: str = DB_PATH) -> str | None:
+    with _lock:
+        row = connect(path).execute("SELECT synced_at FROM sync WHERE series = ?", (series,)).fetchone()
+    return None if row is None else row[0]
+
+def record(series: str, rows, synced_at: str | None = None, path: str = DB_PATH) -> int:
+    """
+    rows: [(date, vintage, value)]
+    既存の最新値と異なる (series, date) だけ追記する。追記件数を返す。
+    """
+    synced_at = synced_at or utc_now()
+    with _lock:
+        conn = connect(path)
+        current = dict(latest(series, path=path))
+        added = 0
+        with conn:
+            for date, vintage, value in rows:
+                if current.get(date) == value:
+                    continue
+                conn.execute(
+                    "INSERT OR REPLACE INTO obs (series, date, vintage, value) VALUES (?, ?, ?, ?)",
+                    (series, date, vintage, value),
+                )
+                current[date] = value
+                added += 1
+            conn.execute(
+                "INSERT OR REPLACE INTO sync (series, synced_at) VALUES (?, ?)",
+                (series, synced_at),
+            )
+        return added
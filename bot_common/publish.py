@@ -0,0 +1,434 @@
+# bot_common/publish.py
+#
+# 発表テキストを設定済みの全チャネル（X / Bluesky / Discord / Slack）に同時に送る。
+# - チャネルごとにタイムアウト・再試行回数・期限を持ち、それぞれ別スレッドで送るので
+#   遅いチャネルが他を待たせない
+# - 複数本に分かれたテキストは X / Bluesky では返信スレッドに、Webhook では1通にまとめる
+# - チャート（charts.Chart）は X / Bluesky の最初の投稿に添付する。描画とアップロードは本文の準備と
+#   並行に進め、publish() の開始から CHART_BUDGET_MS を過ぎても出来ていなければ本文だけを送る
+# - state と key を渡すとチャネルごとに claim する（X は key そのもの、他は "key@channel"）。
+#   失敗したチャネルだけ claim を取り消すので、再実行では未送信のチャネルにだけ送る
+# - 投稿は非冪等。重複を弾いてくれるのは X だけなので、Bluesky / Webhook は「何も送っていない」と
+#   言い切れる失敗（接続の確立前・429）だけ再試行する。送ったか分からない失敗（応答待ちのタイムアウト・
+#   5xx など）は、Bluesky は自分のリポジトリに同じ投稿があるか確かめてから送り直し、Webhook は
+#   「送ったかもしれない」（MaybeSent）として止める。MaybeSent のチャネルは claim を残す
+# - X のスレッドは送れた本の ID を claim キーごとに state に残す（ThreadLog）。途中で失敗した再実行では
+#   送れた本を飛ばし、続きを最後に送れた本にぶら下げる（重複で弾かれた本は ID が返らないため）
+#
+# チャネルは環境変数で有効になる:
+#   X:        X_API_KEY / X_API_SECRET / X_ACCESS_TOKEN / X_ACCESS_SECRET（CPI 側の旧名も可）
+#   Bluesky:  BLUESKY_HANDLE / BLUESKY_APP_PASSWORD（BLUESKY_PDS で PDS を変更）
+#   Discord:  DISCORD_WEBHOOK_URL
+#   Slack:    SLACK_WEBHOOK_URL
+# PUBLISH_CHANNELS="x,discord" のように指定するとその中だけに絞る。
+
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import Future, wait
+from datetime import datetime, timezone
+
+import requests
+from urllib3.exceptions import NewConnectionError
+
+from bot_common import quota, x_client
+from bot_common.charts import CHART_BUDGET_MS
+from bot_common.http_client import session, submit
+from bot_common.retry import retry
+from bot_common.trace import span
+
+PUBLISH_CHANNELS = os.getenv("PUBLISH_CHANNELS", "").strip()
+
+class MaybeSent(Exception):
+    """送信したが相手に届いたか分からない。再送すると二重投稿になりうるので再試行も claim の取り消しもしない。"""
+
+def _not_sent(e: Exception) -> bool:
+    """リクエストが相手に届いていないと言い切れる失敗（接続の確立前・429）か"""
+    if isinstance(e, (requests.ConnectTimeout, quota.Throttled)):
+        return True
+    if isinstance(e, requests.ConnectionError) and not isinstance(e, requests.Timeout):
+        # 名前解決・接続拒否など。送信後に切れた接続（Connection aborted）は送れたか分からない
+        reason = getattr(e.args[0], "reason", None) if e.args else None
+        return isinstance(reason, NewConnectionError)
+    if isinstance(e, requests.HTTPError) and e.response is not None:
+        return e.response.status_code == 429
+    return False
+
+def _ambiguous(e: Exception) -> bool:
+    """送ったが結果が分からない失敗（応答待ちのタイムアウト・送信後に切れた接続・5xx）か"""
+    if _not_sent(e):
+        return False
+    if isinstance(e, (requests.Timeout, requests.ConnectionError)):
+        return True
+    return isinstance(e, requests.HTTPError) and e.response is not None and e.response.status_code >= 500
+
+class Channel(ABC):
+    """送信先。send() はテキスト全部（スレッド・1通へのまとめ方はチャネル次第）を送る。"""
+
+    name = "channel"
+    primary = False       # 失敗したら publish() の呼び出し元に例外として返す
+    timeout = 10.0        # 1リクエストあたり
+    tries = 3
+    deadline_sec = 30.0   # 再試行を含めた1本あたりの期限
+    media = False         # チャートを添付できるか（upload() を上書きしている）
+
+    def retry_if(self, e: Exception) -> bool:
+        return _not_sent(e)
+
+    def arm(self):
+        """発表前の準備（認証・接続の温め）。失敗しても送信時にやり直すだけ。"""
+
+    def upload(self, chart):
+        """チャートをアップロードして send(media=...) に渡すものを返す。None ならチャート無しで送る。"""
+        return None
+
+    @abstractmethod
+    def send(self, texts: list[str], media=None, log: "ThreadLog | None" = None) -> dict:
+        """
+        texts を送り {"ids": [...]} を返す。media は upload() の戻り値（無ければ None）。
+        log は前回までに送れた本の記録（claim したときだけ渡される。使うかはチャネル次第）。
+        """
+
+# ========= X =========
+class XChannel(Channel):
+    name = "x"
+    primary = True
+    media = True
+    timeout = 10.0
+    tries = 4
+    # 1本あたりの再試行の期限（429 の Retry-After がこれを超えるなら諦める）
+    deadline_sec = float(os.getenv("X_POST_DEADLINE_SEC", os.getenv("X_POST_MAX_WAIT_SEC", "60")))
+
+    def __init__(self, url: str = x_client.TWEET_URL, media_url: str = x_client.MEDIA_URL):
+        self.url = url
+        self.media_url = media_url
+
+    def retry_if(self, e: Exception) -> bool:
+        # 投稿は非冪等。再送は重複として拒否されるので、送れたか分からない失敗だけ再試行する
+        return x_client.is_retryable(e)
+
+    def _auth(self):
+        # X_DRY_RUN では認証情報が無くてもよい（post_tweet は送らずに返す）
+        return None if x_client.DRY_RUN else x_client.oauth_from_env()
+
+    def arm(self):
+        self._auth()
+        x_client.warm(self.url)
+
+    def upload(self, chart) -> list[str]:
+        return [x_client.upload_media(self._auth(), chart.png, url=self.media_url, timeout=self.timeout)]
+
+    def send(self, texts: list[str], media=None, log: "ThreadLog | None" = None) -> dict:
+        auth = self._auth()
+        ids: list[str] = []
+        reply_to = None
+        done = log.load() if log is not None else {}
+        for i, text in enumerate(texts):
+            if i in done:
+                # 前回の実行で送れた本。続きはこれにぶら下げる
+                reply_to = done[i]
+                ids.append(done[i])
+                continue
+            media_ids = media if i == 0 else None
+            # スレッドの途中で失敗しても、送れた分は再試行で重複扱いになるだけ
+            res = retry(
+                lambda: x_client.post_tweet(auth, text, url=self.url, timeout=self.timeout, reply_to=reply_to,
+                                            media_ids=media_ids),
+                tries=self.tries, sleep_sec=1.0, name="x_post", deadline_sec=self.deadline_sec, retry_if=self.retry_if,
+            )
+            tweet_id = (res.get("data") or {}).get("id")
+            if tweet_id is None:
+                # 重複として拒否された（投稿済みの）本は ID が返らない。送れた本は log から引くので、ここに来るのは
+                # 記録が無いとき（応答を受け取る前に落ちた・state を失った）。続きは分かっている直前の本にぶら下げる
+                print(f"[publish] x: part {i + 1}/{len(texts)} was already posted; threading the rest under {reply_to}")
+                continue
+            reply_to = tweet_id
+            ids.append(tweet_id)
+            if log is not None:
+                log.save(i, tweet_id)
+        return {"ids": ids}
+
+# ========= Bluesky =========
+class BlueskyChannel(Channel):
+    name = "bluesky"
+    timeout = 10.0
+    media = True
+
+    def __init__(self, handle: str, app_password: str, pds: str = "https://bsky.social"):
+        self.handle = handle
+        self.app_password = app_password
+        self.pds = pds.rstrip("/")
+        self._session: dict | None = None
+        self._lock = threading.Lock()
+
+    def _login(self, refresh: bool = False) -> dict:
+        with self._lock:
+            if self._session is None or refresh:
+                r = session().post(
+                    f"{self.pds}/xrpc/com.atproto.server.createSession",
+                    json={"identifier": self.handle, "password": self.app_password},
+                    timeout=self.timeout,
+                )
+                r.raise_for_status()
+                self._session = r.json()
+            return self._session
+
+    def arm(self):
+        self._login()
+
+    def _xrpc(self, method: str, json: dict | None = None, data: bytes | None = None,
+              content_type: str | None = None) -> dict:
+        for attempt in range(2):
+            sess = self._login(refresh=attempt > 0)
+            headers = {"Authorization": f"Bearer {sess['accessJwt']}"}
+            if content_type:
+                headers["Content-Type"] = content_type
+            r = session().post(f"{self.pds}/xrpc/{method}", json=json, data=data, headers=headers, timeout=self.timeout)
+            # 常駐時はアクセストークンが切れるので1度だけログインし直す
+            if r.status_code in (400, 401) and "ExpiredToken" in r.text and attempt == 0:
+                continue
+            r.raise_for_status()
+            return r.json()
+        raise RuntimeError("bluesky: session refresh failed")
+
+    def _create(self, text: str, reply: dict | None, embed: dict | None, created_at: str) -> dict:
+        record = {
+            "$type": "app.bsky.feed.post",
+            "text": text,
+            "createdAt": created_at,
+            "langs": ["ja"],
+        }
+        if reply:
+            record["reply"] = reply
+        if embed:
+            record["embed"] = embed
+        repo = self._login()["did"]
+        return self._xrpc("com.atproto.repo.createRecord",
+                          json={"repo": repo, "collection": "app.bsky.feed.post", "record": record})
+
+    def _find(self, text: str, created_at: str) -> dict | None:
+        """
+        自分のリポジトリの直近の投稿から、本文と createdAt が同じもの（= 応答を受け取れなかった試行）を探す。
+        AppView の author feed は反映が遅れるので、PDS の listRecords を直接見る。
+        """
+        sess = self._login()
+        r = session().get(f"{self.pds}/xrpc/com.atproto.repo.listRecords",
+                          params={"repo": sess["did"], "collection": "app.bsky.feed.post", "limit": 10},
+                          headers={"Authorization": f"Bearer {sess['accessJwt']}"}, timeout=self.timeout)
+        r.raise_for_status()
+        for rec in r.json().get("records", []):
+            value = rec.get("value") or {}
+            if value.get("text") == text and value.get("createdAt") == created_at:
+                return {"uri": rec["uri"], "cid": rec["cid"]}
+        return None
+
+    def _post(self, text: str, reply: dict | None, embed: dict | None, created_at: str, sent: dict) -> dict:
+        """1本分。前の試行が送れたか分からなければ、送り直す前にリポジトリを確かめる。"""
+        if sent["maybe"]:
+            found = self._find(text, created_at)
+            if found is not None:
+                print(f"[publish] bluesky: found the post from the unanswered attempt ({found['uri']})")
+                return found
+        try:
+            return self._create(text, reply, embed, created_at)
+        except Exception as e:
+            sent["maybe"] = sent["maybe"] or _ambiguous(e)
+            raise
+
+    def retry_if(self, e: Exception) -> bool:
+        # 送れたか分からない失敗も、次の試行で _find() が確かめてから送るので再試行してよい
+        return _not_sent(e) or _ambiguous(e)
+
+    def upload(self, chart) -> dict:
+        blob = self._xrpc("com.atproto.repo.uploadBlob", data=chart.png, content_type="image/png")
+        return {"$type": "app.bsky.embed.images", "images": [{"alt": chart.alt, "image": blob["blob"]}]}
+
+    def send(self, texts: list[str], media=None, log: "ThreadLog | None" = None) -> dict:
+        uris = []
+        root = parent = None
+        for i, text in enumerate(texts):
+            reply = {"root": root, "parent": parent} if root else None
+            embed = media if i == 0 else None
+            # 試行をまたいで同じ createdAt にしておくと、_find() で前の試行の投稿を特定できる
+            created_at = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+            sent = {"maybe": False}
+            try:
+                res = retry(lambda: self._post(text, reply, embed, created_at, sent), tries=self.tries,
+                            sleep_sec=1.0, name="bluesky_post", deadline_sec=self.deadline_sec,
+                            retry_if=self.retry_if)
+            except Exception as e:
+                if sent["maybe"] or uris:
+                    # 途中まで送った（かもしれない）スレッドは、再実行で頭から送り直さない
+                    raise MaybeSent(f"bluesky: part {i + 1}/{len(texts)} may have been posted ({e})") from e
+                raise
+            ref = {"uri": res["uri"], "cid": res["cid"]}
+            root = root or ref
+            parent = ref
+            uris.append(res["uri"])
+        return {"ids": uris}
+
+# ========= Webhooks =========
+class WebhookChannel(Channel):
+    """Discord / Slack の Incoming Webhook。分割されたテキストは空行でつないで1通にする。"""
+
+    timeout = 5.0
+
+    def __init__(self, name: str, url: str, field: str):
+        self.name = name
+        self.url = url
+        self.field = field  # Discord: "content" / Slack: "text"
+
+    def arm(self):
+        try:
+            session().head(self.url, timeout=self.timeout)
+        except Exception:
+            pass
+
+    def _post(self, text: str):
+        r = session().post(self.url, json={self.field: text}, timeout=self.timeout)
+        if r.status_code == 429:
+            raise quota.Throttled(self.name, quota.retry_after_from(r.headers, default=2.0), "HTTP 429")
+        r.raise_for_status()
+
+    def send(self, texts: list[str], media=None, log: "ThreadLog | None" = None) -> dict:
+        text = "\n\n".join(texts)
+        try:
+            retry(lambda: self._post(text), tries=self.tries, sleep_sec=1.0,
+                  name=f"{self.name}_post", deadline_sec=self.deadline_sec, retry_if=self.retry_if)
+        except Exception as e:
+            # Webhook には重複の検出も投稿の照会も無いので、届いたか分からなければそこで止める
+            if _ambiguous(e):
+                raise MaybeSent(f"{self.name}: may have been posted ({type(e).__name__}: {e})") from e
+            raise
+        return {"ids": []}
+
+# ========= Fan-out =========
+def configured() -> list[Channel]:
+    """環境変数が揃っているチャネル（PUBLISH_CHANNELS で絞り込み可）"""
+    out: list[Channel] = []
+    if x_client.credentials() is not None or x_client.DRY_RUN:
+        out.append(XChannel())
+    if os.getenv("BLUESKY_HANDLE") and os.getenv("BLUESKY_APP_PASSWORD"):
+        out.append(BlueskyChannel(os.environ["BLUESKY_HANDLE"], os.environ["BLUESKY_APP_PASSWORD"],
+                                  os.getenv("BLUESKY_PDS", "https://bsky.social")))
+    if os.getenv("DISCORD_WEBHOOK_URL"):
+        out.append(WebhookChannel("discord", os.environ["DISCORD_WEBHOOK_URL"], "content"))
+    if os.getenv("SLACK_WEBHOOK_URL"):
+        out.append(WebhookChannel("slack", os.environ["SLACK_WEBHOOK_URL"], "text"))
+    if PUBLISH_CHANNELS:
+        wanted = {c.strip() for c in PUBLISH_CHANNELS.split(",")}
+        out = [c for c in out if c.name in wanted]
+    return out
+
+def claim_key(key: str, channel: Channel) -> str:
+    # X は従来の投稿済みキーをそのまま使う（既存の state と互換）
+    return key if channel.name == "x" else f"{key}@{channel.name}"
+
+class ThreadLog:
+    """claim キーごとに、スレッドの何本目（0 始まり）をどの ID で送れたかを state に残す"""
+
+    def __init__(self, state, key: str):
+        self.state = state
+        self.key = f"thread:{key}"
+
+    def load(self) -> dict[int, str]:
+        return {int(i): tid for i, tid in (self.state.get(self.key) or {}).items()}
+
+    def save(self, part: int, post_id: str):
+        done = self.load()
+        done[part] = post_id
+        self.state.set(self.key, {str(i): tid for i, tid in sorted(done.items())})
+
+def pending(state, key: str, channels: list[Channel]) -> list[Channel]:
+    """まだ送っていないチャネル"""
+    return [c for c in channels if not state.has_posted(claim_key(key, c))]
+
+def arm(channels: list[Channel]) -> float:
+    """全チャネルの準備を並列に行い、所要ミリ秒を返す"""
+    t0 = time.perf_counter()
+
+    def _arm(c: Channel):
+        try:
+            with span("publish.arm", channel=c.name):
+                c.arm()
+        except Exception as e:
+            print(f"[publish] {c.name}: arm failed: {e}")
+
+    wait([submit(lambda c=c: _arm(c)) for c in channels])
+    return (time.perf_counter() - t0) * 1000.0
+
+def publish(texts: list[str], channels: list[Channel] | None = None, state=None, key: str | None = None,
+            force: bool = False, chart=None) -> dict[str, dict]:
+    """
+    全チャネルに並列に送る。
+    returns: {channel: {"status": "ok"|"skipped"|"failed"|"unknown", "ms", "ids"|"error", "media"}}
+    "unknown" は送れたか分からない（MaybeSent）チャネルで、claim は取り消さない。
+    primary チャネル（X）が失敗した場合は、他のチャネルの完了を待ってから例外を送出する。
+    chart: charts.Chart か、それを返す Future（charts.finish_async）。None ならチャート無し。
+    """
+    media_deadline = time.monotonic() + CHART_BUDGET_MS / 1000.0
+    channels = configured() if channels is None else channels
+    if not channels:
+        raise RuntimeError("no publish channels configured (X API secrets are missing?)")
+    results: dict[str, dict] = {}
+    futures = {}
+    for c in channels:
+        claimed = False
+        if state is not None and key is not None:
+            claimed = state.claim(claim_key(key, c))
+            if not claimed and not force:
+                results[c.name] = {"status": "skipped", "ms": 0.0}
+                continue
+        upload = submit(lambda c=c: _upload(c, chart, media_deadline)) if chart is not None and c.media else None
+        # force で claim 済みのキーに送り直すときは前回のスレッドを引き継がない
+        log = ThreadLog(state, claim_key(key, c)) if claimed else None
+        futures[submit(lambda c=c, u=upload, g=log: _send(c, texts, u, media_deadline, g))] = (c, claimed)
+
+    # 各チャネルはリクエストのタイムアウトと再試行の期限で必ず終わるので、ここでは全部を待つ
+    wait(futures)
+    primary_err = None
+    for f, (c, claimed) in futures.items():
+        err = f.exception()
+        if err is None:
+            results[c.name] = f.result()
+            continue
+        maybe = isinstance(err, MaybeSent)
+        results[c.name] = {"status": "unknown" if maybe else "failed", "error": f"{type(err).__name__}: {err}"[:300]}
+        if claimed and not maybe:
+            state.release(claim_key(key, c))
+        if c.primary and primary_err is None:
+            primary_err = err
+
+    for name, r in results.items():
+        ms = f" {r['ms']:.0f}ms" if "ms" in r else ""
+        detail = r.get("error") or ", ".join(i for i in r.get("ids", []) if i)
+        print(f"[publish] {name}: {r['status']}{ms} {detail}".rstrip())
+    if primary_err is not None:
+        raise primary_err
+    return results
+
+def _upload(c: Channel, chart, deadline: float):
+    if isinstance(chart, Future):
+        chart = chart.result(timeout=max(0.0, deadline - time.monotonic()))
+    if chart is None:
+        return None
+    with span("publish.upload", channel=c.name, bytes=len(chart.png)):
+        return c.upload(chart)
+
+def _send(c: Channel, texts: list[str], upload: Future | None, deadline: float, log: ThreadLog | None = None) -> dict:
+    t0 = time.perf_counter()
+    media = None
+    with span("publish.send", channel=c.name, parts=len(texts)) as s:
+        if upload is not None:
+            # チャートは本文を CHART_BUDGET_MS までしか待たせない。間に合わなければ本文だけ送る
+            try:
+                media = upload.result(timeout=max(0.0, deadline - time.monotonic()))
+            except TimeoutError:
+                print(f"[publish] {c.name}: chart not ready within {CHART_BUDGET_MS:.0f}ms; sending text only")
+            except Exception as e:
+                print(f"[publish] {c.name}: sending without chart ({type(e).__name__}: {e})")
+            s["media"] = media is not None
+            s["media_wait_ms"] = (time.perf_counter() - t0) * 1000.0
+        res = c.send(texts, media, log)
+    return {"status": "ok", "ms": (time.perf_counter() - t0) * 1000.0, "media": media is not None, **res}
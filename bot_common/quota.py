@@ -0,0 +1,181 @@
+# bot_common/quota.py
+#
+# 上流 API ごとのトークンバケット（BLS の1日あたりクエリ数、FRED のレート制限、X の投稿数）。
+# 状態は QUOTA_PATH の JSON に実行をまたいで持ち、flock + os.replace で原子的に更新する。
+#
+# - 発表ウィンドウ（release_window() の中）ではバケットを使い切ってよい
+# - ウィンドウ外では reserve の割合を残し、それ以上は使わない（発表時のための取り置き）
+# - 429 や BLS の REQUEST_NOT_PROCESSED は throttle() で「いつまで待つか」として記録し、
+#   acquire() は盲目的に sleep する代わりに Throttled（retry_after 付き）を投げる
+
+import fcntl
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import NamedTuple
+from zoneinfo import ZoneInfo
+
+QUOTA_PATH = os.getenv("QUOTA_PATH", "data/quota.json")
+
+ET = ZoneInfo("America/New_York")
+
+class Limit(NamedTuple):
+    capacity: float    # バケットの大きさ（= 連続して使える回数）
+    period_sec: float  # capacity 回分が回復するまでの秒数
+    reserve: float     # ウィンドウ外で残しておく割合
+
+def _limit(name: str, default: Limit) -> Limit:
+    """QUOTA_<NAME>="capacity/period_sec" で上書きできる"""
+    raw = os.getenv(f"QUOTA_{name.upper()}", "").strip()
+    if not raw:
+        return default
+    cap, period = raw.split("/")
+    return default._replace(capacity=float(cap), period_sec=float(period))
+
+LIMITS = {
+    # BLS v2: 登録キーありで1日500クエリ、無しで25
+    "bls": _limit("bls", Limit(500.0 if os.getenv("BLS_API_KEY") else 25.0, 86400.0, 0.5)),
+    # FRED: 120 リクエスト/分
+    "fred": _limit("fred", Limit(120.0, 60.0, 0.25)),
+    # Cleveland Fed のページ（公開 API ではないので控えめに）
+    "nowcast": _limit("nowcast", Limit(30.0, 60.0, 0.0)),
+    # X: 投稿数/24時間（Free プランの上限）
+    "x": _limit("x", Limit(17.0, 86400.0, 0.0)),
+}
+
+class Throttled(RuntimeError):
+    """トークンが無い / 上流に止められている。retry_after 秒後なら再試行してよい。"""
+
+    def __init__(self, upstream: str, retry_after: float, reason: str = ""):
+        super().__init__(f"{upstream} throttled for {retry_after:.1f}s{': ' + reason if reason else ''}")
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+_lock = threading.Lock()
+_window_depth = 0
+
+@contextmanager
+def release_window():
+    """この中ではバケットの取り置き（reserve）も使ってよい"""
+    global _window_depth
+    with _lock:
+        _window_depth += 1
+    try:
+        yield
+    finally:
+        with _lock:
+            _window_depth -= 1
+
+def in_release_window() -> bool:
+    return _window_depth > 0
+
+@contextmanager
+def _locked_state():
+    """プロセス間で排他しながら状態 JSON を読み、ブロック終了時に原子的に書き戻す"""
+    d = os.path.dirname(QUOTA_PATH)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    with _lock, open(QUOTA_PATH + ".lock", "w") as lf:
+        fcntl.flock(lf, fcntl.LOCK_EX)
+        try:
+            try:
+                with open(QUOTA_PATH, "r", encoding="utf-8") as f:
+                    state = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                state = {}
+            yield state
+            tmp = f"{QUOTA_PATH}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(state, f, sort_keys=True)
+            os.replace(tmp, QUOTA_PATH)
+        finally:
+            fcntl.flock(lf, fcntl.LOCK_UN)
+
+def _refill(b: dict, limit: Limit, now: float):
+    elapsed = max(0.0, now - b.get("updated", now))
+    b["tokens"] = min(limit.capacity, b.get("tokens", limit.capacity) + elapsed * limit.capacity / limit.period_sec)
+    b["updated"] = now
+
+def acquire(upstream: str, cost: float = 1.0, max_wait: float = 2.0) -> float:
+    """
+    トークンを cost だけ消費する。max_wait 秒以内に用意できるなら待ってから消費し、
+    待った秒数を返す。それ以上かかる（あるいは上流に止められている）なら Throttled。
+    """
+    limit = LIMITS.get(upstream)
+    if limit is None:
+        return 0.0
+    floor = 0.0 if in_release_window() else limit.capacity * limit.reserve
+    now = time.time()
+    with _locked_state() as state:
+        b = state.setdefault(upstream, {})
+        _refill(b, limit, now)
+        blocked = b.get("blocked_until", 0.0) - now
+        short = floor + cost - b["tokens"]
+        wait = max(blocked, short * limit.period_sec / limit.capacity if short > 0 else 0.0)
+        if wait > max_wait:
+            raise Throttled(upstream, wait, "backpressure" if blocked > 0 else "budget")
+        b["tokens"] -= cost
+        b["used"] = b.get("used", 0) + cost
+    if wait > 0:
+        time.sleep(wait)
+    return wait
+
+def available(upstream: str) -> float:
+    """今 acquire() できる回数（ウィンドウ外なら取り置きを除く）。止められている間は 0、制限の無い上流は inf。"""
+    limit = LIMITS.get(upstream)
+    if limit is None:
+        return float("inf")
+    floor = 0.0 if in_release_window() else limit.capacity * limit.reserve
+    now = time.time()
+    with _locked_state() as state:
+        b = state.setdefault(upstream, {})
+        _refill(b, limit, now)
+        if b.get("blocked_until", 0.0) > now:
+            return 0.0
+        return max(0.0, b["tokens"] - floor)
+
+def throttle(upstream: str, retry_after: float | None = None, until: float | None = None):
+    """上流から 429 等を受けたときに呼ぶ。until（epoch 秒）か retry_after 秒まで acquire を止める。"""
+    until = until if until is not None else time.time() + (retry_after if retry_after is not None else 60.0)
+    with _locked_state() as state:
+        b = state.setdefault(upstream, {})
+        b["blocked_until"] = max(b.get("blocked_until", 0.0), until)
+        b["throttled"] = b.get("throttled", 0) + 1
+
+def retry_after_from(headers, default: float = 60.0) -> float:
+    """Retry-After（秒）か x-rate-limit-reset（epoch 秒）から待ち時間を読む"""
+    ra = headers.get("Retry-After")
+    if ra and ra.strip().isdigit():
+        return float(ra)
+    reset = headers.get("x-rate-limit-reset")
+    if reset and reset.strip().isdigit():
+        return max(0.0, float(reset) - time.time())
+    return default
+
+def next_midnight_et() -> float:
+    """BLS の日次クエリ上限がリセットされる時刻（epoch 秒）"""
+    now = datetime.now(ET)
+    return (now.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=1)).timestamp()
+
+def status() -> dict:
+    """{upstream: {"tokens", "capacity", "blocked_for", "used", "throttled"}}"""
+    now = time.time()
+    out = {}
+    with _locked_state() as state:
+        for name, limit in LIMITS.items():
+            b = state.setdefault(name, {})
+            _refill(b, limit, now)
+            out[name] = {
+                "tokens": round(b["tokens"], 2),
+                "capacity": limit.capacity,
+                "blocked_for": max(0.0, round(b.get("blocked_until", 0.0) - now, 1)),
+                "used": b.get("used", 0),
+                "throttled": b.get("throttled", 0),
+            }
+    return out
+
+if __name__ == "__main__":
+    print(json.dumps(status(), indent=2))
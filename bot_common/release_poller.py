@@ -0,0 +1,179 @@
+# bot_common/release_poller.py
+
+import json
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Callable, TypeVar
+from zoneinfo import ZoneInfo
+
+from bot_common.quota import LIMITS, Throttled, available, release_window
+from bot_common.trace import span
+
+T = TypeVar("T")
+
+ET = ZoneInfo("America/New_York")
+
+# 雇用統計・CPI はいずれも 8:30 ET 公表
+DEFAULT_RELEASE_HHMM = "08:30"
+
+ARM_SEC = float(os.getenv("RELEASE_ARM_SEC", "5"))
+DEADLINE_SEC = float(os.getenv("RELEASE_DEADLINE_SEC", "600"))
+LATENCY_LOG = Path(os.getenv("RELEASE_LATENCY_LOG", "data/release_latency.jsonl"))
+
+# (経過秒の上限, ポーリング間隔秒) — T+0 付近は密に、以降は徐々に間隔を広げる
+SCHEDULE = [
+    (15.0, 0.25),
+    (60.0, 0.5),
+    (180.0, 2.0),
+    (float("inf"), 5.0),
+]
+
+def release_time(release_at: str | None = None, hhmm: str = DEFAULT_RELEASE_HHMM) -> datetime:
+    """
+    release_at: ISO 8601 (例 "2026-01-09T08:30:00-05:00")。
+    未指定なら RELEASE_AT 環境変数、それも無ければ「今日の hhmm ET」。
+    """
+    raw = release_at or os.getenv("RELEASE_AT", "").strip()
+    if raw:
+        dt = datetime.fromisoformat(raw.replace("Z", "+00:00"))
+        if dt.tzinfo is None:
+            dt = dt.replace(tzinfo=ET)
+        return dt.astimezone(timezone.utc)
+
+    h, m = (int(x) for x in hhmm.split(":"))
+    today = datetime.now(ET).replace(hour=h, minute=m, second=0, microsecond=0)
+    return today.astimezone(timezone.utc)
+
+def interval_for(elapsed: float) -> float:
+    for upper, step in SCHEDULE:
+        if elapsed < upper:
+            return step
+    return SCHEDULE[-1][1]
+
+def planned_polls(elapsed: float, until: float) -> float:
+    """SCHEDULE どおりにポーリングしたときの、T+elapsed 〜 T+until 秒の回数（発表前の arm 中も含む）"""
+    n, lower = 0.0, float("-inf")
+    for upper, step in SCHEDULE:
+        lo, hi = max(lower, elapsed), min(upper, until)
+        if hi > lo:
+            n += (hi - lo) / step
+        lower = upper
+    return n
+
+def budget_factor(budget: dict[str, float], elapsed: float, until: float) -> float:
+    """
+    budget: {上流: 1回のポーリングで使うトークン数}。残りのトークン（と until までの回復分）で
+    SCHEDULE の残りのポーリングを賄えないとき、間隔を何倍に延ばせば足りるか（足りていれば 1）。
+    BLS のキー無し（25回/日）では T+0 前後でも数秒おきになる。
+    """
+    planned = planned_polls(elapsed, until)
+    factor = 1.0
+    for upstream, cost in budget.items():
+        limit = LIMITS.get(upstream)
+        if limit is None:
+            continue
+        tokens = available(upstream) + max(0.0, until - elapsed) * limit.capacity / limit.period_sec
+        factor = max(factor, planned * cost / max(tokens, cost))
+    return factor
+
+def _record(entry: dict):
+    try:
+        LATENCY_LOG.parent.mkdir(parents=True, exist_ok=True)
+        with LATENCY_LOG.open("a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    except OSError as e:
+        print(f"[poller] could not write latency log: {e}")
+
+def poll_release(
+    fetch: Callable[[], T],
+    ready: Callable[[T], bool],
+    release_at: datetime,
+    arm_sec: float = ARM_SEC,
+    deadline_sec: float = DEADLINE_SEC,
+    name: str = "release",
+    on_arm: Callable[[], None] | None = None,
+    budget: dict[str, float] | None = None,
+) -> T:
+    """
+    release_at の arm_sec 秒前から fetch() をポーリングし、ready(result) が真になった
+    時点で即座に結果を返す。間隔は SCHEDULE に従って T+0 からの経過時間で伸びる。
+    budget（{上流: 1回あたりのトークン数}）を渡すと、期限までのポーリングが quota に収まるよう
+    間隔を延ばす（budget_factor）。途中でバケットが尽きて期限まで Throttled になるのを防ぐ。
+    発表から検知までの遅延を LATENCY_LOG に1行追記する。
+    on_arm は待機明け（ポーリング開始直前）に1度だけ呼ぶ。接続の温め直しなどに使う。
+    ポーリング中は quota の発表ウィンドウ扱い（取り置き分のトークンも使える）。
+    """
+    arm_at = release_at - timedelta(seconds=arm_sec)
+    wait = (arm_at - datetime.now(timezone.utc)).total_seconds()
+    if wait > 0:
+        print(f"[poller] {name}: arming in {wait:.1f}s (release {release_at.isoformat()})")
+        with span(f"{name}.wait", sec=round(wait, 3)):
+            time.sleep(wait)
+    if on_arm is not None:
+        on_arm()
+
+    # 発表時刻を過ぎてから起動された場合（手動再実行など）も最低限は待つ
+    deadline = max(
+        release_at + timedelta(seconds=deadline_sec),
+        datetime.now(timezone.utc) + timedelta(seconds=60),
+    )
+    until = (deadline - release_at).total_seconds()
+    with release_window():
+        attempts = 0
+        errors = 0
+        last_err = None
+        stretched = 1.0
+        while True:
+            attempts += 1
+            hint = 0.0
+            try:
+                with span(f"{name}.poll", attempt=attempts) as s:
+                    res = fetch()
+                    s["ready"] = ready(res)
+                if s["ready"]:
+                    detected = datetime.now(timezone.utc)
+                    latency = (detected - release_at).total_seconds()
+                    print(f"[poller] {name}: detected at T{latency:+.3f}s after {attempts} polls")
+                    _record({
+                        "name": name,
+                        "release_at": release_at.isoformat(),
+                        "detected_at": detected.isoformat(),
+                        "latency_sec": round(latency, 3),
+                        "attempts": attempts,
+                        "errors": errors,
+                    })
+                    return res
+                last_err = RuntimeError(f"not ready: {res}")
+            except Throttled as e:
+                # 上流に止められている間は間隔を詰めずに指定された時間だけ待つ
+                errors += 1
+                last_err = e
+                hint = e.retry_after
+            except Exception as e:
+                errors += 1
+                last_err = e
+
+            now = datetime.now(timezone.utc)
+            if now >= deadline:
+                _record({
+                    "name": name,
+                    "release_at": release_at.isoformat(),
+                    "detected_at": None,
+                    "latency_sec": None,
+                    "attempts": attempts,
+                    "errors": errors,
+                })
+                raise RuntimeError(
+                    f"{name} not available {deadline_sec:.0f}s after release ({attempts} polls): {last_err}"
+                ) from last_err
+
+            elapsed = (now - release_at).total_seconds()
+            factor = budget_factor(budget, elapsed, until) if budget else 1.0
+            if factor > stretched * 1.5:
+                print(f"[poller] {name}: quota allows ~{planned_polls(elapsed, until) / factor:.0f} more polls; "
+                      f"stretching intervals x{factor:.1f}")
+                stretched = factor
+            interval = interval_for(elapsed) * factor
+            time.sleep(max(0.0, min(max(interval, hint), (deadline - now).total_seconds())))
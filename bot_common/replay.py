@@ -0,0 +1,283 @@
+# bot_common/replay.py
+#
+# 記録済みペイロードで過去の発表月をオフライン再生する（実際の API にも X にも接続しない）。
+# 記録を「その月の発表時点まで」に切って返すローカルサーバーに FRED / BLS を向け、
+# 本番と同じ cpi_bot.post_cpi(release_at=...) / employment_report.run.main(release_at=...) を
+# 月の順に呼ぶ。投稿先は X だけ・X_DRY_RUN（送らずに本文を残す）。観測ストア・state・
+# サプライズ/改定の履歴はワーカーごとの一時ディレクトリに積み上がるので、再実行と同じ経路を通る。
+# ステージごとの所要時間は本番の span（trace.summary の差分）から出す。
+#
+#   python -m bot_common.replay cpi [--start 2016-01] [--end 2025-12] [--workers 4] [--out out.jsonl]
+#   python -m bot_common.replay employment
+#
+# fixtures/replay/ のレイアウト:
+#   fred/<SERIES>.json        FRED series/observations の応答
+#   bls/employment.json       BLS v2 timeseries の応答（NFP / AHE / UR）
+#   nowcast/cpi.json          {"YYYY-MM": {"cpi_mom": .., "core_mom": .., "cpi_yoy": .., "core_yoy": ..}}
+#   forecast/employment.json  {"YYYY-MM": {"ahe_mom": .., "ahe_yoy": .., "nfp_man": .., "unemployment_rate": ..}}
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(ROOT, "fixtures", "replay")
+STAGES = ("fetch", "compute", "compose", "publish")
+
+# ステージ → 集計する span 名（本番のコードが出しているもの）
+SPANS = {
+    "cpi": {"fetch": ("race",), "compute": ("compute",), "compose": ("compose", "surprise"),
+            "publish": ("publish.send",)},
+    "employment": {"fetch": ("bls.attempt",), "compute": ("compute",), "compose": ("compose", "surprise"),
+                   "publish": ("publish.send",)},
+}
+
+def _read(fixtures: str, *parts: str) -> bytes:
+    with open(os.path.join(fixtures, *parts), "rb") as f:
+        return f.read()
+
+def _month_range(start: str, end: str) -> list[str]:
+    from bot_common.series import month_index, month_str
+
+    return [month_str(i) for i in range(month_index(start), month_index(end) + 1)]
+
+# ========= Recorded upstreams =========
+class Recorded:
+    """記録済みの FRED / BLS 応答。as_of（YYYY-MM）より後の月は返さない。"""
+
+    def __init__(self, fixtures: str):
+        self.as_of = "0000-00"
+        self.fred = {}
+        for name in os.listdir(os.path.join(fixtures, "fred")):
+            self.fred[name.removesuffix(".json")] = json.loads(_read(fixtures, "fred", name))["observations"]
+        body = json.loads(_read(fixtures, "bls", "employment.json"))
+        self.bls = {s["seriesID"]: s["data"] for s in body["Results"]["series"]}
+
+    def fred_observations(self, q: dict) -> dict:
+        obs = [o for o in self.fred.get(q.get("series_id"), []) if o["date"][:7] <= self.as_of]
+        if "observation_start" in q:
+            obs = [o for o in obs if o["date"] >= q["observation_start"]]
+        if q.get("sort_order") == "desc":
+            obs = obs[::-1]
+        if "limit" in q:
+            obs = obs[:int(q["limit"])]
+        return {"count": len(obs), "observations": obs}
+
+    def bls_timeseries(self, payload: dict) -> dict:
+        # 記録に無い系列（CPI の BLS 側など）は空で返す。CPI のレースは FRED が勝つ
+        start, end = int(payload.get("startyear", 0)), int(payload.get("endyear", 9999))
+        series = [
+            {"seriesID": sid, "data": [
+                d for d in self.bls.get(sid, [])
+                if start <= int(d["year"]) <= end and f"{d['year']}-{d['period'][1:]}" <= self.as_of
+            ]}
+            for sid in payload.get("seriesid", [])
+        ]
+        return {"status": "REQUEST_SUCCEEDED", "responseTime": 0, "message": [], "Results": {"series": series}}
+
+def _handler(rec: Recorded):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, code: int, out: dict):
+            body = json.dumps(out).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            u = urlparse(self.path)
+            if u.path != "/fred/series/observations":
+                return self._send(404, {})
+            self._send(200, rec.fred_observations({k: v[0] for k, v in parse_qs(u.query).items()}))
+
+        def do_POST(self):
+            n = int(self.headers.get("Content-Length") or 0)
+            payload = json.loads(self.rfile.read(n) or b"{}")
+            if not urlparse(self.path).path.startswith("/bls/"):
+                return self._send(404, {})
+            self._send(200, rec.bls_timeseries(payload))
+
+    return Handler
+
+def _serve(rec: Recorded) -> ThreadingHTTPServer:
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _handler(rec))
+    srv.daemon_threads = True
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    return srv
+
+def _env(workdir: str, srv: ThreadingHTTPServer) -> dict:
+    """ボットの import 前に設定する（パスや URL はモジュールの読み込み時に決まる）"""
+    base = f"http://127.0.0.1:{srv.server_port}"
+    unlimited = "1000000000/1"
+    return {
+        "FRED_BASE": f"{base}/fred",
+        "FRED_API_KEY": "replay",
+        "BLS_URL": f"{base}/bls/publicAPI/v2/timeseries/data/",
+        "X_DRY_RUN": "1",
+        "PUBLISH_CHANNELS": "x",
+        "FORCE_POST": "0",
+        "POST_TYPE": "ALL",
+        "QUOTA_FRED": unlimited, "QUOTA_BLS": unlimited, "QUOTA_X": unlimited,
+        "OBS_STORE_PATH": os.path.join(workdir, "observations.sqlite3"),
+        "CPI_STATE_PATH": os.path.join(workdir, "cpi_state.sqlite3"),
+        "NOWCAST_HISTORY_PATH": os.path.join(workdir, "nowcast_history.sqlite3"),
+        "EMP_STATE_PATH": os.path.join(workdir, "employment_state.sqlite3"),
+        "EMP_FORECAST_FILE": os.path.join(workdir, "forecast.json"),
+        "RELEASE_LATENCY_LOG": os.path.join(workdir, "release_latency.jsonl"),
+        "QUOTA_PATH": os.path.join(workdir, "quota.json"),
+        "LATENCY_PATH": os.path.join(workdir, "latency.json"),
+        "SURPRISE_DIR": workdir,
+        "REVISIONS_DIR": workdir,
+        "EXPORT_DIR": os.path.join(workdir, "releases"),
+        "NOWCAST_CACHE_PATH": os.path.join(workdir, "nowcast_cache.json"),
+    }
+
+# ========= Jobs =========
+# 指標 → (prime, post)。prime は最初の月の前月までを取り込んだ状態を作る（無ければ何もしない）
+def _cpi_job(fixtures: str):
+    sys.path.insert(0, os.path.join(ROOT, "cpi_fred_nowcast"))
+    import cpi_bot
+    import nowcast_history
+
+    # 保存済みの Nowcast（発表前に save_nowcast が取り込んでいたもの）
+    for ym, row in json.loads(_read(fixtures, "nowcast", "cpi.json")).items():
+        nowcast_history.append(ym, row)
+
+    def _prime():
+        # 前月分をストアに入れておくと、最初の月から想定月のポーリング（本番の発表時の経路）になる
+        for sid in (cpi_bot.SERIES_CPI, cpi_bot.SERIES_CORE):
+            cpi_bot.sync_fred(sid)
+
+    def _post(ym: str, release_at: str):
+        cpi_bot.post_cpi(release_at=release_at)
+
+    return _prime, _post
+
+def _employment_job(fixtures: str):
+    from employment_report import minkabu_forecast, run
+
+    forecasts = json.loads(_read(fixtures, "forecast", "employment.json"))
+    fields = ("ahe_mom", "ahe_yoy", "nfp_man", "unemployment_rate")
+
+    def _post(ym: str, release_at: str):
+        # 予想は発表前に書き出されている JSON から読む
+        fc = forecasts.get(ym, {})
+        with open(minkabu_forecast.DATA_FILE, "w", encoding="utf-8") as f:
+            json.dump({"ym": ym, "forecast": {k: fc.get(k) for k in fields}}, f)
+        run.main(release_at=release_at)
+
+    return None, _post
+
+JOBS = {"cpi": _cpi_job, "employment": _employment_job}
+
+def _stage_ms(indicator: str, before: dict, after: dict) -> dict:
+    def total(name: str) -> float:
+        return after.get(name, {}).get("total_ms", 0.0) - before.get(name, {}).get("total_ms", 0.0)
+
+    return {stage: sum(total(n) for n in names) for stage, names in SPANS[indicator].items()}
+
+def _run_chunk(args) -> list[dict]:
+    """
+    連続した months を1つのワーカープロセスで順に再生する（max_tasks_per_child=1 で毎回新しいプロセス）。
+    最初の月の前に、その前月までを prime で取り込んでおく。
+    """
+    indicator, months, fixtures = args
+    rec = Recorded(fixtures)
+    srv = _serve(rec)
+    try:
+        with tempfile.TemporaryDirectory(prefix=f"replay-{indicator}-") as workdir:
+            os.environ.update(_env(workdir, srv))
+            from bot_common import trace, x_client
+            from bot_common.series import month_index, month_str
+
+            prime, post = JOBS[indicator](fixtures)
+            if prime is not None:
+                rec.as_of = month_str(month_index(months[0]) - 1)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    prime()
+            out = []
+            for ym in months:
+                rec.as_of = ym
+                x_client.dry_run_sent.clear()
+                before = trace.summary()
+                log = io.StringIO()
+                t0 = time.perf_counter()
+                try:
+                    with contextlib.redirect_stdout(log):
+                        post(ym, datetime.now(timezone.utc).isoformat())
+                except Exception:
+                    sys.stderr.write(log.getvalue())
+                    raise
+                total_ms = (time.perf_counter() - t0) * 1000.0
+                if not x_client.dry_run_sent:
+                    sys.stderr.write(log.getvalue())
+                    raise RuntimeError(f"{indicator} {ym}: nothing was posted")
+                ms = _stage_ms(indicator, before, trace.summary())
+                out.append({"indicator": indicator, "ym": ym, "texts": list(x_client.dry_run_sent),
+                            "ms": {**ms, "total": total_ms}})
+            return out
+    finally:
+        srv.shutdown()
+
+def _pct(sorted_vals: list[float], q: float) -> float:
+    return sorted_vals[min(len(sorted_vals) - 1, int(q * len(sorted_vals)))]
+
+def replay(indicator: str, months: list[str], fixtures: str = FIXTURES, workers: int | None = None) -> tuple[list[dict], float]:
+    """returns: (月ごとの結果, 全体の経過秒)"""
+    # 数千か月分の span を data/metrics.jsonl に書かない（明示的に指定された場合は書く）
+    os.environ.setdefault("METRICS_PATH", "")
+    workers = max(1, min(len(months), workers or os.cpu_count() or 1))
+    # ワーカーごとに連続した月を受け持つ（前月までの状態を引き継いで再生するため）
+    size = -(-len(months) // workers)
+    chunks = [months[i:i + size] for i in range(0, len(months), size)]
+
+    t0 = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=len(chunks), max_tasks_per_child=1) as pool:
+        results = [r for rs in pool.map(_run_chunk, [(indicator, c, fixtures) for c in chunks]) for r in rs]
+    elapsed = time.perf_counter() - t0
+    results.sort(key=lambda r: r["ym"])
+    return results, elapsed
+
+def report(indicator: str, results: list[dict], elapsed: float):
+    print(f"[replay] {indicator}: {len(results)} months in {elapsed:.2f}s ({len(results) / elapsed:.1f} months/s)")
+    print(f"  {'stage':<8} {'mean':>8} {'p50':>8} {'p95':>8} {'max':>8}  (ms)")
+    for stage in (*STAGES, "total"):
+        vals = sorted(r["ms"][stage] for r in results)
+        print(f"  {stage:<8} {sum(vals) / len(vals):8.3f} {_pct(vals, 0.5):8.3f} {_pct(vals, 0.95):8.3f} {vals[-1]:8.3f}")
+
+def main():
+    ap = argparse.ArgumentParser(description="Replay recorded releases through the posting pipeline (dry run).")
+    ap.add_argument("indicator", choices=sorted(JOBS))
+    ap.add_argument("--start", default="2016-02")
+    ap.add_argument("--end", default="2025-12")
+    ap.add_argument("--fixtures", default=FIXTURES)
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--out", help="write per-month texts and timings as JSON lines")
+    args = ap.parse_args()
+
+    results, elapsed = replay(args.indicator, _month_range(args.start, args.end), args.fixtures, args.workers)
+    report(args.indicator, results, elapsed)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            for r in results:
+                f.write(json.dumps(r, ensure_ascii=False) + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+# bot_common/retry.py
+#
+# 再試行（ジッター付き指数バックオフ・全体の期限）と、冪等な読み取り用の hedge。
+# 両ボットと publish のチャネルで共有する。
+# hedge の閾値に使うレイテンシは LATENCY_PATH に実行をまたいで持つ（GitHub Actions は毎回コールドスタート）。
+
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+from typing import Callable, TypeVar
+
+from bot_common.http_client import submit
+from bot_common.quota import Throttled
+from bot_common.trace import span
+
+T = TypeVar("T")
+
+LATENCY_PATH = os.getenv("LATENCY_PATH", "data/latency.json")
+
+# ========= Observed latency =========
+class LatencyStats:
+    """直近 window 回の成功レイテンシ（秒）。サンプルが少ないうちは default を返す。"""
+
+    def __init__(self, window: int = 50, default: float = 1.0, min_samples: int = 5, samples=()):
+        self.samples: deque[float] = deque(samples, maxlen=window)
+        self.default = default
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+
+    def add(self, sec: float):
+        with self._lock:
+            self.samples.append(sec)
+
+    def quantile(self, q: float) -> float:
+        with self._lock:
+            vals = sorted(self.samples)
+        if len(vals) < self.min_samples:
+            return self.default
+        return vals[min(len(vals) - 1, int(q * len(vals)))]
+
+_stats: dict[str, LatencyStats] = {}
+_stats_lock = threading.Lock()
+
+def _load_latency(path: str) -> dict[str, list[float]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def latency(name: str) -> LatencyStats:
+    """name のレイテンシ統計。プロセスで最初に使うときに LATENCY_PATH の前回までのサンプルを読む。"""
+    s = _stats.get(name)
+    if s is None:
+        with _stats_lock:
+            s = _stats.get(name)
+            if s is None:
+                s = _stats[name] = LatencyStats(samples=_load_latency(LATENCY_PATH).get(name, ()))
+    return s
+
+def save_latency(path: str = LATENCY_PATH):
+    """観測したレイテンシを保存する（次の実行の hedge の閾値・タイムアウトになる）。投稿後に呼ぶ。"""
+    with _stats_lock:
+        current = {name: list(s.samples) for name, s in _stats.items() if s.samples}
+    if not current:
+        return
+    data = {**_load_latency(path), **current}
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({k: [round(x, 4) for x in v] for k, v in data.items()}, f, sort_keys=True)
+    os.replace(tmp, path)
+
+def backoff(attempt: int, base: float, cap: float) -> float:
+    """指数バックオフ + full jitter（attempt は 0 始まり）"""
+    return random.uniform(0.0, min(cap, base * (2 ** attempt)))
+
+# ========= Retry =========
+def retry(
+    fn: Callable[[], T],
+    tries: int = 6,
+    sleep_sec: float = 6.0,
+    name: str = "task",
+    deadline_sec: float | None = None,
+    max_sleep_sec: float = 30.0,
+    retry_if: Callable[[Exception], bool] | None = None,
+) -> T:
+    """
+    fn() を最大 tries 回。待ちは sleep_sec を基準にした指数バックオフ（ジッター付き）。
+    deadline_sec を過ぎる待ちはせずに打ち切る。retry_if(e) が偽の例外は即座に送出する。
+    """
+    deadline = time.monotonic() + deadline_sec if deadline_sec is not None else None
+    last_err = None
+    for i in range(tries):
+        try:
+            with span(f"{name}.attempt", attempt=i + 1):
+                return fn()
+        except Exception as e:
+            last_err = e
+            if retry_if is not None and not retry_if(e):
+                raise
+            if i == tries - 1:
+                break
+            pause = backoff(i, sleep_sec, max_sleep_sec)
+            if isinstance(e, Throttled):
+                # 上流が指定した待ち時間より前に再試行しても無駄打ちになる
+                pause = max(pause, e.retry_after)
+            if deadline is not None and time.monotonic() + pause >= deadline:
+                if isinstance(e, Throttled):
+                    raise
+                break
+            time.sleep(pause)
+    raise RuntimeError(f"{name} failed after {i + 1} tries: {last_err}") from last_err
+
+# ========= Hedged requests =========
+def hedged(
+    fn: Callable[[float], T],
+    name: str,
+    deadline_sec: float = 30.0,
+    tries: int = 3,
+    hedge: bool = True,
+    min_timeout: float = 2.0,
+    timeout_factor: float = 4.0,
+    sleep_sec: float = 0.5,
+    retry_if: Callable[[Exception], bool] | None = None,
+) -> T:
+    """
+    冪等な読み取り用。fn(timeout) を呼び、p95 を超えても返らなければ同じリクエストを
+    もう1本投げて先に成功した方を使う（hedge）。1回あたりのタイムアウトは
+    観測した p95 × timeout_factor（min_timeout 以上、残り時間以下）。
+    失敗したらジッター付きバックオフで deadline_sec まで再試行する。
+    X への投稿のような非冪等な処理には使わないこと（retry を使う）。
+    """
+    stats = latency(name)
+    deadline = time.monotonic() + deadline_sec
+    last_err = None
+    for i in range(tries):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        p95 = stats.quantile(0.95)
+        timeout = min(remaining, max(min_timeout, p95 * timeout_factor))
+
+        with span(f"{name}.attempt", attempt=i + 1, timeout=round(timeout, 3), hedge_after=round(p95, 3)) as s:
+            try:
+                res, sec, hedged_used = _race_hedge(fn, timeout, p95 if hedge else None)
+                stats.add(sec)
+                s["hedged"] = hedged_used
+                return res
+            except Exception as e:
+                last_err = e
+                s["error"] = f"{type(e).__name__}: {e}"[:300]
+
+        if retry_if is not None and not retry_if(last_err):
+            raise last_err
+        pause = backoff(i, sleep_sec, 5.0)
+        if isinstance(last_err, Throttled):
+            pause = max(pause, last_err.retry_after)
+        if time.monotonic() + pause >= deadline:
+            if isinstance(last_err, Throttled):
+                raise last_err
+            break
+        time.sleep(pause)
+    if isinstance(last_err, Throttled):
+        raise last_err
+    raise RuntimeError(f"{name} failed within {deadline_sec:.0f}s: {last_err}") from last_err
+
+def _race_hedge(fn: Callable[[float], T], timeout: float, hedge_after: float | None) -> tuple[T, float, bool]:
+    """returns: (結果, 成功した呼び出しの所要秒, hedge を投げたか)"""
+    t0 = time.monotonic()
+
+    def _call():
+        start = time.monotonic()
+        return fn(timeout), time.monotonic() - start
+
+    pending = {submit(_call)}
+    hedged_used = False
+    if hedge_after is not None and hedge_after < timeout:
+        done, _ = wait(pending, timeout=hedge_after)
+        if not done:
+            pending.add(submit(_call))
+            hedged_used = True
+
+    first_err = None
+    end = t0 + timeout
+    while pending:
+        done, pending = wait(pending, timeout=max(0.0, end - time.monotonic()), return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        for f in done:
+            try:
+                res, sec = f.result()
+                return res, sec, hedged_used
+            except Exception as e:
+                first_err = first_err or e
+    if first_err is not None:
+        raise first_err
+    raise TimeoutError(f"no response within {timeout:.1f}s")
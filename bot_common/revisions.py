@@ -0,0 +1,164 @@
+# bot_common/revisions.py
+#
+# 投稿した数値（結果・前回）の vintage を指標ごとに残し、次の発表で「前回」が改定されたかを調べる。
+# - 1 vintage = 投稿1回分のスナップショット（先頭の月 + 月 × 項目の値。雇用統計・CPI とも 2か月 × 4項目）。
+#   data/revisions_<indicator>.npz に追記するだけで、全履歴とは比べない
+# - 比べるのは対象月より前の月を対象にした直近の vintage 1つだけ（同じ月の再投稿は置き換える）。
+#   表示の桁で丸めて違えば改定とみなす。配列数個の比較なのでマイクロ秒単位
+# - 改定は compose_text.fill / cpi_bot.render_texts に渡し、「前回：25.6万人 → 修正 22.1万人」の形で出す
+#
+#   python -m bot_common.revisions show employment
+
+import argparse
+import os
+import time
+from typing import NamedTuple
+
+import numpy as np
+
+from bot_common.series import month_index, month_str
+
+REVISIONS_DIR = os.getenv("REVISIONS_DIR", "data")
+# 1 vintage に残す月数（前回 + 結果）
+WINDOW = 2
+
+# (項目, 表示の小数桁)
+FIELDS: dict[str, tuple[tuple[str, int], ...]] = {
+    "cpi": (("cpi_mom", 2), ("core_mom", 2), ("cpi_yoy", 2), ("core_yoy", 2)),
+    "employment": (("nfp_man", 1), ("ur", 1), ("ahe_mom", 1), ("ahe_yoy", 1)),
+}
+
+class Revision(NamedTuple):
+    month: str       # YYYY-MM
+    field: str
+    old: float       # 前の vintage（投稿済み）の値
+    new: float
+
+def path_for(indicator: str) -> str:
+    return os.path.join(REVISIONS_DIR, f"revisions_{indicator}.npz")
+
+class Vintages:
+    """
+    taken: (n,) 取得時刻（epoch 秒）、start: (n,) 先頭の通し月番号、
+    values: (n, WINDOW, k) 各月・各項目の値（無ければ NaN）。start 昇順。
+    """
+
+    def __init__(self, indicator: str, taken: np.ndarray, start: np.ndarray, values: np.ndarray):
+        self.indicator = indicator
+        self.fields = FIELDS[indicator]
+        self.taken = taken.astype(np.float64)
+        self.start = start.astype(np.int32)
+        self.values = values.astype(np.float64)
+        self._digits = np.array([d for _, d in self.fields])
+
+    @classmethod
+    def empty(cls, indicator: str) -> "Vintages":
+        return cls(indicator, np.empty(0), np.empty(0, np.int32), np.empty((0, WINDOW, len(FIELDS[indicator]))))
+
+    @classmethod
+    def load(cls, indicator: str, path: str | None = None) -> "Vintages":
+        path = path or path_for(indicator)
+        if not os.path.exists(path):
+            return cls.empty(indicator)
+        with np.load(path) as z:
+            if tuple(z["fields"].tolist()) != tuple(f for f, _ in FIELDS[indicator]):
+                print(f"[revisions] {path} has other fields; starting a new log")
+                return cls.empty(indicator)
+            return cls(indicator, z["taken"], z["start"], z["values"])
+
+    def save(self, path: str | None = None):
+        path = path or path_for(self.indicator)
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp.npz"
+        np.savez(tmp, fields=np.array([f for f, _ in self.fields]), taken=self.taken, start=self.start,
+                 values=self.values)
+        os.replace(tmp, path)
+
+    def __len__(self) -> int:
+        return len(self.start)
+
+    def snapshot(self, ym: str, rows: dict[str, dict]) -> np.ndarray:
+        """rows: {YYYY-MM: {項目: 値}} → ym までの WINDOW か月分の (WINDOW, k) 配列"""
+        first = month_index(ym) - WINDOW + 1
+        out = np.full((WINDOW, len(self.fields)), np.nan)
+        for i in range(WINDOW):
+            row = rows.get(month_str(first + i)) or {}
+            for c, (f, _) in enumerate(self.fields):
+                v = row.get(f)
+                if v is not None:
+                    out[i, c] = v
+        return out
+
+    def _previous(self, ym: str) -> int | None:
+        """ym より前の月を対象にした直近の vintage の行番号"""
+        j = int(np.searchsorted(self.start, month_index(ym) - WINDOW + 1)) - 1
+        return j if j >= 0 else None
+
+    def diff(self, ym: str, snap: np.ndarray) -> list[Revision]:
+        """snap（ym の発表分）を1つ前の vintage と比べ、表示の桁で値が変わった (月, 項目) を返す"""
+        j = self._previous(ym)
+        if j is None:
+            return []
+        first = month_index(ym) - WINDOW + 1
+        shift = first - int(self.start[j])   # 前の vintage の何行目が snap の先頭に当たるか
+        if shift >= WINDOW:
+            return []
+        old = self.values[j, shift:]
+        new = snap[:WINDOW - shift]
+        scale = 10.0 ** self._digits
+        changed = np.round(old * scale) != np.round(new * scale)
+        changed &= ~np.isnan(old) & ~np.isnan(new)
+        return [Revision(month_str(first + int(i)), self.fields[c][0], float(old[i, c]), float(new[i, c]))
+                for i, c in zip(*np.nonzero(changed))]
+
+    def append(self, ym: str, snap: np.ndarray, taken: float | None = None) -> "Vintages":
+        """ym の vintage を足した Vintages（同じ月の vintage があれば置き換える）"""
+        first = month_index(ym) - WINDOW + 1
+        keep = len(self.start)
+        if keep and self.start[-1] >= first:
+            keep = int(np.searchsorted(self.start, first))
+        return Vintages(
+            self.indicator,
+            np.append(self.taken[:keep], time.time() if taken is None else taken),
+            np.append(self.start[:keep], first),
+            np.concatenate([self.values[:keep], snap[None]]),
+        )
+
+def by_field(revisions: list[Revision], month: str) -> dict[str, tuple[float, float]]:
+    """month の改定だけを {項目: (旧, 新)} にする（本文の「前回」に差し込む形）"""
+    return {r.field: (r.old, r.new) for r in revisions if r.month == month}
+
+def log(indicator: str, revisions: list[Revision]):
+    for r in revisions:
+        print(f"[revisions] {indicator} {r.month} {r.field}: {r.old:g} -> {r.new:g}")
+
+def record(indicator: str, ym: str, snap: np.ndarray, vintages: "Vintages | None" = None, path: str | None = None):
+    """投稿後に vintage を1つ足して保存する"""
+    v = vintages if vintages is not None else Vintages.load(indicator, path)
+    v.append(ym, snap).save(path)
+
+# ========= CLI =========
+def main():
+    ap = argparse.ArgumentParser(description="Show published vintages and the revisions between them.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("show")
+    p.add_argument("indicator", choices=sorted(FIELDS))
+    p.add_argument("--last", type=int, default=12)
+    args = ap.parse_args()
+
+    v = Vintages.load(args.indicator)
+    if not len(v):
+        print(f"[revisions] {args.indicator}: no vintages ({path_for(args.indicator)})")
+        return
+    for j in range(max(0, len(v) - args.last), len(v)):
+        ym = month_str(int(v.start[j]) + WINDOW - 1)
+        taken = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(v.taken[j]))
+        revs = Vintages(args.indicator, v.taken[:j], v.start[:j], v.values[:j]).diff(ym, v.values[j])
+        cells = "  ".join(f"{f}={x:g}" for (f, _), x in zip(v.fields, v.values[j, -1]) if not np.isnan(x))
+        print(f"{ym}  {taken}  {cells}")
+        for r in revs:
+            print(f"         revised {r.month} {r.field}: {r.old:g} -> {r.new:g}")
+
+if __name__ == "__main__":
+    main()
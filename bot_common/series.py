@@ -0,0 +1,88 @@
+# bot_common/series.py
+#
+# 月次系列の派生値（MoM / YoY / 差分 / 3・6か月年率）を NumPy で全期間まとめて計算する。
+# 観測値は月で揃えた連続配列に置き、欠損月は NaN（= マスク）として扱うので、
+# 途中の月が抜けていても「1つ前の要素」を前月と取り違えることがない。
+
+import numpy as np
+
+DERIVED = ("level", "diff", "mom", "yoy", "ann3", "ann6")
+
+def month_index(date: str) -> int:
+    """"YYYY-MM" / "YYYY-MM-DD" → 通し月番号（year * 12 + month - 1）"""
+    return int(date[:4]) * 12 + int(date[5:7]) - 1
+
+def month_str(idx: int) -> str:
+    return f"{idx // 12:04d}-{idx % 12 + 1:02d}"
+
+class MonthlySeries:
+    """start（通し月番号）から始まる連続した月次配列。欠損は NaN。"""
+
+    def __init__(self, start: int, values: np.ndarray):
+        self.start = start
+        self.values = values
+
+    @classmethod
+    def from_pairs(cls, pairs) -> "MonthlySeries":
+        """pairs: [(date, value)]（順不同、date は YYYY-MM[-DD]）"""
+        pairs = list(pairs)
+        if not pairs:
+            return cls(0, np.empty(0))
+        idx = np.fromiter((month_index(d) for d, _ in pairs), dtype=np.int64, count=len(pairs))
+        vals = np.fromiter((v for _, v in pairs), dtype=np.float64, count=len(pairs))
+        start = int(idx.min())
+        out = np.full(int(idx.max()) - start + 1, np.nan)
+        out[idx - start] = vals
+        return cls(start, out)
+
+    @classmethod
+    def from_map(cls, m: dict[str, float]) -> "MonthlySeries":
+        return cls.from_pairs(m.items())
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def pos(self, date: str) -> int | None:
+        i = month_index(date) - self.start
+        return i if 0 <= i < len(self.values) else None
+
+def _lag(v: np.ndarray, k: int) -> np.ndarray:
+    out = np.full_like(v, np.nan)
+    if k < len(v):
+        out[k:] = v[:-k]
+    return out
+
+class Derived:
+    """derive() の結果。arrays[name] は元系列と同じ月軸の配列（欠損は NaN）。"""
+
+    def __init__(self, series: MonthlySeries, arrays: dict[str, np.ndarray]):
+        self.series = series
+        self.arrays = arrays
+
+    def at(self, name: str, date: str) -> float | None:
+        i = self.series.pos(date)
+        if i is None:
+            return None
+        x = self.arrays[name][i]
+        return None if np.isnan(x) else float(x)
+
+    def mask(self, name: str) -> np.ndarray:
+        """値がある月なら True"""
+        return ~np.isnan(self.arrays[name])
+
+def derive(series: MonthlySeries) -> Derived:
+    v = series.values
+    lag1, lag3, lag6, lag12 = (_lag(v, k) for k in (1, 3, 6, 12))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        arrays = {
+            "level": v,
+            "diff": v - lag1,
+            "mom": (v / lag1 - 1.0) * 100.0,
+            "yoy": (v / lag12 - 1.0) * 100.0,
+            "ann3": ((v / lag3) ** 4 - 1.0) * 100.0,
+            "ann6": ((v / lag6) ** 2 - 1.0) * 100.0,
+        }
+    # 基準がゼロの変化率は未定義
+    for name, base in (("mom", lag1), ("yoy", lag12), ("ann3", lag3), ("ann6", lag6)):
+        arrays[name][base == 0] = np.nan
+    return Derived(series, arrays)
@@ -0,0 +1,126 @@
+# bot_common/state_store.py
+#
+# ボットの状態（投稿済みキーと小さな key-value）を SQLite(WAL) に持つ。
+# - 投稿済みキーは主キー索引で引く（旧 state.json の posted_keys リストの線形探索を置き換え）
+# - 書き込みはトランザクション単位なので途中でプロセスが落ちても壊れない
+# - claim() はファイルロック + BEGIN IMMEDIATE で「確認して登録」を原子的に行い、
+#   同じマシン上で重なった実行が同じキーを二重投稿しないようにする
+# - retention_days より古い投稿済みキーは開くたびに削除する
+# - 開いた側が閉じる（with StateStore(...) as state:）。常駐デーモンでは実行ごとに開き直すので atexit には積まない
+
+import fcntl
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+
+RETENTION_DAYS = int(os.getenv("STATE_RETENTION_DAYS", "400"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS posted (
+    key       TEXT PRIMARY KEY,
+    posted_at TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+def _utc_now() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+class StateStore:
+    def __init__(self, path: str, legacy_json: str | None = None, retention_days: int = RETENTION_DAYS):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        fresh = not os.path.exists(path)
+        # 常駐デーモンではジョブのスレッドで開き、終了時にメインスレッドで閉じる
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        if fresh and legacy_json and os.path.exists(legacy_json):
+            self._import_legacy(legacy_json)
+        self.compact(retention_days)
+
+    def __enter__(self) -> "StateStore":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---- key-value ----
+    def get(self, key: str, default=None):
+        row = self.conn.execute("SELECT value FROM kv WHERE key = ?", (key,)).fetchone()
+        return default if row is None else json.loads(row[0])
+
+    def set(self, key: str, value):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO kv (key, value) VALUES (?, ?)",
+            (key, json.dumps(value, ensure_ascii=False)),
+        )
+
+    # ---- idempotency keys ----
+    def has_posted(self, key: str) -> bool:
+        return self.conn.execute("SELECT 1 FROM posted WHERE key = ?", (key,)).fetchone() is not None
+
+    def claim(self, key: str) -> bool:
+        """未登録なら登録して True、既に登録済みなら False。投稿の直前に呼ぶ。"""
+        with self.lock():
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                cur = self.conn.execute(
+                    "INSERT OR IGNORE INTO posted (key, posted_at) VALUES (?, ?)",
+                    (key, _utc_now()),
+                )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        return cur.rowcount == 1
+
+    def release(self, key: str):
+        """投稿に失敗したときに claim を取り消す"""
+        with self.lock():
+            self.conn.execute("DELETE FROM posted WHERE key = ?", (key,))
+
+    def compact(self, retention_days: int = RETENTION_DAYS):
+        cutoff = (datetime.now(timezone.utc) - timedelta(days=retention_days)).strftime("%Y-%m-%dT%H:%M:%SZ")
+        self.conn.execute("DELETE FROM posted WHERE posted_at < ?", (cutoff,))
+
+    # ---- misc ----
+    @contextmanager
+    def lock(self, timeout: float = 60.0):
+        """同じ state ファイルを使うプロセス間の排他ロック（flock）"""
+        with open(self.path + ".lock", "w") as f:
+            deadline = time.monotonic() + timeout
+            while True:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if time.monotonic() >= deadline:
+                        raise TimeoutError(f"state lock busy: {self.path}")
+                    time.sleep(0.05)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def _import_legacy(self, legacy_json: str):
+        with open(legacy_json, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        now = _utc_now()
+        for key in data.pop("posted_keys", []):
+            self.conn.execute("INSERT OR IGNORE INTO posted (key, posted_at) VALUES (?, ?)", (key, now))
+        for k, v in data.items():
+            self.set(k, v)
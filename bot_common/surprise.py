@@ -0,0 +1,344 @@
+# bot_common/surprise.py
+#
+# 予想（CPI: Cleveland Fed Nowcast / 雇用統計: 市場予想）と実績の比較。
+# 指標ごとに「月 × 項目」の予想・実績の配列を持ち、サプライズ（実績 − 予想）、
+# 直近 SURPRISE_WINDOW 回の平均（バイアス）と RMSE、過去の分布に対する z 値、
+# z 値を項目で平均したサプライズ指数を NumPy でまとめて計算する。
+#
+# キャッシュ（data/surprise_<indicator>.npz）にはサプライズの累積和・二乗和・件数も持つので、
+# 新しい発表は1行足して累積和を1行伸ばすだけ（全期間の再計算をしない）。
+# 統計は累積和の差で出すので、発表時の1行分の計算は配列長に依らずマイクロ秒単位。
+#
+#   python -m bot_common.surprise rebuild cpi          # Nowcast 履歴 + 観測ストアから作り直す
+#   python -m bot_common.surprise rebuild employment --forecasts fixtures/replay/forecast/employment.json
+#   python -m bot_common.surprise show cpi --last 12
+
+import argparse
+import os
+import sys
+from typing import NamedTuple
+
+import numpy as np
+
+from bot_common.series import month_index, month_str
+
+SURPRISE_DIR = os.getenv("SURPRISE_DIR", "data")
+# バイアス・RMSE を取る直近の発表回数
+WINDOW = int(os.getenv("SURPRISE_WINDOW", "12"))
+# z 値を出すのに必要な過去の発表回数
+MIN_HISTORY = 6
+
+class Field(NamedTuple):
+    key: str
+    label: str
+    unit: str
+    digits: int
+    sign: int = 1   # サプライズ指数での向き（失業率は上振れが悪いので -1）
+
+FIELDS: dict[str, tuple[Field, ...]] = {
+    "cpi": (
+        Field("cpi_mom", "CPI前月比", "pt", 2),
+        Field("core_mom", "コア前月比", "pt", 2),
+        Field("cpi_yoy", "CPI前年比", "pt", 2),
+        Field("core_yoy", "コア前年比", "pt", 2),
+    ),
+    "employment": (
+        Field("nfp_man", "雇用者数", "万人", 1),
+        Field("ur", "失業率", "pt", 1, -1),
+        Field("ahe_mom", "時給前月比", "pt", 1),
+        Field("ahe_yoy", "時給前年比", "pt", 1),
+    ),
+}
+
+def path_for(indicator: str) -> str:
+    return os.path.join(SURPRISE_DIR, f"surprise_{indicator}.npz")
+
+# ========= History =========
+class History:
+    """
+    month: (n,) 通し月番号（昇順）、forecast / actual: (n, k)。欠けている値は NaN。
+    csum / csq / cnt: サプライズの累積和・二乗和・件数（先頭に 0 の行を持つ (n + 1, k)）。
+    """
+
+    def __init__(self, indicator: str, month: np.ndarray, forecast: np.ndarray, actual: np.ndarray,
+                 csum: np.ndarray | None = None, csq: np.ndarray | None = None, cnt: np.ndarray | None = None):
+        self.indicator = indicator
+        self.fields = FIELDS[indicator]
+        self.month = month.astype(np.int32)
+        self.forecast = forecast.astype(np.float64)
+        self.actual = actual.astype(np.float64)
+        if csum is None:
+            csum, csq, cnt = _cumulative(self.actual - self.forecast)
+        self.csum, self.csq, self.cnt = csum, csq, cnt
+
+    @classmethod
+    def empty(cls, indicator: str) -> "History":
+        k = len(FIELDS[indicator])
+        return cls(indicator, np.empty(0, np.int32), np.empty((0, k)), np.empty((0, k)))
+
+    @classmethod
+    def from_rows(cls, indicator: str, rows) -> "History":
+        """rows: [(YYYY-MM, {key: 予想}, {key: 実績})]（順不同。同じ月は後のものを使う）"""
+        keys = [f.key for f in FIELDS[indicator]]
+        by_month = {month_index(ym): (f, a) for ym, f, a in rows}
+        months = np.array(sorted(by_month), dtype=np.int32)
+        forecast = np.array([[_num(by_month[m][0].get(k)) for k in keys] for m in months]).reshape(-1, len(keys))
+        actual = np.array([[_num(by_month[m][1].get(k)) for k in keys] for m in months]).reshape(-1, len(keys))
+        return cls(indicator, months, forecast, actual)
+
+    @classmethod
+    def load(cls, indicator: str, path: str | None = None) -> "History":
+        path = path or path_for(indicator)
+        if not os.path.exists(path):
+            return cls.empty(indicator)
+        with np.load(path) as z:
+            if tuple(z["fields"].tolist()) != tuple(f.key for f in FIELDS[indicator]):
+                # 項目が変わったキャッシュは累積和が合わないので作り直す
+                return cls(indicator, z["month"], *_remap(z, FIELDS[indicator]))
+            return cls(indicator, z["month"], z["forecast"], z["actual"], z["csum"], z["csq"], z["cnt"])
+
+    def save(self, path: str | None = None):
+        path = path or path_for(self.indicator)
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp.npz"
+        np.savez(tmp, fields=np.array([f.key for f in self.fields]), month=self.month, forecast=self.forecast,
+                 actual=self.actual, csum=self.csum, csq=self.csq, cnt=self.cnt)
+        os.replace(tmp, path)
+
+    def __len__(self) -> int:
+        return len(self.month)
+
+    def with_row(self, ym: str, forecast: dict, actual: dict) -> "History":
+        """ym の行を足した（既にあれば置き換えた）History。末尾に足す・置き換えるときは累積和を1行だけ伸ばす。"""
+        m = month_index(ym)
+        f = np.array([_num(forecast.get(x.key)) for x in self.fields])
+        a = np.array([_num(actual.get(x.key)) for x in self.fields])
+        n = len(self.month)
+        if n and m < self.month[-1]:
+            # 過去の月の差し替え（取り込み直し）は全体を作り直す
+            rows = [(month_str(int(x)), dict(zip(self._keys, ff)), dict(zip(self._keys, aa)))
+                    for x, ff, aa in zip(self.month, self.forecast, self.actual) if x != m]
+            return History.from_rows(self.indicator, [*rows, (ym, forecast, actual)])
+        keep = n - 1 if n and self.month[-1] == m else n
+        s = a - f
+        ok = ~np.isnan(s)
+        s0 = np.where(ok, s, 0.0)
+        return History(
+            self.indicator,
+            np.append(self.month[:keep], m),
+            np.vstack([self.forecast[:keep], f]),
+            np.vstack([self.actual[:keep], a]),
+            np.vstack([self.csum[:keep + 1], self.csum[keep] + s0]),
+            np.vstack([self.csq[:keep + 1], self.csq[keep] + s0 * s0]),
+            np.vstack([self.cnt[:keep + 1], self.cnt[keep] + ok]),
+        )
+
+    @property
+    def _keys(self) -> list[str]:
+        return [f.key for f in self.fields]
+
+    def stats(self, rows: np.ndarray | None = None, window: int = WINDOW) -> dict[str, np.ndarray]:
+        """
+        rows（行番号、既定は全行）について:
+          surprise: 実績 − 予想
+          bias / rmse: その行までの直近 window 回の平均サプライズ・RMSE
+          z: 過去の行（その行を含まない）の平均・標準偏差で標準化したサプライズ
+          index: 向きを揃えた z の項目平均（サプライズ指数）
+        """
+        rows = np.arange(len(self.month)) if rows is None else np.asarray(rows)
+        i = rows + 1                      # 累積和は先頭に 0 の行があるので1つずれる
+        j = np.maximum(i - window, 0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            s = self.actual[rows] - self.forecast[rows]
+            n_win = self.cnt[i] - self.cnt[j]
+            bias = (self.csum[i] - self.csum[j]) / n_win
+            rmse = np.sqrt((self.csq[i] - self.csq[j]) / n_win)
+            n_prev = self.cnt[i - 1]
+            mean = self.csum[i - 1] / n_prev
+            var = (self.csq[i - 1] - n_prev * mean * mean) / (n_prev - 1)
+            z = (s - mean) / np.sqrt(var)
+            z[(n_prev < MIN_HISTORY) | ~(var > 0)] = np.nan
+            signed = z * np.array([f.sign for f in self.fields])
+            valid = ~np.isnan(signed)
+            index = np.where(valid.any(axis=1), np.nansum(signed, axis=1) / np.maximum(valid.sum(axis=1), 1), np.nan)
+        return {"month": self.month[rows], "surprise": s, "bias": bias, "rmse": rmse, "z": z, "index": index}
+
+    def at(self, ym: str) -> dict | None:
+        """ym の行の統計（項目ごとの dict）。無ければ None。"""
+        hit = np.flatnonzero(self.month == month_index(ym))
+        if len(hit) == 0:
+            return None
+        st = self.stats(hit)
+        out = {"month": ym, "index": _float(st["index"][0])}
+        for c, f in enumerate(self.fields):
+            out[f.key] = {name: _float(st[name][0, c]) for name in ("surprise", "bias", "rmse", "z")}
+        return out
+
+def _num(x) -> float:
+    return np.nan if x is None else float(x)
+
+def _float(x) -> float | None:
+    return None if np.isnan(x) else float(x)
+
+def _cumulative(s: np.ndarray):
+    ok = ~np.isnan(s)
+    s0 = np.where(ok, s, 0.0)
+    zero = np.zeros((1, s.shape[1]))
+    return (np.vstack([zero, np.cumsum(s0, axis=0)]), np.vstack([zero, np.cumsum(s0 * s0, axis=0)]),
+            np.vstack([zero, np.cumsum(ok, axis=0)]).astype(np.float64))
+
+def _remap(z, fields: tuple[Field, ...]):
+    old = z["fields"].tolist()
+    n = len(z["month"])
+    out = []
+    for name in ("forecast", "actual"):
+        arr = np.full((n, len(fields)), np.nan)
+        for c, f in enumerate(fields):
+            if f.key in old:
+                arr[:, c] = z[name][:, old.index(f.key)]
+        out.append(arr)
+    return out
+
+# ========= Text =========
+def _signed(x: float, digits: int) -> str:
+    s = f"{x:+.{digits}f}"
+    return "±" + s[1:] if float(s) == 0 else s
+
+def line(history: History, ym: str, forecast: dict, actual: dict, keys=None) -> str:
+    """
+    投稿に足す1行（例: 📊予想比：CPI前月比 +0.10pt／コア前月比 ±0.00pt（サプライズ指数 +1.2σ））。
+    ym の行を足した場合の統計を出す（キャッシュは書き換えない）。keys で表示する項目を絞る
+    （指数は全項目から）。比べられる項目が無ければ ""。
+    """
+    h = history.with_row(ym, forecast, actual)
+    # 過去の月の取り込み直しでは ym が最後の行とは限らない
+    st = h.stats(np.flatnonzero(h.month == month_index(ym)))
+    parts = []
+    for c, f in enumerate(h.fields):
+        s = st["surprise"][0, c]
+        if not np.isnan(s) and (keys is None or f.key in keys):
+            parts.append(f"{f.label} {_signed(s, f.digits)}{f.unit}")
+    if not parts:
+        return ""
+    idx = st["index"][0]
+    tail = "" if np.isnan(idx) else f"（サプライズ指数 {_signed(idx, 1)}σ）"
+    return "📊予想比：" + "／".join(parts) + tail
+
+def attach(texts: list[str], note: str, limit: int | None = None) -> list[str]:
+    """
+    最後の本文に note を1行足す。X の重み付き文字数で limit（既定 280）を超えるなら
+    note をスレッドの次の1本にする（Webhook は改行でつないで1通になる）。
+    """
+    from bot_common.x_client import MAX_WEIGHT, weighted_len
+
+    if not note or not texts:
+        return texts
+    limit = limit or MAX_WEIGHT
+    last = f"{texts[-1]}\n\n{note}"
+    if weighted_len(last) <= limit:
+        return [*texts[:-1], last]
+    if weighted_len(note) > limit:
+        print(f"[surprise] note is {weighted_len(note)} weighted chars (> {limit}); not posted: {note}")
+        return texts
+    print(f"[surprise] post would be {weighted_len(last)} weighted chars with the note; posting it as a reply")
+    return [*texts, note]
+
+def record(indicator: str, ym: str, forecast: dict, actual: dict, history: History | None = None,
+           path: str | None = None) -> History:
+    """発表後にキャッシュへ1行足して保存する（history が無ければキャッシュから読む）"""
+    h = (history if history is not None else History.load(indicator, path)).with_row(ym, forecast, actual)
+    h.save(path)
+    return h
+
+# ========= Rebuild =========
+def _cpi_rows() -> list:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, os.path.join(root, "cpi_fred_nowcast"))
+    import cpi_bot
+    import nowcast_history
+
+    from bot_common import obs_store
+    from bot_common.series import MonthlySeries, derive
+
+    months = [r[0] for r in nowcast_history.connect().execute("SELECT DISTINCT target_month FROM nowcast")]
+    derived = {name: derive(MonthlySeries.from_pairs(obs_store.latest(sid)))
+               for name, sid in (("cpi", cpi_bot.SERIES_CPI), ("core", cpi_bot.SERIES_CORE))}
+    rows = []
+    for ym in months:
+        fc = nowcast_history.latest_before(ym, cutoff=cpi_bot.release_cutoff(f"{ym}-01")) or {}
+        actual = {}
+        for name, d in derived.items():
+            for key in ("mom", "yoy"):
+                v = d.at(key, ym)
+                actual[f"{name}_{key}"] = None if v is None else cpi_bot.round_half_up(v, 2)
+        rows.append((ym, fc, actual))
+    return rows
+
+def employment_forecast(fc: dict) -> dict:
+    """市場予想の JSON（minkabu_forecast の形式）→ FIELDS["employment"] のキー"""
+    return {"nfp_man": fc.get("nfp_man"), "ur": fc.get("unemployment_rate"),
+            "ahe_mom": fc.get("ahe_mom"), "ahe_yoy": fc.get("ahe_yoy")}
+
+def employment_actual(actual: dict) -> dict:
+    """bls_actuals.get_actuals() の戻り値 → FIELDS["employment"] のキー"""
+    return {"nfp_man": actual.get("nfp_man_actual"), "ur": actual.get("ur_actual"),
+            "ahe_mom": actual.get("ahe_mom_actual"), "ahe_yoy": actual.get("ahe_yoy_actual")}
+
+def _employment_rows(forecasts_path: str) -> list:
+    """実績は bls_bulk のアーカイブがあればそこから、無ければ観測ストアから"""
+    import json
+
+    from bot_common import bls_bulk
+    from employment_report import bls_actuals
+
+    with open(forecasts_path, "r", encoding="utf-8") as f:
+        forecasts = json.load(f)
+    if os.path.exists(bls_bulk.ARCHIVE_PATH):
+        arc = bls_bulk.load()
+        actual = lambda ym: bls_actuals.actuals_from_archive(ym, arc)
+    else:
+        m = bls_actuals._load_map([bls_actuals.SERIES_NFP_LEVEL, bls_actuals.SERIES_AHE_LEVEL, bls_actuals.SERIES_UR])
+        actual = lambda ym: bls_actuals.actuals_from_map(m, ym)
+    return [(ym, employment_forecast(fc), employment_actual(actual(ym))) for ym, fc in forecasts.items()]
+
+def main():
+    ap = argparse.ArgumentParser(description="Forecast surprise and nowcast accuracy statistics.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("rebuild", help="recompute the cache over the full history")
+    p.add_argument("indicator", choices=sorted(FIELDS))
+    p.add_argument("--forecasts", help="employment: JSON {YYYY-MM: forecast} (minkabu format)")
+    p = sub.add_parser("show")
+    p.add_argument("indicator", choices=sorted(FIELDS))
+    p.add_argument("--last", type=int, default=12)
+    args = ap.parse_args()
+
+    if args.cmd == "rebuild":
+        if args.indicator == "cpi":
+            rows = _cpi_rows()
+        else:
+            if not args.forecasts:
+                ap.error("employment needs --forecasts")
+            rows = _employment_rows(args.forecasts)
+        h = History.from_rows(args.indicator, rows)
+        h.save()
+        print(f"[surprise] {args.indicator}: {len(h)} releases -> {path_for(args.indicator)}")
+        return
+
+    h = History.load(args.indicator)
+    if not len(h):
+        print(f"[surprise] {args.indicator}: no history ({path_for(args.indicator)})")
+        return
+    rows = np.arange(max(0, len(h) - args.last), len(h))
+    st = h.stats(rows)
+    print("month  " + "  ".join(f"{f.key:>34}" for f in h.fields) + "   index")
+    for r, m in enumerate(st["month"]):
+        cells = []
+        for c, f in enumerate(h.fields):
+            s, z, bias, rmse = (st[k][r, c] for k in ("surprise", "z", "bias", "rmse"))
+            cells.append(f"{s:+7.{f.digits}f} z{z:+5.1f} bias{bias:+6.2f} rmse{rmse:5.2f}" if not np.isnan(s)
+                         else f"{'—':>34}")
+        print(f"{month_str(int(m))}  " + "  ".join(cells) + f"  {st['index'][r]:+6.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+# bot_common/trace.py
+#
+# ステージごとの所要時間（span）を JSON Lines で METRICS_PATH に書き出す軽量トレーサー。
+# 1行 = 1 span: {"run", "span", "parent", "name", "start", "ms", "status", ...attrs}
+# 親子関係は contextvars で引き継ぐ（http_client.submit のスレッドにもコピーされる）。
+#
+#   with trace.span("compute", series="CPIAUCSL") as s:
+#       ...
+#       s["rows"] = 14          # 終了時に属性として書き出される
+#
+# BOT_PROFILE=cprofile / tracemalloc で run() 全体のプロファイルを BOT_PROFILE_DIR に保存する。
+# METRICS_PATH を空にするとファイルには書かない（集計の表示だけ）。
+
+import contextvars
+import itertools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+METRICS_PATH = os.getenv("METRICS_PATH", "data/metrics.jsonl")
+PROFILE = os.getenv("BOT_PROFILE", "").strip().lower()
+PROFILE_DIR = Path(os.getenv("BOT_PROFILE_DIR", "data/profile"))
+RUN_ID = os.getenv("GITHUB_RUN_ID") or os.urandom(6).hex()
+
+_current: contextvars.ContextVar[int | None] = contextvars.ContextVar("trace_span", default=None)
+_ids = itertools.count(1)
+_lock = threading.Lock()
+_spans: list[dict] = []
+
+def _emit(entry: dict):
+    with _lock:
+        _spans.append(entry)
+        if not METRICS_PATH:
+            return
+        try:
+            path = Path(METRICS_PATH)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with path.open("a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+        except OSError as e:
+            print(f"[trace] could not write metrics: {e}")
+
+@contextmanager
+def span(name: str, **attrs):
+    """name の区間を計測する。yield した dict に入れた値も属性として記録される。"""
+    span_id = next(_ids)
+    parent = _current.get()
+    token = _current.set(span_id)
+    start = time.time()
+    t0 = time.perf_counter()
+    status = "ok"
+    try:
+        yield attrs
+    except BaseException as e:
+        status = "error"
+        attrs["error"] = f"{type(e).__name__}: {e}"[:300]
+        raise
+    finally:
+        ms = (time.perf_counter() - t0) * 1000.0
+        _current.reset(token)
+        _emit({
+            "run": RUN_ID, "span": span_id, "parent": parent, "name": name,
+            "start": round(start, 6), "ms": round(ms, 3), "status": status, **attrs,
+        })
+
+def record(name: str, t0: float, **attrs):
+    """既に始まっていた区間（perf_counter の t0 から今まで）を span として記録する"""
+    ms = (time.perf_counter() - t0) * 1000.0
+    _emit({
+        "run": RUN_ID, "span": next(_ids), "parent": _current.get(), "name": name,
+        "start": round(time.time() - ms / 1000.0, 6), "ms": round(ms, 3), "status": "ok", **attrs,
+    })
+
+def summary() -> dict[str, dict]:
+    """{name: {"count", "total_ms", "max_ms", "errors"}}（このプロセスで記録した span）"""
+    out: dict[str, dict] = {}
+    with _lock:
+        spans = list(_spans)
+    for s in spans:
+        agg = out.setdefault(s["name"], {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "errors": 0})
+        agg["count"] += 1
+        agg["total_ms"] += s["ms"]
+        agg["max_ms"] = max(agg["max_ms"], s["ms"])
+        agg["errors"] += s["status"] == "error"
+    return out
+
+def print_summary(prefix: str = "[trace]"):
+    rows = sorted(summary().items(), key=lambda kv: -kv[1]["total_ms"])
+    if not rows:
+        return
+    print(f"{prefix} {'span':<24} {'n':>4} {'total':>10} {'max':>10}  (ms)")
+    for name, a in rows:
+        err = f"  errors={a['errors']}" if a["errors"] else ""
+        print(f"{prefix} {name:<24} {a['count']:>4} {a['total_ms']:>10.1f} {a['max_ms']:>10.1f}{err}")
+    if METRICS_PATH:
+        print(f"{prefix} spans appended to {METRICS_PATH} (run={RUN_ID})")
+
+# ========= Profiling hooks =========
+@contextmanager
+def _cprofile(command: str):
+    import cProfile
+    import io
+    import pstats
+
+    prof = cProfile.Profile()
+    prof.enable()
+    try:
+        yield
+    finally:
+        prof.disable()
+        PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+        out = PROFILE_DIR / f"{command}.prof"
+        prof.dump_stats(str(out))
+        buf = io.StringIO()
+        pstats.Stats(prof, stream=buf).sort_stats("cumulative").print_stats(25)
+        (PROFILE_DIR / f"{command}.cprofile.txt").write_text(buf.getvalue(), encoding="utf-8")
+        print(f"[trace] cProfile written to {out}")
+
+@contextmanager
+def _tracemalloc(command: str):
+    import tracemalloc
+
+    tracemalloc.start(25)
+    try:
+        yield
+    finally:
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+        out = PROFILE_DIR / f"{command}.tracemalloc.txt"
+        lines = [f"current={current / 1024:.1f}KiB peak={peak / 1024:.1f}KiB", ""]
+        lines += [str(stat) for stat in snapshot.statistics("lineno")[:30]]
+        out.write_text("\n".join(lines) + "\n", encoding="utf-8")
+        print(f"[trace] tracemalloc peak {peak / 1024:.1f}KiB, top allocations written to {out}")
+
+@contextmanager
+def _no_profile(command: str):
+    yield
+
+_PROFILERS = {"cprofile": _cprofile, "tracemalloc": _tracemalloc}
+
+@contextmanager
+def run(command: str, **attrs):
+    """エントリポイント全体を1つの span で囲み、BOT_PROFILE のプロファイルと集計表示を行う"""
+    profiler = _PROFILERS.get(PROFILE, _no_profile)
+    try:
+        with profiler(command), span(command, **attrs) as s:
+            yield s
+    finally:
+        print_summary()
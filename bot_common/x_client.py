@@ -0,0 +1,155 @@
+# bot_common/x_client.py
+#
+# X API v2 への投稿。OAuth1 は一度だけ組み立て、共有 Session のコネクションを
+# 発表前に温めておく（warm）ことで、発表時の投稿を1リクエストにする。
+
+import os
+import time
+import unicodedata
+from typing import TYPE_CHECKING
+
+import requests
+
+from bot_common import quota
+from bot_common.http_client import session
+from bot_common.trace import span
+
+if TYPE_CHECKING:
+    from requests_oauthlib import OAuth1
+
+TWEET_URL = os.getenv("X_TWEET_URL", "https://api.x.com/2/tweets")
+MEDIA_URL = os.getenv("X_MEDIA_URL", "https://upload.twitter.com/1.1/media/upload.json")
+
+# 1 なら実際には投稿せず、本文を dry_run_sent に残してダミーの応答を返す（リプレイ・検証用）
+DRY_RUN = os.getenv("X_DRY_RUN", "0") == "1"
+dry_run_sent: list[str] = []
+
+# 1ポストの重み付き文字数の上限（weighted_len）
+MAX_WEIGHT = 280
+
+_auth_cache: dict[tuple, "OAuth1"] = {}
+
+def oauth(api_key: str, api_secret: str, access_token: str, access_secret: str) -> "OAuth1":
+    key = (api_key, api_secret, access_token, access_secret)
+    auth = _auth_cache.get(key)
+    if auth is None:
+        # requests_oauthlib（oauthlib ごと）は投稿する経路でだけ読み込む
+        from requests_oauthlib import OAuth1
+
+        auth = OAuth1(api_key, api_secret, access_token, access_secret)
+        _auth_cache[key] = auth
+    return auth
+
+# 環境変数名はボットごとに違っていた（CPI: X_CONSUMER_*/X_ACCESS_TOKEN_SECRET、雇用統計: X_API_*/X_ACCESS_SECRET）
+_ENV_NAMES = (
+    ("X_API_KEY", "X_CONSUMER_KEY"),
+    ("X_API_SECRET", "X_CONSUMER_SECRET"),
+    ("X_ACCESS_TOKEN",),
+    ("X_ACCESS_SECRET", "X_ACCESS_TOKEN_SECRET"),
+)
+
+def credentials() -> tuple[str, str, str, str] | None:
+    """環境変数の認証情報（どちらの命名でもよい）。揃っていなければ None。"""
+    vals = tuple(next((os.environ[n] for n in names if os.environ.get(n)), "") for names in _ENV_NAMES)
+    return vals if all(vals) else None
+
+def oauth_from_env() -> "OAuth1":
+    creds = credentials()
+    if creds is None:
+        raise RuntimeError("X API secrets are missing")
+    return oauth(*creds)
+
+def warm(url: str = TWEET_URL, timeout: float = 5.0) -> float:
+    """
+    投稿先ホストへの TLS コネクションを張っておく（レスポンスの中身は見ない）。
+    所要ミリ秒を返す。失敗しても投稿時に張り直すだけなので例外は握りつぶす。
+    """
+    if DRY_RUN:
+        return 0.0
+    t0 = time.perf_counter()
+    try:
+        with span("x.warm"):
+            session().head(url, timeout=timeout)
+    except Exception as e:
+        print(f"[x] warm-up failed: {e}")
+    return (time.perf_counter() - t0) * 1000.0
+
+def weighted_len(text: str) -> int:
+    """
+    X の重み付き文字数（twitter-text v3）。ラテン文字・記号の一部は1、それ以外（日本語・絵文字など）は2。
+    絵文字の結合子・異体字セレクタ・肌色は前の絵文字に含め、国旗（地域指示子2つ）は1つの絵文字として数える。
+    ZWJ でつないだ絵文字は部品ごとに数えるので、X より多めになる（超えない側に倒れる）。
+    """
+    n = 0
+    half_flag = False
+    for ch in unicodedata.normalize("NFC", text):
+        cp = ord(ch)
+        if cp in (0x200D, 0xFE0E, 0xFE0F) or 0x1F3FB <= cp <= 0x1F3FF:
+            continue
+        if 0x1F1E6 <= cp <= 0x1F1FF:
+            half_flag = not half_flag
+            n += 2 if half_flag else 0
+            continue
+        half_flag = False
+        n += 1 if cp <= 0x10FF or 0x2000 <= cp <= 0x200D or 0x2010 <= cp <= 0x201F or 0x2032 <= cp <= 0x2037 else 2
+    return n
+
+def _is_duplicate(r: requests.Response) -> bool:
+    # X は同じ本文の再投稿を 403 "duplicate content" で拒否する
+    return r.status_code == 403 and "duplicate" in r.text.lower()
+
+def upload_media(auth: "OAuth1", data: bytes, url: str = MEDIA_URL, timeout: float = 10,
+                 mime: str = "image/png") -> str:
+    """画像をアップロードして media_id を返す（v1.1 の simple upload。5MB まで）"""
+    with span("x.media", bytes=len(data), dry_run=DRY_RUN) as s:
+        if DRY_RUN:
+            return "dry-run-media"
+        r = session().post(url, files={"media": ("chart.png", data, mime)}, auth=auth, timeout=timeout)
+        s["status"] = r.status_code
+        if r.status_code == 429:
+            raise quota.Throttled("x", quota.retry_after_from(r.headers, default=60.0), "HTTP 429 (media)")
+        r.raise_for_status()
+        return r.json()["media_id_string"]
+
+def post_tweet(auth: "OAuth1", text: str, url: str = TWEET_URL, timeout: float = 30, reply_to: str | None = None,
+               media_ids: list[str] | None = None) -> dict:
+    """
+    投稿して API の応答を返す。reply_to（ツイート ID）を渡すとそのツイートへの返信にする。
+    media_ids は upload_media() の戻り値。
+    同じ本文が既に投稿済み（応答を受け取れなかった前回の試行など）なら
+    例外にせず {"data": None, "duplicate": True} を返す。
+    """
+    with span("post", chars=len(text), dry_run=DRY_RUN) as s:
+        if DRY_RUN:
+            dry_run_sent.append(text)
+            return {"data": {"id": "dry-run", "text": text}}
+        body = {"text": text}
+        if reply_to:
+            body["reply"] = {"in_reply_to_tweet_id": reply_to}
+        if media_ids:
+            body["media"] = {"media_ids": media_ids}
+        s["quota_wait"] = quota.acquire("x", max_wait=5.0)
+        r = session().post(url, json=body, auth=auth, timeout=timeout)
+        s["status"] = r.status_code
+        if r.status_code == 429:
+            retry_after = quota.retry_after_from(r.headers, default=900.0)
+            quota.throttle("x", retry_after)
+            raise quota.Throttled("x", retry_after, "HTTP 429")
+        if _is_duplicate(r):
+            s["duplicate"] = True
+            return {"data": None, "duplicate": True, "detail": r.text[:200]}
+        r.raise_for_status()
+        return r.json()
+
+def is_retryable(e: Exception) -> bool:
+    """
+    投稿を再試行してよい失敗か。接続エラー・タイムアウト・429（Throttled）・5xx のみ。
+    タイムアウトや 5xx は実は投稿済みの場合もあるが、再送は重複として拒否され
+    post_tweet が投稿済み扱いにするので二重投稿にはならない。
+    投稿は非冪等なので hedge（同時に2本送る）は使わないこと。
+    """
+    if isinstance(e, (requests.ConnectionError, requests.Timeout, quota.Throttled)):
+        return True
+    if isinstance(e, requests.HTTPError) and e.response is not None:
+        return e.response.status_code == 429 or e.response.status_code >= 500
+    return False
@@ -1,35 +1,53 @@
-import json
+import time
+
+_T_IMPORT = time.perf_counter()
+
+import importlib
 import os
 import sys
-import requests
-from datetime import datetime
+from concurrent.futures import as_completed
+from datetime import datetime, timezone
 from decimal import Decimal, ROUND_HALF_UP
-from bs4 import BeautifulSoup
-from requests_oauthlib import OAuth1
+from zoneinfo import ZoneInfo
+
+# python cpi_fred_nowcast/cpi_bot.py で起動されるため、共有パッケージ用にリポジトリ直下を path に追加
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot_common import bls_series, obs_store, trace
+from bot_common.bls_api import fetch_bls_batch
+from bot_common.http_client import fetch_if_changed, gather, submit
+from bot_common.release_poller import poll_release, release_time
+from bot_common.state_store import StateStore
+from bot_common.trace import span
+import nowcast_history
+
+# コマンドごとに必要なものだけ読み込む:
+#   numpy（bot_common.series）は post_cpi の計算だけ、nowcast_feed / nowcast_parse は save_nowcast だけ、
+#   publish / charts / x_client は post_cpi の arm で、export は投稿後だけ、
+#   requests_oauthlib は X に投稿するときだけ（publish.arm → x_client.oauth 内）
 
 # ========= Config =========
-STATE_PATH = "cpi_fred_nowcast/state.json"
+STATE_PATH = os.environ.get("CPI_STATE_PATH", "cpi_fred_nowcast/state.sqlite3")
+LEGACY_STATE_PATH = "cpi_fred_nowcast/state.json"
 
 FRED_API_KEY = os.environ.get("FRED_API_KEY", "")
-FRED_BASE = "https://api.stlouisfed.org/fred"
+FRED_BASE = os.environ.get("FRED_BASE", "https://api.stlouisfed.org/fred")
+
+ET = ZoneInfo("America/New_York")
 
-NOWCAST_URL = "https://www.clevelandfed.org/indicators-and-data/inflation-nowcasting"
 
 # FRED series
 SERIES_CPI = "CPIAUCSL"   # CPI (Index 1982-84=100)
 SERIES_CORE = "CPILFESL"  # Core CPI (Index)
 
-# ========= Utils =========
-def load_state():
-    if not os.path.exists(STATE_PATH):
-        return {}
-    with open(STATE_PATH, "r", encoding="utf-8") as f:
-        return json.load(f)
+# 同じ指数の BLS 側 ID（季節調整済み・1982-84=100）
+BLS_SERIES = {SERIES_CPI: bls_series.sid("cpi"), SERIES_CORE: bls_series.sid("core")}
 
-def save_state(state):
-    os.makedirs(os.path.dirname(STATE_PATH), exist_ok=True)
-    with open(STATE_PATH, "w", encoding="utf-8") as f:
-        json.dump(state, f, ensure_ascii=False, indent=2)
+# ========= Utils =========
+def load_state() -> StateStore:
+    # 初回は旧 state.json（posted_keys / fred_cpi_last_date / nowcast）を取り込む
+    with span("state.load"):
+        return StateStore(STATE_PATH, legacy_json=LEGACY_STATE_PATH)
 
 def round_half_up(x: float, ndigits: int = 2) -> float:
     q = Decimal("1." + "0" * ndigits)
@@ -46,30 +64,150 @@ def month_jp_from_fred_date(date_str: str) -> str:
     return f"{int(date_str[5:7])}月"
 
 # ========= FRED =========
-def fred_observations(series_id: str, limit: int = 36):
+def _fred_if_changed(series_id: str, **params):
+    """前回と同じ応答なら JSON デコードを省略して (False, 前回の observations) を返す"""
     if not FRED_API_KEY:
         raise RuntimeError("FRED_API_KEY is missing.")
-    r = requests.get(
+    return fetch_if_changed(
+        "GET",
         f"{FRED_BASE}/series/observations",
+        lambda r: r.json()["observations"],
+        upstream="fred",
         params={
             "series_id": series_id,
             "api_key": FRED_API_KEY,
             "file_type": "json",
-            "sort_order": "desc",
-            "limit": limit,
+            **params,
         },
         timeout=30,
     )
-    r.raise_for_status()
-    obs = r.json()["observations"]
+
+def _fred_raw(series_id: str, **params):
+    return _fred_if_changed(series_id, **params)[1]
+
+def _valid(o) -> bool:
+    return o.get("value") not in (None, "", ".")
+
+def fred_observations(series_id: str, limit: int = 36):
+    obs = _fred_raw(series_id, sort_order="desc", limit=limit)
     out = []
     for o in obs:
-        v = o.get("value")
-        if v in (None, "", "."):
+        if not _valid(o):
             continue
-        out.append((o["date"], float(v)))
+        out.append((o["date"], float(o["value"])))
     return out  # desc
 
+def _month_shift(date_str: str, months: int) -> str:
+    y, m = int(date_str[:4]), int(date_str[5:7])
+    n = y * 12 + (m - 1) + months
+    return f"{n // 12:04d}-{n % 12 + 1:02d}-01"
+
+def sync_fred(series_id: str, limit: int = 36) -> int:
+    """
+    ローカルストアを FRED と差分同期する。
+    初回は直近 limit 件、以降は最終観測月の13か月前から（YoY に使う範囲の改定も拾う）、
+    前回同期日以降の vintage だけを取得。
+    """
+    last = obs_store.last_date(series_id)
+    synced = obs_store.last_sync(series_id)
+    if last is None or synced is None:
+        changed, obs = _fred_if_changed(series_id, sort_order="desc", limit=limit)
+    else:
+        changed, obs = _fred_if_changed(
+            series_id,
+            observation_start=_month_shift(last, -13),
+            realtime_start=synced[:10],
+        )
+    if not changed:
+        return 0
+    rows = sorted(
+        (o["date"], o.get("realtime_start", ""), float(o["value"]))
+        for o in obs if _valid(o)
+    )
+    return obs_store.record(series_id, rows)
+
+def load_observations(series_id: str, limit: int = 36):
+    """同期してからストアの [(date, value)] desc を返す"""
+    sync_fred(series_id, limit=limit)
+    return obs_store.latest(series_id, limit=limit)
+
+# ========= Source racing (FRED vs BLS) =========
+def _cpi_from_fred(limit: int = 36):
+    return tuple(gather(
+        lambda: load_observations(SERIES_CPI, limit=limit),
+        lambda: load_observations(SERIES_CORE, limit=limit),
+    ))
+
+def _cpi_from_bls(expected: str | None):
+    # compute_mom_yoy は14か月分必要
+    y = int(expected[:4]) if expected else datetime.utcnow().year
+    m = int(expected[5:7]) if expected else 12
+    start_year = y - 1 if m >= 2 else y - 2
+    # 同時発表の内訳・実質賃金も同じ POST で取り、ストアに残しておく
+    changed, maps = fetch_bls_batch(bls_series.series_for("cpi"), start_year=start_year, end_year=y)
+    if changed:
+        vintage = obs_store.utc_now()
+        for sid, series in maps.items():
+            obs_store.record(sid, sorted((f"{k}-01", vintage, v) for k, v in series.items()), synced_at=vintage)
+    out = []
+    for fred_id in (SERIES_CPI, SERIES_CORE):
+        series = maps.get(BLS_SERIES[fred_id], {})
+        out.append(sorted(((f"{ym}-01", v) for ym, v in series.items()), reverse=True))
+    return tuple(out)
+
+def race_cpi(expected: str | None):
+    """
+    FRED と BLS に同時に問い合わせ、expected 月（YYYY-MM-01）を最初に返したソースを採用する。
+    どちらも未更新ならより新しい方（同じなら先着）を返す。
+    returns: (source, cpi_obs, core_obs)
+    """
+    with span("race", expected=expected) as s:
+        source, cpi_obs, core_obs = _race(expected)
+        s["source"] = source
+        s["latest"] = cpi_obs[0][0] if cpi_obs else None
+    return source, cpi_obs, core_obs
+
+def _race(expected: str | None):
+    t0 = time.perf_counter()
+    futures = {
+        submit(_cpi_from_fred): "fred",
+        submit(lambda: _cpi_from_bls(expected)): "bls",
+    }
+    best = None
+    for f in as_completed(futures):
+        name = futures[f]
+        ms = (time.perf_counter() - t0) * 1000.0
+        try:
+            cpi_obs, core_obs = f.result()
+        except Exception as e:
+            print(f"[cpi] race: {name} failed at +{ms:.0f}ms: {e}")
+            continue
+        latest = min(cpi_obs[0][0], core_obs[0][0]) if cpi_obs and core_obs else ""
+        if expected is not None and latest >= expected:
+            print(f"[cpi] race: {name} won with {latest} at +{ms:.0f}ms")
+            _log_loser(futures, f, t0, name)
+            return name, cpi_obs, core_obs
+        print(f"[cpi] race: {name} returned {latest or 'nothing'} at +{ms:.0f}ms")
+        if best is None or latest > best[0]:
+            best = (latest, name, cpi_obs, core_obs)
+
+    if best is None:
+        raise RuntimeError("CPI race: all sources failed")
+    _, name, cpi_obs, core_obs = best
+    return name, cpi_obs, core_obs
+
+def _log_loser(futures, winner, t0: float, winner_name: str):
+    won_ms = (time.perf_counter() - t0) * 1000.0
+    for f, name in futures.items():
+        if f is winner:
+            continue
+
+        def _done(fut, name=name):
+            lag = (time.perf_counter() - t0) * 1000.0 - won_ms
+            print(f"[cpi] race: {name} finished {lag:+.0f}ms after {winner_name}")
+
+        f.add_done_callback(_done)
+
 def compute_mom_yoy(series_obs):
     """
     series_obs: [(date, value)] desc
@@ -78,65 +216,35 @@ def compute_mom_yoy(series_obs):
       mom, mom_prev,
       yoy, yoy_prev
     """
-    if len(series_obs) < 14:
-        raise RuntimeError("Not enough observations to compute MoM/YoY.")
+    from bot_common.series import MonthlySeries, derive
 
-    (d0, v0), (d1, v1), (d2, v2) = series_obs[0], series_obs[1], series_obs[2]
-    mom = round_half_up(pct_change(v0, v1), 2)
-    mom_prev = round_half_up(pct_change(v1, v2), 2)
-
-    # yoy needs 12 months back
-    (d12, v12), (d13, v13) = series_obs[12], series_obs[13]
-    yoy = round_half_up(pct_change(v0, v12), 2)
-    yoy_prev = round_half_up(pct_change(v1, v13), 2)
+    d0 = series_obs[0][0] if series_obs else None
+    d = derive(MonthlySeries.from_pairs(series_obs))
+    d1 = _month_shift(d0, -1) if d0 else None
+    vals = [d.at(name, date) for name, date in (("mom", d0), ("mom", d1), ("yoy", d0), ("yoy", d1))] if d0 else [None]
+    if any(v is None for v in vals):
+        raise RuntimeError("Not enough observations to compute MoM/YoY.")
 
+    mom, mom_prev, yoy, yoy_prev = (round_half_up(v, 2) for v in vals)
     return d0, mom, mom_prev, yoy, yoy_prev
 
 # ========= Cleveland Fed Nowcast scraping =========
-def fetch_nowcast_tables():
-    r = requests.get(NOWCAST_URL, timeout=30)
-    r.raise_for_status()
-    soup = BeautifulSoup(r.text, "html.parser")
-    tables = soup.find_all("table")
-    if len(tables) < 2:
-        raise RuntimeError("Nowcast tables not found (page structure changed?)")
-    # Usually: first is MoM, second is YoY
-    return tables[0], tables[1]
-
-def table_to_rows(table):
-    rows = []
-    for tr in table.find_all("tr"):
-        cells = [c.get_text(" ", strip=True) for c in tr.find_all(["th", "td"])]
-        if cells:
-            rows.append(cells)
-    return rows
-
-def pick_value(rows, month_label: str, col_name: str):
-    header = rows[0]
-    if col_name not in header:
-        return None
-    idx = header.index(col_name)
-    for r in rows[1:]:
-        if not r:
-            continue
-        if r[0].strip() == month_label:
-            if idx >= len(r):
-                return None
-            raw = (r[idx] or "").strip()
-            if raw == "":
-                return None
-            try:
-                return float(raw)
-            except Exception:
-                return None
-    return None
+def fetch_nowcast_tables(month_label: str | None = None):
+    """
+    returns: (mom_index, yoy_index) — {月ラベル: {列名: 値文字列}}
+    JSON フィードを優先し、month_label の行が取れなければ HTML を読む（nowcast_feed）
+    """
+    import nowcast_feed
+
+    res = nowcast_feed.fetch(required=month_label)
+    return res.tables["mom"], res.tables["yoy"]
 
 def target_month_label_from_fred_next_month() -> str:
     """
     発表前保存用：FREDの最新CPI月の「次月」をNowcast対象月として推定
     例：FRED最新が 2025-11-01 -> target = December 2025
     """
-    cpi_obs = fred_observations(SERIES_CPI, limit=24)
+    cpi_obs = load_observations(SERIES_CPI, limit=24)
     latest_date = cpi_obs[0][0]
     dt = datetime.strptime(latest_date, "%Y-%m-%d")
     y = dt.year + (1 if dt.month == 12 else 0)
@@ -145,24 +253,23 @@ def target_month_label_from_fred_next_month() -> str:
     return target.strftime("%B %Y")
 
 def save_nowcast():
-    state = load_state()
+    from nowcast_parse import lookup
+
     month_label = target_month_label_from_fred_next_month()
 
-    mom_table, yoy_table = fetch_nowcast_tables()
-    mom_rows = table_to_rows(mom_table)
-    yoy_rows = table_to_rows(yoy_table)
+    mom_index, yoy_index = fetch_nowcast_tables(month_label)
 
     # Columns on page are typically "CPI" and "Core CPI"
-    cpi_mom = pick_value(mom_rows, month_label, "CPI")
-    core_mom = pick_value(mom_rows, month_label, "Core CPI")
+    cpi_mom = lookup(mom_index, month_label, "CPI")
+    core_mom = lookup(mom_index, month_label, "Core CPI")
 
-    cpi_yoy = pick_value(yoy_rows, month_label, "CPI")
-    core_yoy = pick_value(yoy_rows, month_label, "Core CPI")
+    cpi_yoy = lookup(yoy_index, month_label, "CPI")
+    core_yoy = lookup(yoy_index, month_label, "Core CPI")
 
     def r2(x):
         return None if x is None else round_half_up(x, 2)
 
-    state["nowcast"] = {
+    nowcast = {
         "target_month_label": month_label,
         "cpi_mom": r2(cpi_mom),
         "core_mom": r2(core_mom),
@@ -171,88 +278,241 @@ def save_nowcast():
         "saved_at_utc": datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%SZ"),
         "source": "Cleveland Fed Inflation Nowcasting",
     }
-    save_state(state)
-    print(f"Saved nowcast for {month_label}: {state['nowcast']}")
-
-# ========= X Posting =========
-def post_to_x(text: str):
-    auth = OAuth1(
-        os.environ["X_CONSUMER_KEY"],
-        os.environ["X_CONSUMER_SECRET"],
-        os.environ["X_ACCESS_TOKEN"],
-        os.environ["X_ACCESS_TOKEN_SECRET"],
-    )
-    r = requests.post("https://api.x.com/2/tweets", json={"text": text}, auth=auth, timeout=30)
-    r.raise_for_status()
+    target_month = datetime.strptime(month_label, "%B %Y").strftime("%Y-%m")
+    with span("store", target_month=target_month), load_state() as state:
+        state.set("nowcast", nowcast)
+        added = nowcast_history.append(target_month, nowcast)
+        # 対象月以外に表にある月（前月の残りなど）も履歴に残す（CPI 列が空なら append が捨てる）
+        others = [m for m in {**mom_index, **yoy_index} if m != month_label]
+        for label in others:
+            try:
+                ym = datetime.strptime(label, "%B %Y").strftime("%Y-%m")
+            except ValueError:
+                continue
+            nowcast_history.append(ym, {
+                "cpi_mom": r2(lookup(mom_index, label, "CPI")),
+                "core_mom": r2(lookup(mom_index, label, "Core CPI")),
+                "cpi_yoy": r2(lookup(yoy_index, label, "CPI")),
+                "core_yoy": r2(lookup(yoy_index, label, "Core CPI")),
+            })
+    print(f"Saved nowcast for {month_label}: {nowcast} (history {'appended' if added else 'unchanged'})")
+
+def release_cutoff(date_str: str, release_at: datetime | None = None) -> datetime:
+    """
+    date_str（YYYY-MM-01）の月の発表前の Nowcast とみなす取得時刻の上限。
+    release_at（発表時刻）が無ければ、観測ストアにその月が最初に入った日（FRED の realtime_start）の 8:30 ET。
+    どちらも無い（まだ発表されていない）なら今。再実行・取り込み直しが後日でも発表後の Nowcast を拾わない。
+    """
+    now = datetime.now(timezone.utc)
+    if release_at is None:
+        first = obs_store.first_vintage(SERIES_CPI, date_str)
+        if first is not None:
+            seen = datetime.fromisoformat(first.replace("Z", "+00:00"))
+            day = seen.astimezone(ET).date() if seen.tzinfo else seen.date()
+            release_at = datetime(day.year, day.month, day.day, 8, 30, tzinfo=ET)
+    return now if release_at is None else min(now, release_at.astimezone(timezone.utc))
+
+def forecast_for(date_str: str, state, release_at: datetime | None = None) -> dict:
+    """
+    date_str（YYYY-MM-01）の月を対象とした発表前最新の Nowcast（release_cutoff より前に取得したもの）。
+    履歴に無ければ state["nowcast"] を、対象月が一致する場合に限って使う。
+    """
+    rec = nowcast_history.latest_before(date_str[:7], cutoff=release_cutoff(date_str, release_at))
+    if rec is not None:
+        return rec
+    fc = state.get("nowcast", {})
+    label = datetime.strptime(date_str, "%Y-%m-%d").strftime("%B %Y")
+    return fc if fc.get("target_month_label") == label else {}
+
+# ========= Chart =========
+def chart_history(months: int | None = None) -> dict:
+    """ストアの CPI / コア CPI の前月比・前年比（charts.LAYOUTS["cpi"] のキー → MonthlySeries）"""
+    from bot_common import charts
+    from bot_common.series import MonthlySeries, derive
+
+    months = months or charts.CHART_MONTHS
+    out = {}
+    for name, series_id in (("cpi", SERIES_CPI), ("core", SERIES_CORE)):
+        d = derive(MonthlySeries.from_pairs(obs_store.latest(series_id, limit=months + 13)))
+        for key in ("mom", "yoy"):
+            out[f"{name}_{key}"] = MonthlySeries(d.series.start, d.arrays[key])
+    return out
 
 # ====== Text builders ======
-def build_text_all(month: str, cpi, core, fc):
-    # 280超えは post_cpi() 側で自動分割
+# 月・予想だけを先に埋めたテンプレート。結果は str.format(cpi=..., core=...)、
+# 前回は整形済みの文字列（改定があれば「旧 → 修正 新」）を prev={"cpi_mom": ...} で差し込む。
+def _block(title: str, series: str, key: str, fc):
+    return [
+        title,
+        f"結果：{{{series}[{key}]:.2f}}%",
+        f"予想：{fmt_pct(fc.get(f'{series}_{key}'))}",
+        f"前回：{{prev[{series}_{key}]}}",
+    ]
+
+def build_template_mom(month: str, fc):
     lines = [
         f"🇺🇸消費者物価指数（CPI）（{month}）",
-        "🟢CPI（前月比）",
-        f"結果：{cpi['mom']:.2f}%",
-        f"予想：{fmt_pct(fc.get('cpi_mom'))}",
-        f"前回：{cpi['mom_prev']:.2f}%",
-        "",
-        "🟢コアCPI（前月比）",
-        f"結果：{core['mom']:.2f}%",
-        f"予想：{fmt_pct(fc.get('core_mom'))}",
-        f"前回：{core['mom_prev']:.2f}%",
+        *_block("🟢CPI（前月比）", "cpi", "mom", fc),
         "",
-        "🟡CPI（前年比）",
-        f"結果：{cpi['yoy']:.2f}%",
-        f"予想：{fmt_pct(fc.get('cpi_yoy'))}",
-        f"前回：{cpi['yoy_prev']:.2f}%",
-        "",
-        "🟡コアCPI（前年比）",
-        f"結果：{core['yoy']:.2f}%",
-        f"予想：{fmt_pct(fc.get('core_yoy'))}",
-        f"前回：{core['yoy_prev']:.2f}%",
+        *_block("🟢コアCPI（前月比）", "core", "mom", fc),
     ]
     return "\n".join(lines).strip()
 
-def build_text_mom(month: str, cpi, core, fc):
+def build_template_yoy(month: str, fc):
     lines = [
         f"🇺🇸消費者物価指数（CPI）（{month}）",
-        "🟢CPI（前月比）",
-        f"結果：{cpi['mom']:.2f}%",
-        f"予想：{fmt_pct(fc.get('cpi_mom'))}",
-        f"前回：{cpi['mom_prev']:.2f}%",
+        *_block("🟡CPI（前年比）", "cpi", "yoy", fc),
         "",
-        "🟢コアCPI（前月比）",
-        f"結果：{core['mom']:.2f}%",
-        f"予想：{fmt_pct(fc.get('core_mom'))}",
-        f"前回：{core['mom_prev']:.2f}%",
+        *_block("🟡コアCPI（前年比）", "core", "yoy", fc),
     ]
     return "\n".join(lines).strip()
 
-def build_text_yoy(month: str, cpi, core, fc):
+def build_template_all(month: str, fc):
+    # 280（重み付き）超えは render_texts() で自動分割
     lines = [
         f"🇺🇸消費者物価指数（CPI）（{month}）",
-        "🟡CPI（前年比）",
-        f"結果：{cpi['yoy']:.2f}%",
-        f"予想：{fmt_pct(fc.get('cpi_yoy'))}",
-        f"前回：{cpi['yoy_prev']:.2f}%",
+        *_block("🟢CPI（前月比）", "cpi", "mom", fc),
+        "",
+        *_block("🟢コアCPI（前月比）", "core", "mom", fc),
         "",
-        "🟡コアCPI（前年比）",
-        f"結果：{core['yoy']:.2f}%",
-        f"予想：{fmt_pct(fc.get('core_yoy'))}",
-        f"前回：{core['yoy_prev']:.2f}%",
+        *_block("🟡CPI（前年比）", "cpi", "yoy", fc),
+        "",
+        *_block("🟡コアCPI（前年比）", "core", "yoy", fc),
     ]
     return "\n".join(lines).strip()
 
+def build_templates(month: str, fc) -> dict:
+    return {
+        "ALL": build_template_all(month, fc),
+        "MOM": build_template_mom(month, fc),
+        "YOY": build_template_yoy(month, fc),
+    }
+
+def _prev_texts(cpi, core, revised: dict | None) -> dict:
+    """テンプレートの {prev[...]}。revised: {"cpi_mom" など: (前回投稿した値, 改定後の値)}"""
+    out = {}
+    for name, d in (("cpi", cpi), ("core", core)):
+        for key in ("mom", "yoy"):
+            field = f"{name}_{key}"
+            if revised and field in revised:
+                old, new = revised[field]
+                out[field] = f"{old:.2f}% → 修正 {new:.2f}%"
+            else:
+                out[field] = f"{d[f'{key}_prev']:.2f}%"
+    return out
+
+def render_texts(post_type: str, templates: dict, cpi, core, revised: dict | None = None) -> list[str]:
+    """投稿する本文のリスト。ALL が長すぎる場合は MOM / YOY の2本に分ける。"""
+    from bot_common import x_client
+
+    with span("compose", phase="fill", post_type=post_type):
+        prev = _prev_texts(cpi, core, revised)
+        if post_type in ("MOM", "YOY"):
+            return [templates[post_type].format(cpi=cpi, core=core, prev=prev)]
+
+        text_all = templates["ALL"].format(cpi=cpi, core=core, prev=prev)
+        # X の重み付き文字数（日本語・絵文字は2）で 280 を超えるなら分割
+        if x_client.weighted_len(text_all) > x_client.MAX_WEIGHT:
+            return [templates["MOM"].format(cpi=cpi, core=core, prev=prev),
+                    templates["YOY"].format(cpi=cpi, core=core, prev=prev)]
+        return [text_all]
+
+def build_text_all(month: str, cpi, core, fc, revised: dict | None = None):
+    return build_template_all(month, fc).format(cpi=cpi, core=core, prev=_prev_texts(cpi, core, revised))
+
+def build_text_mom(month: str, cpi, core, fc, revised: dict | None = None):
+    return build_template_mom(month, fc).format(cpi=cpi, core=core, prev=_prev_texts(cpi, core, revised))
+
+def build_text_yoy(month: str, cpi, core, fc, revised: dict | None = None):
+    return build_template_yoy(month, fc).format(cpi=cpi, core=core, prev=_prev_texts(cpi, core, revised))
+
+# 予想比の1行で見せる項目（サプライズ指数は常に全項目から）
+SURPRISE_KEYS = {"MOM": ("cpi_mom", "core_mom"), "YOY": ("cpi_yoy", "core_yoy"), "ALL": None}
+
 # ========= Main post logic =========
-def post_cpi():
-    state = load_state()
+def _post_once(state, key: str, force: bool, texts: list[str], channels, chart=None) -> bool:
+    """
+    全チャネルに並列に投稿する。チャネルごとに key を claim し、既に投稿済みのチャネルは飛ばす。
+    全チャネル投稿済みなら（force でない限り）False。失敗したチャネルは claim を取り消して
+    再実行で送り直せるようにする（X が失敗したら他のチャネルを待ってから例外）。
+    """
+    from bot_common import publish
+
+    with span("state.claim", key=key) as s:
+        todo = publish.pending(state, key, channels)
+        s["pending"] = ",".join(c.name for c in todo)
+    if not todo and not force:
+        return False
+    res = publish.publish(texts, channels, state=state, key=key, force=force, chart=chart)
+    # 確認と claim の間に別の実行が全チャネルを取っていたら投稿していない
+    return any(r["status"] != "skipped" for r in res.values())
+
+def _report_release_ms(t_release: float, render_ms: float, warm_ms: float, hit: bool):
+    critical_ms = (time.perf_counter() - t_release) * 1000.0
+    saved = render_ms + warm_ms if hit else warm_ms
+    print(f"[cpi] fill+post {critical_ms:.1f}ms (saved ~{saved:.1f}ms vs cold compose+connect; template hit={hit})")
+
+def post_cpi(release_at: str | None = None):
+    """release_at（ISO 8601）が無ければ RELEASE_AT 環境変数を使う。どちらも空なら1回だけ取得する。"""
+    with load_state() as state:
+        _post_cpi(state, release_at)
+
+def _post_cpi(state: StateStore, release_at: str | None):
     post_type = os.environ.get("POST_TYPE", "ALL").strip().upper()
     force = os.environ.get("FORCE_POST", "0") == "1"
+    # 投稿とチャートは post_cpi だけ（save_nowcast の起動では読み込まない）。いずれも発表前
+    with span("import", phase="post"):
+        from bot_common import charts, publish
+
+    # Arm: 想定月（ストア最新月の翌月）のテンプレートと X 接続を取得前に用意
+    # 予想は Nowcast 履歴から対象月の発表前最新値を引く（発表後に空欄になる問題の回避）
+    t0 = time.perf_counter()
+    last = obs_store.last_date(SERIES_CPI)
+    expected = _month_shift(last, 1) if last else None
+    release_at = release_at or os.environ.get("RELEASE_AT", "").strip()
+    release_dt = release_time(release_at) if release_at else None
+    with span("compose", phase="template", month=expected):
+        fc = forecast_for(expected, state, release_dt) if expected else {}
+        templates = build_templates(month_jp_from_fred_date(expected), fc) if expected else None
+    render_ms = (time.perf_counter() - t0) * 1000.0
+    channels = publish.configured()
+    warm_ms = publish.arm(channels)  # 投稿先の認証と接続の温め（並列）
+    # 計算に使う numpy も取得前に読み込んでおく（初回 import を発表後に払わない）
+    with span("import", module="bot_common.series"):
+        importlib.import_module("bot_common.series")
+    # 予想比（サプライズ）の履歴も読んでおき、発表時は1行足した統計を出すだけにする
+    with span("surprise.load"):
+        from bot_common import surprise
+
+        surprise_hist = surprise.History.load("cpi")
+    # 前回投稿した数値（改定の検出用）
+    with span("revisions.load"):
+        from bot_common import revisions
+
+        vintages = revisions.Vintages.load("cpi")
+    # チャートの土台（前月までの履歴）は描画スレッドで先に描いておく（matplotlib が無ければ無し）
+    chart_base = None
+    if expected and charts.available():
+        chart_base = charts.prepare_async("cpi", chart_history(), expected[:7], fc)  # ストアが古ければ None
+    print(f"[cpi] armed for {expected}: template {render_ms:.1f}ms + warm-up of {len(channels)} channel(s) {warm_ms:.1f}ms moved off the critical path")
+
+    # CPI / Core CPI を FRED と BLS から並列取得し、先に新しい月を返した方を採用
+    # RELEASE_AT が指定されていれば、発表直前から想定月が出るまでポーリングする
+    if release_dt and expected:
+        source, cpi_obs, core_obs = poll_release(
+            lambda: race_cpi(expected),
+            lambda res: min(res[1][0][0], res[2][0][0]) >= expected,
+            release_at=release_dt,
+            name="cpi",
+            budget={"fred": 2, "bls": 1},  # 1回のレースで FRED 2系列 + BLS 1バッチ
+        )
+    else:
+        source, cpi_obs, core_obs = race_cpi(expected)
 
-    cpi_obs = fred_observations(SERIES_CPI, limit=36)
-    core_obs = fred_observations(SERIES_CORE, limit=36)
-
-    d0, cpi_mom, cpi_mom_prev, cpi_yoy, cpi_yoy_prev = compute_mom_yoy(cpi_obs)
-    _,  core_mom, core_mom_prev, core_yoy, core_yoy_prev = compute_mom_yoy(core_obs)
+    with span("compute", source=source):
+        d0, cpi_mom, cpi_mom_prev, cpi_yoy, cpi_yoy_prev = compute_mom_yoy(cpi_obs)
+        _,  core_mom, core_mom_prev, core_yoy, core_yoy_prev = compute_mom_yoy(core_obs)
+    print(f"[cpi] latest={d0} (source={source})")
 
     # 二重投稿防止（ALLのときだけ、FRED更新が無ければスキップ）
     last_posted_date = state.get("fred_cpi_last_date")
@@ -260,77 +520,114 @@ def post_cpi():
         print("No new CPI release detected (same latest date); skipping.")
         return
 
+    t_release = time.perf_counter()
     month = month_jp_from_fred_date(d0)
-
-    # 保存済みNowcast（発表後に空欄になる問題の回避）
-    fc = state.get("nowcast", {})
+    # 発表時刻の分からない実行（再実行・取り込み直し）は、ストアに入った発表日で予想を引き直す
+    if d0 != expected or release_dt is None:
+        with span("compose", phase="template", month=d0):
+            fc = forecast_for(d0, state, release_dt if d0 == expected else None)
+            templates = build_templates(month, fc)
+
+    # 最後の点を描き足す（本文の組み立て・claim と並行）。土台が想定月のものなので、違う月が出たら待たずにチャート無し
+    points = {"cpi_mom": cpi_mom, "core_mom": core_mom, "cpi_yoy": cpi_yoy, "core_yoy": core_yoy}
+    chart = None
+    if chart_base is not None and d0 == expected:
+        chart = charts.finish_async(chart_base, d0[:7], points)
 
     cpi = {"mom": cpi_mom, "mom_prev": cpi_mom_prev, "yoy": cpi_yoy, "yoy_prev": cpi_yoy_prev}
     core = {"mom": core_mom, "mom_prev": core_mom_prev, "yoy": core_yoy, "yoy_prev": core_yoy_prev}
-
-    posted_keys = state.get("posted_keys", [])
+    with span("surprise", month=d0):
+        note = surprise.line(surprise_hist, d0[:7], fc, points, SURPRISE_KEYS.get(post_type))
+    # 前回の値が前の投稿から改定されていれば「旧 → 修正 新」で出す
+    prev_month = _month_shift(d0, -1)[:7]
+    with span("revisions.diff", month=d0):
+        prev_points = {"cpi_mom": cpi_mom_prev, "core_mom": core_mom_prev, "cpi_yoy": cpi_yoy_prev,
+                       "core_yoy": core_yoy_prev}
+        snap = vintages.snapshot(d0[:7], {prev_month: prev_points, d0[:7]: points})
+        revs = vintages.diff(d0[:7], snap)
+        revised = revisions.by_field(revs, prev_month)
+    revisions.log("cpi", revs)
+    release = _export_fields(cpi_obs, core_obs, cpi, core, fc, revised)
 
     if post_type == "MOM":
-        key = f"CPI_MOM_{d0}"
-        if (not force) and key in posted_keys:
+        texts = surprise.attach(render_texts("MOM", templates, cpi, core, revised), note)
+        if not _post_once(state, f"CPI_MOM_{d0}", force, texts, channels, chart):
             print("Already posted MOM; skipping.")
             return
-
-        text = build_text_mom(month, cpi, core, fc)
-        post_to_x(text)
-
-        state.setdefault("posted_keys", []).append(key)
-        save_state(state)
+        _report_release_ms(t_release, render_ms, warm_ms, d0 == expected)
+        _record_release(surprise_hist, vintages, d0, fc, points, snap, release, source)
         print("Posted CPI MOM successfully.")
         return
 
     if post_type == "YOY":
-        key = f"CPI_YOY_{d0}"
-        if (not force) and key in posted_keys:
+        texts = surprise.attach(render_texts("YOY", templates, cpi, core, revised), note)
+        if not _post_once(state, f"CPI_YOY_{d0}", force, texts, channels, chart):
             print("Already posted YOY; skipping.")
             return
-
-        text = build_text_yoy(month, cpi, core, fc)
-        post_to_x(text)
-
-        state.setdefault("posted_keys", []).append(key)
-        save_state(state)
+        _report_release_ms(t_release, render_ms, warm_ms, d0 == expected)
+        _record_release(surprise_hist, vintages, d0, fc, points, snap, release, source)
         print("Posted CPI YOY successfully.")
         return
 
     # ALL
-    key = f"CPI_ALL_{d0}"
-    if (not force) and key in posted_keys:
+    texts = surprise.attach(render_texts("ALL", templates, cpi, core, revised), note)
+    if not _post_once(state, f"CPI_ALL_{d0}", force, texts, channels, chart):
         print("Already posted ALL; skipping.")
         return
+    _report_release_ms(t_release, render_ms, warm_ms, d0 == expected)
+    _record_release(surprise_hist, vintages, d0, fc, points, snap, release, source)
 
-    text_all = build_text_all(month, cpi, core, fc)
-
-    # 280字超え対策（安全に分割）
-    if len(text_all) > 275:
-        text_mom = build_text_mom(month, cpi, core, fc)
-        text_yoy = build_text_yoy(month, cpi, core, fc)
-        post_to_x(text_mom)
-        post_to_x(text_yoy)
-    else:
-        post_to_x(text_all)
-
-    state.setdefault("posted_keys", []).append(key)
-    state["fred_cpi_last_date"] = d0
-    save_state(state)
+    state.set("fred_cpi_last_date", d0)
     print("Posted CPI ALL successfully.")
 
+def _export_fields(cpi_obs, core_obs, cpi, core, fc: dict, revised: dict) -> dict:
+    """export.write() に渡す {field: {value, prev, forecast, revised_prev}}（水準は指数そのもの）"""
+    out = {}
+    for name, obs, d in (("cpi", cpi_obs, cpi), ("core", core_obs, core)):
+        levels = dict(obs[:2])
+        out[f"{name}_level"] = {"value": obs[0][1], "prev": levels.get(_month_shift(obs[0][0], -1))}
+        for key in ("mom", "yoy"):
+            field = f"{name}_{key}"
+            out[field] = {"value": d[key], "prev": d[f"{key}_prev"], "forecast": fc.get(field),
+                          "revised_prev": revised[field][0] if field in revised else None}
+    return out
+
+def _record_release(hist, vintages, d0: str, fc: dict, points: dict, snap, release: dict, source: str):
+    # 投稿後（計測の外）に予想比の履歴・投稿した数値の vintage・書き出し用のデータセットを更新する。
+    # 失敗しても投稿は済んでいるので止めない
+    from bot_common import export, revisions, surprise
+
+    try:
+        with span("surprise.record", month=d0):
+            surprise.record("cpi", d0[:7], fc, points, hist)
+    except Exception as e:
+        print(f"[cpi] surprise cache update failed: {type(e).__name__}: {e}")
+    try:
+        with span("revisions.record", month=d0):
+            revisions.record("cpi", d0[:7], snap, vintages)
+    except Exception as e:
+        print(f"[cpi] revision log update failed: {type(e).__name__}: {e}")
+    try:
+        path = export.write("cpi", d0[:7], release, source)
+        if path:
+            print(f"[cpi] exported {path}")
+    except Exception as e:
+        print(f"[cpi] export failed: {type(e).__name__}: {e}")
+
 def main():
     if len(sys.argv) < 2:
         raise SystemExit("Usage: python cpi_bot.py save_nowcast|post_cpi")
 
     cmd = sys.argv[1].strip().lower()
-    if cmd == "save_nowcast":
-        save_nowcast()
-    elif cmd == "post_cpi":
-        post_cpi()
-    else:
+    if cmd not in ("save_nowcast", "post_cpi"):
         raise SystemExit("Unknown command")
 
+    trace.record("import", _T_IMPORT, command=cmd)
+    with trace.run(f"cpi.{cmd}"):
+        if cmd == "save_nowcast":
+            save_nowcast()
+        else:
+            post_cpi()
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,236 @@
+# cpi_fred_nowcast/nowcast_feed.py
+#
+# Cleveland Fed Nowcast の取得。ページの裏にある JSON フィード（月次・四半期）を優先し、
+# 使えないとき（URL 未設定・取得失敗・形が変わって対象月が取れない）だけ HTML のテーブルを読む。
+# - 結果は {"mom" | "yoy" | "quarter": {行ラベル: {列名: 値文字列}}}（nowcast_parse.index_rows と同じ形）。
+#   全対象月（月次の行と四半期の行）を1回で取る
+# - 取得結果は NOWCAST_CACHE_PATH に保存し、NOWCAST_CACHE_TTL_SEC 以内ならネットワークに出ない。
+#   TTL を過ぎたら ETag / 本文のハッシュで比べ、変わっていなければ parse しない
+# - どの経路（cache / feed / html）を使い、何 ms かかったかを表示し、trace の span にも残す
+#
+#   python cpi_fred_nowcast/nowcast_feed.py [--force] [--html]
+
+import json
+import os
+import re
+import sys
+import time
+from typing import NamedTuple
+
+if __name__ == "__main__":
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bot_common.trace import span
+
+PAGE_URL = os.getenv("NOWCAST_URL", "https://www.clevelandfed.org/indicators-and-data/inflation-nowcasting")
+_FEED_BASE = "https://www.clevelandfed.org/-/media/files/webcharts/inflationnowcasting"
+# 空にするとフィードを使わず HTML だけにする
+FEED_URLS = {
+    "month": os.getenv("NOWCAST_FEED_URL", f"{_FEED_BASE}/nowcast_month.json"),
+    "quarter": os.getenv("NOWCAST_QUARTER_FEED_URL", f"{_FEED_BASE}/nowcast_quarter.json"),
+}
+CACHE_PATH = os.getenv("NOWCAST_CACHE_PATH", "data/nowcast_cache.json")
+CACHE_TTL_SEC = float(os.getenv("NOWCAST_CACHE_TTL_SEC", "900"))
+
+KINDS = ("mom", "yoy", "quarter")
+
+class Result(NamedTuple):
+    tables: dict      # {"mom" | "yoy" | "quarter": {行ラベル: {列名: 値文字列}}}
+    source: str       # cache / feed / html
+    ms: float
+    changed: bool     # 前回の取得結果から中身が変わったか
+
+# ========= Feed =========
+# フィードの系列名 → HTML テーブルの列名
+_COLUMNS = {
+    "cpi inflation": "CPI",
+    "core cpi inflation": "Core CPI",
+    "pce inflation": "PCE",
+    "core pce inflation": "Core PCE",
+}
+_LABEL = re.compile(r"\b(?:January|February|March|April|May|June|July|August|September|October|November|December) \d{4}\b"
+                    r"|\b\d{4}:Q[1-4]\b")
+
+def _kind(text: str, label: str) -> str:
+    t = text.lower()
+    if "year-over-year" in t:
+        return "yoy"
+    if "quarter" in t or ":Q" in label:
+        return "quarter"
+    return "mom"
+
+def parse_feed(body: bytes) -> dict:
+    """
+    フィード（チャートごとの JSON の配列）を表の形にする。1チャート = 1対象月 × 1指標（前月比・前年比・四半期）:
+      {"chart": {"caption": "December 2025", "subcaption": "Month-over-month percent change"},
+       "categories": [{"category": [{"label": "01/09"}, ...]}],
+       "dataset": [{"seriesname": "CPI Inflation", "data": [{"value": "0.25"}, ...]}, ...]}
+    各系列の最後の値をその日の Nowcast とする。"Updated" は最後の日付ラベル。
+    """
+    charts = json.loads(body)
+    if isinstance(charts, dict):
+        charts = charts.get("charts", [charts])
+    out = {k: {} for k in KINDS}
+    for c in charts:
+        meta = c.get("chart") or {}
+        text = f"{meta.get('caption', '')} {meta.get('subcaption', '')}"
+        m = _LABEL.search(text)
+        if m is None:
+            continue
+        label = m.group(0)
+        kind = _kind(text, label)
+        row = {"Quarter" if kind == "quarter" else "Month": label}
+        for ds in c.get("dataset") or []:
+            col = _COLUMNS.get(str(ds.get("seriesname", "")).strip().lower())
+            if col is None:
+                continue  # 実績値などの系列
+            values = [str(d.get("value", "")).strip() for d in ds.get("data") or []]
+            values = [v for v in values if v]
+            row[col] = values[-1] if values else ""
+        cats = [x.get("label", "") for cat in c.get("categories") or [] for x in cat.get("category") or []]
+        if cats:
+            row["Updated"] = cats[-1]
+        if len(row) > 1:
+            out[kind].setdefault(label, row)
+    return out
+
+# ========= HTML =========
+_HEADING = re.compile(r"(month|year|quarter)-over-(?:month|year|quarter)", re.IGNORECASE)
+_TABLE_START = re.compile(r"<table\b", re.IGNORECASE)
+
+def parse_html(html: str) -> dict:
+    """
+    ページの最初の3つのテーブル。各テーブルの直前の見出し（month-over-month など）で種類を決め、
+    見出しが見つからないときだけ並び順（前月比・前年比・四半期）に頼る。
+    """
+    from nowcast_parse import index_rows, parse_tables
+
+    tables = parse_tables(html, max_tables=3)
+    starts = [m.start() for m in _TABLE_START.finditer(html)][:len(tables)]
+    out = {k: {} for k in KINDS}
+    prev = 0
+    for i, (rows, start) in enumerate(zip(tables, starts)):
+        headings = _HEADING.findall(html, prev, start)
+        prev = start
+        if headings:
+            kind = {"month": "mom", "year": "yoy", "quarter": "quarter"}[headings[-1].lower()]
+        elif rows and rows[0] and rows[0][0].strip() == "Quarter":
+            kind = "quarter"
+        else:
+            kind = KINDS[min(i, 2)]
+        if not out[kind]:
+            out[kind] = index_rows(rows)
+    return out
+
+# ========= Fetch =========
+def _covers(tables: dict | None, required: str | None) -> bool:
+    """前月比・前年比の表があり、required（"December 2025" など）の行が両方にあるか"""
+    if not tables or not tables.get("mom") or not tables.get("yoy"):
+        return False
+    return required is None or (required in tables["mom"] and required in tables["yoy"])
+
+def _load_cache(path: str) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def _save_cache(path: str, cache: dict):
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(cache, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+def _merge(parts: list[dict]) -> dict:
+    tables = {k: {} for k in KINDS}
+    for part in parts:
+        for kind, rows in part.items():
+            for label, row in rows.items():
+                tables[kind].setdefault(label, row)
+    return tables
+
+def _fetch_parts(urls: list[str], parse, cache: dict, timeout: float) -> tuple[dict, dict, bool]:
+    """
+    urls を並列に条件付き取得し（http_client.fetch_if_changed）、変わったものだけ parse する。
+    変わっていないものはキャッシュにある URL ごとの parse 結果を使う。
+    returns: (tables, {url: 検証子・parse 結果}, changed)
+    """
+    from bot_common.http_client import fetch_if_changed, gather, validators
+
+    def _get(url: str):
+        p = cache.get("parts", {}).get(url, {})
+        seed = {"etag": p.get("etag"), "last_modified": p.get("last_modified"), "hash": p.get("hash"),
+                "parsed": p["tables"]} if "tables" in p else None
+        return fetch_if_changed("GET", url, lambda r: parse(r.content), upstream="nowcast", seed=seed, timeout=timeout)
+
+    got = gather(*(lambda u=u: _get(u) for u in urls))
+    parts = {url: {**validators("GET", url), "tables": tables} for url, (_, tables) in zip(urls, got)}
+    return _merge([parts[u]["tables"] for u in urls]), parts, any(changed for changed, _ in got)
+
+def _from_feed(cache: dict, timeout: float) -> tuple[dict, dict, bool]:
+    return _fetch_parts([u for u in FEED_URLS.values() if u], parse_feed, cache, timeout)
+
+def _from_html(cache: dict, timeout: float) -> tuple[dict, dict, bool]:
+    return _fetch_parts([PAGE_URL], lambda body: parse_html(body.decode("utf-8", errors="replace")), cache, timeout)
+
+def fetch(required: str | None = None, max_age: float = CACHE_TTL_SEC, path: str = CACHE_PATH,
+          html: bool = False, timeout: float = 30) -> Result:
+    """
+    Nowcast の表。required（"December 2025" など）の行が無い結果はキャッシュでもフィードでも使わない。
+    html=True（か NOWCAST_FEED_URL が空）ならフィードを飛ばして HTML を読む。フィードも HTML も駄目なら例外。
+    """
+    t0 = time.perf_counter()
+    cache = _load_cache(path)
+    with span("nowcast.fetch", required=required) as s:
+        age = time.time() - cache.get("fetched_at", 0)
+        if age < max_age and _covers(cache.get("tables"), required):
+            s["source"] = "cache"
+            return _report(Result(cache["tables"], "cache", (time.perf_counter() - t0) * 1000.0, False), age)
+
+        tables, parts = None, {}
+        if not html and FEED_URLS["month"]:
+            try:
+                tables, parts, changed = _from_feed(cache, timeout)
+                source = "feed"
+                if not _covers(tables, required):
+                    print(f"[nowcast] feed has no rows for {required or 'any month'}; falling back to HTML")
+                    tables = None
+            except Exception as e:
+                print(f"[nowcast] feed failed ({type(e).__name__}: {e}); falling back to HTML")
+        if tables is None:
+            # フィードを取れていたらその検証子も残す（次回も条件付きで取りに行ける）
+            tables, html_parts, changed = _from_html(cache, timeout)
+            parts = {**parts, **html_parts}
+            source = "html"
+            if not tables.get("mom") or not tables.get("yoy"):
+                raise RuntimeError("Nowcast tables not found (page structure changed?)")
+        s["source"] = source
+        s["changed"] = changed
+
+    _save_cache(path, {"fetched_at": time.time(), "source": source, "tables": tables,
+                       "parts": {**cache.get("parts", {}), **parts}})
+    return _report(Result(tables, source, (time.perf_counter() - t0) * 1000.0, changed))
+
+def _report(res: Result, age: float | None = None) -> Result:
+    rows = sum(len(res.tables.get(k, {})) for k in KINDS)
+    detail = f"age {age:.0f}s" if age is not None else ("changed" if res.changed else "unchanged")
+    print(f"[nowcast] {res.source} {res.ms:.0f}ms ({rows} rows, {detail})")
+    return res
+
+def main():
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Fetch the Cleveland Fed inflation nowcast (feed first, HTML fallback).")
+    ap.add_argument("--force", action="store_true", help="ignore the cache TTL")
+    ap.add_argument("--html", action="store_true", help="skip the feed")
+    args = ap.parse_args()
+    res = fetch(max_age=0 if args.force else CACHE_TTL_SEC, html=args.html)
+    for kind in KINDS:
+        for label, row in res.tables.get(kind, {}).items():
+            print(f"{kind:<8} {label:<14} " + "  ".join(f"{k}={v}" for k, v in row.items()))
+
+if __name__ == "__main__":
+    main()
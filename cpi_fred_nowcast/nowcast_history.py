@@ -0,0 +1,76 @@
+# cpi_fred_nowcast/nowcast_history.py
+#
+# Nowcast の追記専用アーカイブ。1レコード = (対象月, 取得時刻)。
+# 前回と同じ値なら追記しないので、毎日スクレイプしても発表1回あたり数行にしかならない。
+# (target_month, scraped_at) の主キー索引で「対象月の発表前最新値」を1回のシークで引く。
+
+import os
+import sqlite3
+from datetime import datetime, timezone
+
+DB_PATH = os.getenv("NOWCAST_HISTORY_PATH", "cpi_fred_nowcast/nowcast_history.sqlite3")
+
+FIELDS = ("cpi_mom", "core_mom", "cpi_yoy", "core_yoy")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS nowcast (
+    target_month TEXT NOT NULL,  -- YYYY-MM
+    scraped_at   TEXT NOT NULL,  -- YYYY-MM-DDTHH:MM:SSZ
+    cpi_mom  REAL,
+    core_mom REAL,
+    cpi_yoy  REAL,
+    core_yoy REAL,
+    PRIMARY KEY (target_month, scraped_at)
+) WITHOUT ROWID;
+"""
+
+_conns: dict[str, sqlite3.Connection] = {}
+
+def connect(path: str = DB_PATH) -> sqlite3.Connection:
+    conn = _conns.get(path)
+    if conn is None:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        conn = sqlite3.connect(path)
+        conn.executescript(SCHEMA)
+        _conns[path] = conn
+    return conn
+
+def _utc(dt: datetime) -> str:
+    return dt.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+def latest_before(target_month: str, cutoff: datetime | None = None, path: str = DB_PATH) -> dict | None:
+    """target_month（YYYY-MM）について cutoff 以前に取得した最新の値。無ければ None。"""
+    cutoff_s = _utc(cutoff or datetime.now(timezone.utc))
+    row = connect(path).execute(
+        f"""
+        SELECT scraped_at, {", ".join(FIELDS)} FROM nowcast
+        WHERE target_month = ? AND scraped_at <= ?
+        ORDER BY scraped_at DESC LIMIT 1
+        """,
+        (target_month, cutoff_s),
+    ).fetchone()
+    if row is None:
+        return None
+    out = {"target_month": target_month, "scraped_at": row[0]}
+    out.update(zip(FIELDS, row[1:]))
+    return out
+
+def append(target_month: str, values: dict, scraped_at: datetime | None = None, path: str = DB_PATH) -> bool:
+    """
+    値が全部空（発表後にページから消えた等）か、直前のレコードと同じなら追記しない。
+    追記したら True。
+    """
+    vals = tuple(values.get(k) for k in FIELDS)
+    if all(v is None for v in vals):
+        return False
+    prev = latest_before(target_month, path=path)
+    if prev is not None and tuple(prev[k] for k in FIELDS) == vals:
+        return False
+    conn = connect(path)
+    with conn:
+        conn.execute(
+            f"INSERT OR REPLACE INTO nowcast (target_month, scraped_at, {', '.join(FIELDS)}) VALUES (?, ?, ?, ?, ?, ?)",
+            (target_month, _utc(scraped_at or datetime.now(timezone.utc)), *vals),
+        )
+    return True
@@ -0,0 +1,118 @@
+# cpi_fred_nowcast/nowcast_parse.py
+#
+# Cleveland Fed Nowcast ページから <table> だけを抜き出す軽量パーサー。
+# ページ全体の DOM は作らず、必要なテーブル数が揃った時点でパースを打ち切る。
+
+import re
+from html.parser import HTMLParser
+
+CHUNK = 64 * 1024
+
+_TABLE_START = re.compile(r"<table\b", re.IGNORECASE)
+
+class _Done(Exception):
+    pass
+
+class _TableExtractor(HTMLParser):
+    def __init__(self, max_tables: int):
+        super().__init__(convert_charrefs=True)
+        self.max_tables = max_tables
+        self.tables: list[list[list[str]]] = []
+        self._depth = 0
+        self._rows = None
+        self._row = None
+        self._cell = None
+
+    def _close_cell(self):
+        if self._cell is not None and self._row is not None:
+            self._row.append(" ".join(self._cell))
+        self._cell = None
+
+    def _close_row(self):
+        self._close_cell()
+        if self._row:
+            self._rows.append(self._row)
+        self._row = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "table":
+            self._depth += 1
+            if self._depth == 1:
+                self._rows = []
+            return
+        if self._rows is None:
+            return
+        if tag == "tr":
+            self._close_row()
+            self._row = []
+        elif tag in ("td", "th"):
+            self._close_cell()
+            if self._row is None:
+                self._row = []
+            self._cell = []
+
+    def handle_endtag(self, tag):
+        if self._rows is None:
+            return
+        if tag in ("td", "th"):
+            self._close_cell()
+        elif tag == "tr":
+            self._close_row()
+        elif tag == "table":
+            self._depth -= 1
+            if self._depth == 0:
+                self._close_row()
+                self.tables.append(self._rows)
+                self._rows = None
+                if len(self.tables) >= self.max_tables:
+                    raise _Done()
+
+    def handle_data(self, data):
+        if self._cell is not None:
+            t = data.strip()
+            if t:
+                self._cell.append(t)
+
+def parse_tables(html: str, max_tables: int = 2) -> list[list[list[str]]]:
+    """
+    先頭から max_tables 個のテーブルを [[cell, ...], ...] の行リストで返す。
+    セル文字列は bs4 の get_text(" ", strip=True) と同じ形。
+    """
+    # 最初の <table> より前（head / nav など）はトークナイズしない
+    m = _TABLE_START.search(html)
+    if m is None:
+        return []
+    p = _TableExtractor(max_tables)
+    try:
+        for i in range(m.start(), len(html), CHUNK):
+            p.feed(html[i:i + CHUNK])
+        p.close()
+    except _Done:
+        pass
+    return p.tables
+
+def index_rows(rows: list[list[str]]) -> dict[str, dict[str, str]]:
+    """
+    {行ラベル: {列名: 生の文字列}}。1行目をヘッダーとみなす。
+    ラベル・列名が重複した場合は最初のものを使う（旧 pick_value と同じ）。
+    """
+    if not rows:
+        return {}
+    cols = {}
+    for i, col in enumerate(rows[0]):
+        cols.setdefault(col, i)
+    out = {}
+    for r in rows[1:]:
+        if not r or r[0].strip() in out:
+            continue
+        out[r[0].strip()] = {col: r[i] for col, i in cols.items() if i < len(r)}
+    return out
+
+def lookup(index: dict[str, dict[str, str]], label: str, col: str):
+    raw = (index.get(label, {}).get(col) or "").strip()
+    if raw == "":
+        return None
+    try:
+        return float(raw)
+    except ValueError:
+        return None
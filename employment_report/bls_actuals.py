@@ -1,46 +1,32 @@
-import os
-import requests
-
-BLS_URL = "https://api.bls.gov/publicAPI/v2/timeseries/data/"
-BLS_API_KEY = os.getenv("BLS_API_KEY", "")
-
-SERIES_NFP_LEVEL = "CES0000000001"   # Total nonfarm employment (thousands)
-SERIES_AHE_LEVEL = "CES0500000003"   # Average hourly earnings (dollars)
-SERIES_UR = "LNS14000000"            # Unemployment rate (%)
-
-def _fetch_bls(series_ids: list[str], start_year: int, end_year: int) -> dict:
-    payload = {
-        "seriesid": series_ids,
-        "startyear": str(start_year),
-        "endyear": str(end_year),
-    }
-    if BLS_API_KEY:
-        payload["registrationkey"] = BLS_API_KEY
-
-    r = requests.post(BLS_URL, json=payload, timeout=25)
-    r.raise_for_status()
-    data = r.json()
-    if data.get("status") != "REQUEST_SUCCEEDED":
-        raise RuntimeError(f"BLS API error: {data}")
-    return data
-
-def _to_map(series_json: dict) -> dict[str, dict[str, float]]:
-    out = {}
-    for s in series_json["Results"]["series"]:
-        sid = s["seriesID"]
-        m = {}
-        for item in s.get("data", []):
-            period = item.get("period", "")
-            if not period.startswith("M"):
-                continue
-            month = int(period[1:])
-            ym = f"{int(item['year']):04d}-{month:02d}"
-            try:
-                m[ym] = float(item["value"])
-            except Exception:
-                continue
-        out[sid] = m
-    return out
+from bot_common import bls_series, obs_store
+from bot_common.series import MonthlySeries, derive
+from bot_common.trace import span
+from bot_common.bls_api import fetch_bls_batch as _fetch_bls_batch
+
+SERIES_NFP_LEVEL = bls_series.sid("nfp")   # Total nonfarm employment (thousands)
+SERIES_AHE_LEVEL = bls_series.sid("ahe")   # Average hourly earnings (dollars)
+SERIES_UR = bls_series.sid("ur")           # Unemployment rate (%)
+
+def _sync_bls(series_ids: list[str], ym: str, timeout: float = 25):
+    """
+    ストアを BLS と差分同期する。前年分が揃っていれば当年だけを取得。
+    1〜2月分の発表では前年11〜12月が改定されるので前年も取り直す。
+    """
+    y, month = (int(x) for x in ym.split("-"))
+    prev_dec = f"{y-1:04d}-12-01"
+    have_prev = all((obs_store.last_date(sid) or "") >= prev_dec for sid in series_ids)
+    start_year = y if have_prev and month >= 3 else y - 1
+
+    changed, maps = _fetch_bls_batch(series_ids, start_year=start_year, end_year=y, timeout=timeout)
+    if not changed:
+        return
+    vintage = obs_store.utc_now()
+    for sid, m in maps.items():
+        rows = sorted((f"{k}-01", vintage, v) for k, v in m.items())
+        obs_store.record(sid, rows, synced_at=vintage)
+
+def _load_map(series_ids: list[str]) -> dict[str, dict[str, float]]:
+    return {sid: {d[:7]: v for d, v in obs_store.latest(sid)} for sid in series_ids}
 
 def _ym_prev(ym: str) -> str:
     y, m = ym.split("-")
@@ -49,75 +35,56 @@ def _ym_prev(ym: str) -> str:
         return f"{y-1:04d}-12"
     return f"{y:04d}-{m-1:02d}"
 
-def _ym_prev2(ym: str) -> str:
-    return _ym_prev(_ym_prev(ym))
+def get_actuals(ym: str, timeout: float = 25) -> dict:
+    # 雇用統計の全系列を1回の POST で同期し、投稿に使う3系列だけを読み出す
+    _sync_bls(bls_series.series_for("employment"), ym, timeout=timeout)
+    with span("compute", ym=ym):
+        return actuals_from_map(_load_map([SERIES_NFP_LEVEL, SERIES_AHE_LEVEL, SERIES_UR]), ym)
 
-def _ym_yoy(ym: str) -> str:
-    y, m = ym.split("-")
-    return f"{int(y)-1:04d}-{int(m):02d}"
+def chart_history() -> dict:
+    """ストアから charts.LAYOUTS["employment"] の履歴（NFP 前月差[万人]・失業率・平均時給の前年比）"""
+    m = _load_map([SERIES_NFP_LEVEL, SERIES_AHE_LEVEL, SERIES_UR])
+    nfp, ahe, ur = (derive(MonthlySeries.from_map(m[sid])) for sid in (SERIES_NFP_LEVEL, SERIES_AHE_LEVEL, SERIES_UR))
+    return {
+        "nfp": MonthlySeries(nfp.series.start, nfp.arrays["diff"] / 10.0),
+        "ur": ur.series,
+        "ahe_yoy": MonthlySeries(ahe.series.start, ahe.arrays["yoy"]),
+    }
 
-def _pct_change(cur: float | None, prev: float | None) -> float | None:
-    if cur is None or prev is None or prev == 0:
-        return None
-    return (cur / prev - 1.0) * 100.0
+def actuals_from_archive(ym: str, archive=None) -> dict:
+    """bls_bulk のアーカイブ（API を使わない過去分）から get_actuals と同じ形で組み立てる"""
+    from bot_common import bls_bulk
 
-def get_actuals(ym: str) -> dict:
-    y = int(ym.split("-")[0])
-    start_year = y - 1
-    end_year = y
+    arc = archive if archive is not None else bls_bulk.load()
+    start = _ym_prev(f"{int(ym[:4]) - 1:04d}-{ym[5:7]}")  # 前回値の前年比まで届く13か月前
+    nfp, ahe, ur = (arc.series(sid, start, ym) for sid in (SERIES_NFP_LEVEL, SERIES_AHE_LEVEL, SERIES_UR))
+    return actuals_from_series(nfp, ahe, ur, ym)
 
-    raw = _fetch_bls(
-        [SERIES_NFP_LEVEL, SERIES_AHE_LEVEL, SERIES_UR],
-        start_year=start_year,
-        end_year=end_year,
+def actuals_from_map(m: dict[str, dict[str, float]], ym: str) -> dict:
+    """{seriesID: {"YYYY-MM": value}} から ym の実績・前回値を組み立てる"""
+    return actuals_from_series(
+        *(MonthlySeries.from_map(m.get(sid, {})) for sid in (SERIES_NFP_LEVEL, SERIES_AHE_LEVEL, SERIES_UR)), ym
     )
-    m = _to_map(raw)
 
+def actuals_from_series(nfp: MonthlySeries, ahe: MonthlySeries, ur: MonthlySeries, ym: str) -> dict:
+    nfp, ahe, ur = derive(nfp), derive(ahe), derive(ur)
     prev = _ym_prev(ym)
-    prev2 = _ym_prev2(ym)
-    yoy = _ym_yoy(ym)
-    yoy_prev = _ym_yoy(prev)
-
-    # NFP：水準(千人) → 差分(千人) → 万人
-    nfp = m.get(SERIES_NFP_LEVEL, {})
-    nfp_cur = nfp.get(ym)
-    nfp_prev = nfp.get(prev)
-    nfp_prev2 = nfp.get(prev2)
-
-    nfp_change_man = None
-    nfp_change_prev_man = None
-    if nfp_cur is not None and nfp_prev is not None:
-        nfp_change_man = (nfp_cur - nfp_prev) / 10.0
-    if nfp_prev is not None and nfp_prev2 is not None:
-        nfp_change_prev_man = (nfp_prev - nfp_prev2) / 10.0
-
-    # AHE：水準($) → MoM% / YoY%
-    ahe = m.get(SERIES_AHE_LEVEL, {})
-    ahe_cur = ahe.get(ym)
-    ahe_prev = ahe.get(prev)
-    ahe_prev2 = ahe.get(prev2)
-    ahe_yoy_base = ahe.get(yoy)
-    ahe_yoy_prev_base = ahe.get(yoy_prev)
-
-    ahe_mom = _pct_change(ahe_cur, ahe_prev)
-    ahe_mom_prev = _pct_change(ahe_prev, ahe_prev2)
-    ahe_yoy = _pct_change(ahe_cur, ahe_yoy_base)
-    ahe_yoy_prev = _pct_change(ahe_prev, ahe_yoy_prev_base)
-
-    # UR：%
-    ur = m.get(SERIES_UR, {})
-    ur_cur = ur.get(ym)
-    ur_prev = ur.get(prev)
 
     def r1(x): return None if x is None else round(x, 1)
+    def man(x): return None if x is None else x / 10.0  # 千人 → 万人
 
     return {
-        "nfp_man_actual": r1(nfp_change_man),
-        "nfp_man_prev": r1(nfp_change_prev_man),
-        "ahe_mom_actual": r1(ahe_mom),
-        "ahe_mom_prev": r1(ahe_mom_prev),
-        "ahe_yoy_actual": r1(ahe_yoy),
-        "ahe_yoy_prev": r1(ahe_yoy_prev),
-        "ur_actual": r1(ur_cur),
-        "ur_prev": r1(ur_prev),
+        "nfp_man_actual": r1(man(nfp.at("diff", ym))),
+        "nfp_man_prev": r1(man(nfp.at("diff", prev))),
+        "ahe_mom_actual": r1(ahe.at("mom", ym)),
+        "ahe_mom_prev": r1(ahe.at("mom", prev)),
+        "ahe_yoy_actual": r1(ahe.at("yoy", ym)),
+        "ahe_yoy_prev": r1(ahe.at("yoy", prev)),
+        "ur_actual": r1(ur.at("level", ym)),
+        "ur_prev": r1(ur.at("level", prev)),
+        # 水準（丸めない。書き出し用）: 雇用者数は千人、平均時給はドル
+        "nfp_level_actual": nfp.at("level", ym),
+        "nfp_level_prev": nfp.at("level", prev),
+        "ahe_level_actual": ahe.at("level", ym),
+        "ahe_level_prev": ahe.at("level", prev),
     }
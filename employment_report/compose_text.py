@@ -4,23 +4,68 @@ def _pct(x):
 def _man(x):
     return "—" if x is None else f"{x:.1f}万人"
 
-def compose(month_label: str, forecast: dict, actual: dict) -> str:
+# 発表時に埋めるフィールド（結果・前回はどちらも発表データから取る）
+_ACTUAL_FIELDS = {
+    "ahe_mom_actual": _pct,
+    "ahe_mom_prev": _pct,
+    "ahe_yoy_actual": _pct,
+    "ahe_yoy_prev": _pct,
+    "nfp_man_actual": _man,
+    "nfp_man_prev": _man,
+    "ur_actual": _pct,
+    "ur_prev": _pct,
+}
+
+def compose_template(month_label: str, forecast: dict) -> str:
+    """発表前に作っておくテンプレート。月・予想は埋め込み済み、実績は {field} のまま。"""
     return (
 f"🇺🇸雇用統計（{month_label}）\n"
 f"🟢平均時給（前月比）\n"
-f"結果：{_pct(actual.get('ahe_mom_actual'))}\n"
+f"結果：{{ahe_mom_actual}}\n"
 f"予想：{_pct(forecast.get('ahe_mom'))}\n"
-f"前回：{_pct(actual.get('ahe_mom_prev'))}\n\n"
+f"前回：{{ahe_mom_prev}}\n\n"
 f"🟢平均時給（前年比）\n"
-f"結果：{_pct(actual.get('ahe_yoy_actual'))}\n"
+f"結果：{{ahe_yoy_actual}}\n"
 f"予想：{_pct(forecast.get('ahe_yoy'))}\n"
-f"前回：{_pct(actual.get('ahe_yoy_prev'))}\n\n"
+f"前回：{{ahe_yoy_prev}}\n\n"
 f"🟢非農業部門雇用者数\n"
-f"結果：{_man(actual.get('nfp_man_actual'))}\n"
+f"結果：{{nfp_man_actual}}\n"
 f"予想：{_man(forecast.get('nfp_man'))}\n"
-f"前回：{_man(actual.get('nfp_man_prev'))}\n\n"
+f"前回：{{nfp_man_prev}}\n\n"
 f"🟢失業率\n"
-f"結果：{_pct(actual.get('ur_actual'))}\n"
+f"結果：{{ur_actual}}\n"
 f"予想：{_pct(forecast.get('unemployment_rate'))}\n"
-f"前回：{_pct(actual.get('ur_prev'))}"
+f"前回：{{ur_prev}}"
     )
+
+def fill(template: str, actual: dict, revised: dict | None = None) -> str:
+    """revised: {"nfp_man" など: (前回投稿した値, 改定後の値)}。該当する「前回」を「旧 → 修正 新」にする。"""
+    values = {k: fmt(actual.get(k)) for k, fmt in _ACTUAL_FIELDS.items()}
+    for field, (old, new) in (revised or {}).items():
+        key = f"{field}_prev"
+        if key in values:
+            fmt = _ACTUAL_FIELDS[key]
+            values[key] = f"{fmt(old)} → 修正 {fmt(new)}"
+    return template.format(**values)
+
+def split(text: str, limit: int | None = None) -> list[str]:
+    """
+    X の重み付き文字数で limit（既定 280）を超えるなら、空行で区切った項目ごとに詰めてスレッドの複数本に分ける。
+    改定（「旧 → 修正 新」）が重なる1月分やマイナスの雇用者数で1本に収まらなくなる。
+    """
+    from bot_common.x_client import MAX_WEIGHT, weighted_len
+
+    limit = limit or MAX_WEIGHT
+    if weighted_len(text) <= limit:
+        return [text]
+    parts: list[str] = []
+    for block in text.split("\n\n"):
+        joined = f"{parts[-1]}\n\n{block}" if parts else block
+        if parts and weighted_len(joined) <= limit:
+            parts[-1] = joined
+        else:
+            parts.append(block)
+    return parts
+
+def compose(month_label: str, forecast: dict, actual: dict, revised: dict | None = None) -> str:
+    return fill(compose_template(month_label, forecast), actual, revised)
@@ -1,8 +1,9 @@
 # employment_report/minkabu_forecast.py
 import json
+import os
 from pathlib import Path
 
-DATA_FILE = Path("data/employment_forecast_latest.json")
+DATA_FILE = Path(os.getenv("EMP_FORECAST_FILE", "data/employment_forecast_latest.json"))
 
 def fetch_minkabu_forecast() -> dict:
     if not DATA_FILE.exists():
@@ -1,46 +1,174 @@
+import time
+
+_T_IMPORT = time.perf_counter()
+
 import os
 from datetime import datetime, timezone
-from employment_report.util import retry
+from bot_common import trace
+from bot_common.state_store import StateStore
+from bot_common.trace import span
 from employment_report.minkabu_forecast import fetch_minkabu_forecast
-from employment_report.bls_actuals import get_actuals
-from employment_report.compose_text import compose
-from employment_report.x_post import post_to_x
+
+STATE_PATH = os.getenv("EMP_STATE_PATH", "data/employment_state.sqlite3")
+
+# 1回のポーリングで BLS に使う時間の上限（hedge を含む）。超えたら次のポーリングに回す
+BLS_POLL_BUDGET_SEC = float(os.getenv("BLS_POLL_BUDGET_SEC", "10"))
 
 def _need_values(actual: dict) -> bool:
     keys = ["nfp_man_actual", "ur_actual", "ahe_mom_actual", "ahe_yoy_actual"]
     return all(actual.get(k) is not None for k in keys)
 
-def main():
+def _export_fields(actual: dict, forecast: dict, revised: dict) -> dict:
+    """export.write() に渡す {field: {value, prev, forecast, revised_prev}}"""
+    out = {}
+    for field in ("nfp_level", "nfp_man", "ur", "ahe_level", "ahe_mom", "ahe_yoy"):
+        out[field] = {"value": actual.get(f"{field}_actual"), "prev": actual.get(f"{field}_prev"),
+                      "forecast": forecast.get(field),
+                      "revised_prev": revised[field][0] if field in revised else None}
+    return out
+
+def main(release_at: str | None = None):
+    """release_at（ISO 8601）が無ければ RELEASE_AT 環境変数、それも無ければ当日 8:30 ET"""
     fired_at = datetime.now(timezone.utc).isoformat()
     print(f"[employment] start at {fired_at}Z")
 
     # 1) Forecast from JSON (no web)
-    fcwrap = fetch_minkabu_forecast()
+    with span("forecast.load"):
+        fcwrap = fetch_minkabu_forecast()
     ym = fcwrap["ym"]
     month_label = fcwrap["monthLabel"]
     forecast = fcwrap["forecast"]
 
     print(f"[employment] forecast ym={ym} month={month_label} forecast={forecast}")
 
-    # 2) Actual from BLS (release直後の反映遅延対策で retry)
-    def _fetch_actual():
-        a = get_actuals(ym)
-        if not _need_values(a):
-            raise RuntimeError(f"BLS returned incomplete values: {a}")
-        return a
+    # 二重投稿防止（同じ ym はチャネルごとに1回だけ。FORCE_POST=1 で上書き）
+    with span("state.load"):
+        state = StateStore(STATE_PATH)
+    with state:
+        _post(state, ym, month_label, forecast, release_at)
+
+def _post(state: StateStore, ym: str, month_label: str, forecast: dict, release_at: str | None):
+    key = f"EMP_{ym}"
+    force = os.getenv("FORCE_POST", "0") == "1"
+    if (not force) and state.has_posted(key):
+        # X は投稿済み。他のチャネルが残っていなければ終わり（再実行時だけ publish を読み込む）
+        from bot_common import publish
 
-    actual = retry(_fetch_actual, tries=8, sleep_sec=6.0, name="bls_actuals")  # 最大 ~42秒
+        if not publish.pending(state, key, publish.configured()):
+            print(f"[employment] already posted {key}; skipping.")
+            return
+
+    # 投稿する場合だけ残りを読み込む（numpy・requests・requests_oauthlib）。いずれも発表前。
+    with span("import", phase="post"):
+        from bot_common import charts, export, publish, quota, revisions, surprise
+        from bot_common.release_poller import poll_release, release_time
+        from bot_common.retry import hedged, save_latency
+        from bot_common.series import month_index, month_str
+        from employment_report.bls_actuals import chart_history, get_actuals
+        from employment_report.compose_text import compose_template, fill, split
+
+    # 1.5) Arm: 実績以外のテキストを先に組み立て、投稿先への接続は発表直前に温める
+    t0 = time.perf_counter()
+    with span("compose", phase="template"):
+        template = compose_template(month_label, forecast)
+    render_ms = (time.perf_counter() - t0) * 1000.0
+    channels = publish.configured()
+    warm = {"ms": 0.0}
+    chart_base = {}
+    past = {}
+
+    def _arm():
+        warm["ms"] = publish.arm(channels)
+        # 予想比（サプライズ）の履歴。発表時は1行足した統計を出すだけにする
+        with span("surprise.load"):
+            past["history"] = surprise.History.load("employment")
+        # 前回投稿した数値（改定の検出用）
+        with span("revisions.load"):
+            past["vintages"] = revisions.Vintages.load("employment")
+        # チャートの土台（前月までの履歴）は描画スレッドで先に描いておく（matplotlib が無ければ無し）
+        if charts.available():
+            expect = {"nfp": forecast.get("nfp_man"), "ur": forecast.get("unemployment_rate"),
+                      "ahe_yoy": forecast.get("ahe_yoy")}
+            chart_base["future"] = charts.prepare_async("employment", chart_history(), ym, expect)
+        print(f"[employment] armed: template {render_ms:.1f}ms + warm-up of {len(channels)} channel(s) "
+              f"{warm['ms']:.1f}ms moved off the critical path")
+
+    # 2) Actual from BLS（発表時刻の少し前から適応間隔でポーリング）
+    # 遅い応答は p95（前回までの実行分を含む）を超えた時点で同じリクエストをもう1本投げて、早い方を使う。
+    # キー無しの BLS（25回/日）では hedge で quota を倍使う余裕が無いので投げない
+    hedge = quota.LIMITS["bls"].capacity > 25
+    actual = poll_release(
+        lambda: hedged(lambda t: get_actuals(ym, timeout=t), name="bls", tries=1, hedge=hedge,
+                       deadline_sec=BLS_POLL_BUDGET_SEC),
+        _need_values,
+        release_at=release_time(release_at),
+        name="bls_actuals",
+        on_arm=_arm,
+        # hedge は p95 を超えたときだけ2本目を投げるので平均は1本強。使いすぎれば残りトークンから間隔が延びる
+        budget={"bls": 1.2 if hedge else 1},
+    )
     print(f"[employment] actual={actual}")
 
-    # 3) Compose tweet
-    text = compose(month_label, forecast, actual)
+    # 3) Compose tweet（テンプレートに数値を差し込むだけ）
+    t_release = time.perf_counter()
+    # 最後の点を描き足す（本文の組み立て・claim と並行）
+    chart = None
+    if chart_base.get("future") is not None:
+        points = {"nfp": actual["nfp_man_actual"], "ur": actual["ur_actual"], "ahe_yoy": actual["ahe_yoy_actual"]}
+        chart = charts.finish_async(chart_base["future"], ym, points)
+    # 前回の値が前の投稿から改定されていれば「旧 → 修正 新」で出す
+    vintages = past["vintages"] if "vintages" in past else revisions.Vintages.load("employment")
+    fc_row, actual_row = surprise.employment_forecast(forecast), surprise.employment_actual(actual)
+    prev_ym = month_str(month_index(ym) - 1)
+    with span("revisions.diff", ym=ym):
+        prev_row = {k: actual.get(f"{k}_prev") for k in ("nfp_man", "ur", "ahe_mom", "ahe_yoy")}
+        snap = vintages.snapshot(ym, {prev_ym: prev_row, ym: actual_row})
+        revs = vintages.diff(ym, snap)
+        revised = revisions.by_field(revs, prev_ym)
+    revisions.log("employment", revs)
+    with span("compose", phase="fill"):
+        text = fill(template, actual, revised)
+    with span("surprise", ym=ym):
+        history = past["history"] if "history" in past else surprise.History.load("employment")
+        # 1本が 280 を超える（改定が重なる・マイナスの雇用者数など）ならスレッドに分ける
+        texts = surprise.attach(split(text), surprise.line(history, ym, fc_row, actual_row))
     print("----- TWEET -----")
-    print(text)
+    print("\n-----\n".join(texts))
     print("-----------------")
 
-    # 4) Post to X
-    res = retry(lambda: post_to_x(text), tries=3, sleep_sec=4.0, name="x_post")
-    print(f"[employment] posted: {res}")
+    # 4) Post（X・Bluesky・Webhook に並列。チャネルごとに claim し、失敗したチャネルだけ取り消す）
+    # X は hedge しない。再試行は送信できなかった/429/5xx のときだけ（重複は投稿済み扱い）
+    res = publish.publish(texts, channels, state=state, key=key, force=force, chart=chart)
+    if all(r["status"] == "skipped" for r in res.values()):
+        print(f"[employment] {key} was claimed by another run; skipping.")
+        return
+    critical_ms = (time.perf_counter() - t_release) * 1000.0
+    print(f"[employment] fill+post {critical_ms:.1f}ms (saved ~{render_ms + warm['ms']:.1f}ms vs cold compose+connect)")
+
+    # 投稿後（計測の外）に予想比の履歴・投稿した数値の vintage・書き出し用のデータセットを更新する。
+    # 失敗しても投稿は済んでいるので止めない
+    try:
+        with span("surprise.record", ym=ym):
+            surprise.record("employment", ym, fc_row, actual_row, history)
+    except Exception as e:
+        print(f"[employment] surprise cache update failed: {type(e).__name__}: {e}")
+    try:
+        with span("revisions.record", ym=ym):
+            revisions.record("employment", ym, snap, vintages)
+    except Exception as e:
+        print(f"[employment] revision log update failed: {type(e).__name__}: {e}")
+    try:
+        path = export.write("employment", ym, _export_fields(actual, fc_row, revised), "bls")
+        if path:
+            print(f"[employment] exported {path}")
+    except Exception as e:
+        print(f"[employment] export failed: {type(e).__name__}: {e}")
+    try:
+        save_latency()
+    except Exception as e:
+        print(f"[employment] latency samples not saved: {type(e).__name__}: {e}")
 
 if __name__ == "__main__":
-    main()
+    trace.record("import", _T_IMPORT)
+    with trace.run("employment.post"):
+        main()
@@ -1,26 +1,12 @@
 # employment_report/x_post.py
+# X 単体への投稿（test_post 用）。本番の投稿は bot_common.publish で全チャネルに送る。
 
-import os
-import requests
-from requests_oauthlib import OAuth1
+from bot_common import x_client
 
-def post_to_x(text: str) -> dict:
-    api_key = os.getenv("X_API_KEY")
-    api_secret = os.getenv("X_API_SECRET")
-    access_token = os.getenv("X_ACCESS_TOKEN")
-    access_secret = os.getenv("X_ACCESS_SECRET")
-
-    if not all([api_key, api_secret, access_token, access_secret]):
-        raise RuntimeError("X API secrets are missing")
-
-    auth = OAuth1(api_key, api_secret, access_token, access_secret)
+def arm() -> float:
+    """OAuth1 を組み立て、投稿先への接続を温める。所要ミリ秒を返す。"""
+    x_client.oauth_from_env()
+    return x_client.warm()
 
-    res = requests.post(
-        "https://api.twitter.com/2/tweets",
-        auth=auth,
-        json={"text": text},
-        timeout=30,
-    )
-
-    res.raise_for_status()
-    return res.json()
+def post_to_x(text: str) -> dict:
+    return x_client.post_tweet(x_client.oauth_from_env(), text)